@@ -0,0 +1,147 @@
+import base64
+import json
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over ``ordering``.
+
+    The cursor carries the ordering values of the last row seen, and the next
+    page is fetched with ``WHERE (a, b) < (x, y) ... LIMIT n``, so page 500
+    costs the same as page 1: no OFFSET scan and no COUNT(*). The last
+    ordering field must be unique (usually ``id``).
+    """
+    ordering = ("-id",)
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self.reversed_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.row_position(rows[-1]) if rows and (has_more or reverse) else None
+        self.previous_position = self.row_position(rows[0]) if rows and (has_more if reverse else position is not None) else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_position, False))
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.previous_position, True))
+
+    # ---------------- Cursor helpers ---------------- #
+    def field_names(self):
+        return [field.lstrip("-") for field in self.ordering]
+
+    def reversed_ordering(self):
+        return tuple(field[1:] if field.startswith("-") else f"-{field}" for field in self.ordering)
+
+    def row_position(self, row):
+        return [getattr(row, name) for name in self.field_names()]
+
+    def seek_filter(self, ordering, position):
+        """``(f1, f2, ...) > (v1, v2, ...)`` in the given ordering, spelled as ORs of ANDs."""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            step = Q(**{f"{name}__{lookup}": position[index]})
+            for prior, prior_field in enumerate(ordering[:index]):
+                step &= Q(**{prior_field.lstrip("-"): position[prior]})
+            condition |= step
+        # The redundant bound on the leading column lets the index be range-scanned.
+        lead = ordering[0]
+        bound = Q(**{f"{lead.lstrip('-')}__{'lte' if lead.startswith('-') else 'gte'}": position[0]})
+        return bound & condition
+
+    def encode_cursor(self, position, reverse):
+        payload = {"p": [value.isoformat() if hasattr(value, "isoformat") else value for value in position]}
+        if reverse:
+            payload["r"] = 1
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+            names = self.field_names()
+            values = payload["p"]
+            if len(values) != len(names):
+                raise ValueError
+            position = [model._meta.get_field(name).to_python(value) for name, value in zip(names, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get("r"))
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    """Newest first over ``(created_at, id)``."""
+    ordering = ("-created_at", "-id")
+
+
+class NameKeysetPagination(KeysetPagination):
+    """Alphabetical over ``(name, id)``, for catalog lists."""
+    ordering = ("name", "id")
+
+
+class HSNCodeKeysetPagination(KeysetPagination):
+    """Over ``(hsncode, id)``, for the HSN list."""
+    ordering = ("hsncode", "id")
+
+
+class IdKeysetPagination(KeysetPagination):
+    """Oldest first over ``id``."""
+    ordering = ("id",)
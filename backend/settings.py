@@ -48,6 +48,8 @@ INSTALLED_APPS = [
     'products',
     'user',
     'orders',
+    'jobs',
+    'reports',
 ]
 
 MIDDLEWARE = [
@@ -79,6 +81,12 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+# Live order events (orders.events) are delivered in-process, so the stream at
+# /api/orders/shops/<id>/events/ only sees orders changed by the same process.
+# For live events, serve the whole API from one ASGI process
+# (e.g. ``uvicorn backend.asgi:application --workers 1``); orders changed
+# through WSGI workers or another ASGI worker never reach its listeners.
+ASGI_APPLICATION = 'backend.asgi.application'
 
 
 # Database
@@ -88,6 +96,29 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent checkouts queue on the
+            # busy timeout instead of failing on a read-to-write lock upgrade.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            # A file (not shared-cache memory) so threaded tests get real SQLite locking.
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+
+# Cache (guest carts and shop menu snapshots live here)
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# locmem is per process; use the file backend (or Redis/Memcached) when running
+# several workers so every worker sees the same guest carts and menu versions.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rk-onlineshopping',
     }
 }
 
@@ -118,6 +149,9 @@ LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
 
+# Where the shops are: item time-of-day windows (ShopItem.available_from/till) are shop wall-clock times.
+SHOP_TIME_ZONE = 'Asia/Kolkata'
+
 USE_I18N = True
 
 USE_TZ = True
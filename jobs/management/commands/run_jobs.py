@@ -0,0 +1,58 @@
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from jobs.queue import claim_jobs, run_job
+
+
+def _run_in_thread(job):
+    try:
+        return run_job(job)
+    finally:
+        # Each pool thread keeps its own connection; drop it between jobs.
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs with a thread pool until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4, help="Jobs run in parallel.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--visibility-timeout", type=int, default=300, help="Seconds a claimed job stays leased.")
+        parser.add_argument("--once", action="store_true", help="Exit as soon as the queue has no due jobs.")
+
+    def handle(self, *args, **options):
+        concurrency = max(options["concurrency"], 1)
+        visibility_timeout = timedelta(seconds=options["visibility_timeout"])
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = False
+
+        def stop(signum, frame):
+            self.stopping = True
+            self.stdout.write("Stopping after in-flight jobs finish...")
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write(f"Worker {worker} running {concurrency} threads")
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while not self.stopping:
+                in_flight = {future for future in in_flight if not future.done()}
+                free = concurrency - len(in_flight)
+                jobs = []
+                if free:
+                    close_old_connections()
+                    jobs = claim_jobs(worker, free, visibility_timeout)
+                for job in jobs:
+                    in_flight.add(pool.submit(_run_in_thread, job))
+
+                if not jobs:
+                    if options["once"] and not in_flight:
+                        break
+                    time.sleep(options["poll_interval"])
@@ -0,0 +1,105 @@
+import logging
+import traceback
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+DEFAULT_VISIBILITY_TIMEOUT = timedelta(minutes=5)
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 60 * 60
+
+
+def task(name):
+    """Register a function as a background task under ``name`` (e.g. ``"orders.recompute_totals"``)."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, run_at=None, max_attempts=5):
+    """
+    Queue ``name`` to run with ``payload`` as keyword arguments.
+
+    The job is an ordinary row, so inside a transaction it is only visible to
+    workers once that transaction commits, and is discarded if it rolls back.
+    """
+    if name not in TASKS:
+        raise KeyError(f"Unknown task '{name}'.")
+    return Job.objects.create(
+        task=name,
+        payload=payload or {},
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts,
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts``: 10s, 20s, 40s, ... capped at an hour."""
+    return min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS)
+
+
+def claim_jobs(worker, limit, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+    """
+    Lease up to ``limit`` due jobs to ``worker`` for ``visibility_timeout``.
+
+    Due means queued with ``run_at`` in the past, or running with an expired
+    lease (its worker died). The lease is taken with a conditional UPDATE so
+    two workers never claim the same job.
+    """
+    now = timezone.now()
+    due = Q(status="queued", run_at__lte=now) | Q(status="running", locked_until__lt=now)
+    locked_until = now + visibility_timeout
+
+    with transaction.atomic():
+        # A job whose worker died on its last attempt is given up on, not retried forever.
+        Job.objects.filter(status="running", locked_until__lt=now, attempts__gte=F("max_attempts")).update(
+            status="failed", last_error="Visibility timeout expired on the last attempt.", locked_until=None, finished_at=now
+        )
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by("run_at", "id")
+            .values_list("id", flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(due, id__in=ids).update(
+            status="running",
+            attempts=F("attempts") + 1,
+            locked_by=worker,
+            locked_until=locked_until,
+        )
+    return list(Job.objects.filter(id__in=ids, status="running", locked_by=worker, locked_until=locked_until))
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome, scheduling a retry with backoff on failure."""
+    attempts = job.attempts
+    # Only record the outcome if the lease was not taken over after expiring.
+    lease = Job.objects.filter(pk=job.pk, status="running", locked_by=job.locked_by, locked_until=job.locked_until)
+    try:
+        func = TASKS[job.task]
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed on attempt %s", job.pk, job.task, attempts, exc_info=True)
+        if attempts >= job.max_attempts:
+            lease.update(status="failed", last_error=error, locked_until=None, finished_at=timezone.now())
+            return False
+        lease.update(
+            status="queued",
+            last_error=error,
+            locked_until=None,
+            run_at=timezone.now() + timedelta(seconds=backoff(attempts)),
+        )
+        return False
+
+    lease.update(status="done", locked_until=None, finished_at=timezone.now())
+    return True
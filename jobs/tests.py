@@ -0,0 +1,159 @@
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from .models import Job
+from .queue import TASKS, backoff, claim_jobs, enqueue, run_job
+
+calls = []
+
+
+def record(**payload):
+    calls.append(payload)
+
+
+def explode(**payload):
+    raise RuntimeError("boom")
+
+
+@patch.dict(TASKS, {"tests.record": record, "tests.explode": explode})
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def make_due(self, job):
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+    def expire_lease(self, job):
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def run_failing(self, job):
+        with self.assertLogs("jobs.queue", "WARNING"):
+            self.assertFalse(run_job(job))
+
+    def test_backoff_doubles_up_to_an_hour(self):
+        self.assertEqual([backoff(n) for n in range(1, 5)], [10, 20, 40, 80])
+        self.assertEqual(backoff(20), 60 * 60)
+
+    def test_runs_a_job_once(self):
+        job = enqueue("tests.record", {"n": 1})
+
+        [claimed] = claim_jobs("a", limit=10)
+        self.assertTrue(run_job(claimed))
+
+        self.assertEqual(calls, [{"n": 1}])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_until), ("done", 1, None))
+        self.assertEqual(claim_jobs("a", limit=10), [])
+
+    def test_failures_are_retried_with_backoff(self):
+        job = enqueue("tests.explode")
+
+        for attempt in (1, 2):
+            [claimed] = claim_jobs("a", limit=10)
+            before = timezone.now()
+            self.run_failing(claimed)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ("queued", attempt))
+            self.assertIn("RuntimeError: boom", job.last_error)
+            self.assertGreaterEqual(job.run_at, before + timedelta(seconds=backoff(attempt)))
+            self.assertLessEqual(job.run_at, timezone.now() + timedelta(seconds=backoff(attempt)))
+            # Not due again until the backoff has passed.
+            self.assertEqual(claim_jobs("a", limit=10), [])
+            self.make_due(job)
+
+    def test_fails_after_max_attempts(self):
+        job = enqueue("tests.explode", max_attempts=2)
+
+        for _ in range(2):
+            [claimed] = claim_jobs("a", limit=10)
+            self.run_failing(claimed)
+            self.make_due(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(claim_jobs("a", limit=10), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        job = enqueue("tests.record")
+        claim_jobs("a", limit=10)
+        self.assertEqual(claim_jobs("b", limit=10), [])
+
+        self.expire_lease(job)
+        [claimed] = claim_jobs("b", limit=10)
+
+        self.assertEqual((claimed.pk, claimed.locked_by, claimed.attempts), (job.pk, "b", 2))
+
+    def test_expired_lease_on_the_last_attempt_fails_the_job(self):
+        job = enqueue("tests.record", max_attempts=1)
+        claim_jobs("a", limit=10)
+        self.expire_lease(job)
+
+        self.assertEqual(claim_jobs("b", limit=10), [])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertIn("Visibility timeout", job.last_error)
+
+    def test_late_worker_does_not_record_its_result(self):
+        job = enqueue("tests.explode")
+        [late] = claim_jobs("a", limit=10)
+        self.expire_lease(job)
+        [current] = claim_jobs("b", limit=10)
+
+        self.run_failing(late)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts, job.last_error), ("running", "b", 2, ""))
+        self.assertEqual(job.locked_until, current.locked_until)
+
+        with patch.dict(TASKS, {"tests.explode": record}):
+            self.assertTrue(run_job(current))
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+
+    def test_a_job_is_claimed_once(self):
+        jobs = [enqueue("tests.record", {"n": n}) for n in range(3)]
+
+        first = claim_jobs("a", limit=2)
+        second = claim_jobs("b", limit=10)
+
+        self.assertEqual([job.pk for job in first], [job.pk for job in jobs[:2]])
+        self.assertEqual([job.pk for job in second], [jobs[2].pk])
+        self.assertEqual(claim_jobs("c", limit=10), [])
+
+
+@patch.dict(TASKS, {"tests.record": record})
+class ParallelClaimTests(TransactionTestCase):
+    """Concurrent workers polling the queue (needs a file-backed SQLite test DB)."""
+
+    def test_parallel_workers_never_share_a_job(self):
+        jobs = [enqueue("tests.record", {"n": n}) for n in range(30)]
+        workers = 10
+        barrier = threading.Barrier(workers)
+        claimed, errors = {}, []
+
+        def poll(worker):
+            try:
+                barrier.wait()
+                claimed[worker] = [job.pk for job in claim_jobs(worker, limit=5)]
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=poll, args=(f"worker-{n}",)) for n in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        ids = [pk for pks in claimed.values() for pk in pks]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(sorted(ids), sorted(job.pk for job in jobs))
+        for worker, pks in claimed.items():
+            self.assertEqual(set(Job.objects.filter(pk__in=pks).values_list("locked_by", flat=True)), {worker} if pks else set())
@@ -1,7 +1,9 @@
 from django.contrib import admin
-from .models import Cart, Order, OrderItem
+from .models import Cart, DeliveryBoyLocation, Order, OrderItem, OrderStatusHistory
 
 
 admin.site.register(Cart)
 admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+admin.site.register(DeliveryBoyLocation)
+admin.site.register(OrderStatusHistory)
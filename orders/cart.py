@@ -0,0 +1,163 @@
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from products.models import ShopItem
+from .models import Cart, OrderItem
+
+
+class ShopMismatch(Exception):
+    """Raised when an item from another shop is added to a non-empty cart without ``reset``."""
+
+
+class InvalidCartOperations(Exception):
+    """Raised when bulk cart operations name unknown shop items or span several shops."""
+
+    def __init__(self, message, shop_items=None):
+        super().__init__(message)
+        self.shop_items = shop_items or []
+
+
+def cart_lines(customer):
+    """
+    The customer's cart in a single query, with shop item (and so its
+    effective price), shop, item and HSN joined.
+    """
+    return Cart.objects.filter(customer=customer).select_related("shop_item__shop", "shop_item__item__hsn")
+
+
+def cart_summary(cart_items):
+    """
+    Totals for already-loaded cart lines, priced and GST-split exactly as
+    checkout will bill them. Runs no queries.
+    """
+    subtotal = taxable_total = gst = Decimal("0.00")
+    item_count = 0
+    shop = None
+    for cart_item in cart_items:
+        shop_item = cart_item.shop_item
+        hsn = shop_item.item.hsn
+        gst_percent = Decimal(hsn.gst) if hsn and hsn.gst is not None else Decimal("0.00")
+        price = shop_item.effective_price
+        line_taxable, line_gst = OrderItem.split_gst(price, gst_percent, cart_item.quantity)
+        subtotal += price * cart_item.quantity
+        taxable_total += line_taxable
+        gst += line_gst
+        item_count += cart_item.quantity
+        shop = shop or shop_item.shop
+
+    return {
+        "shop_id": shop.id if shop else None,
+        "shop_name": shop.name if shop else None,
+        "line_count": len(cart_items),
+        "item_count": item_count,
+        "subtotal": subtotal.quantize(Decimal("0.01")),
+        "taxable_total": taxable_total.quantize(Decimal("0.01")),
+        "gst": gst.quantize(Decimal("0.01")),
+    }
+
+
+def add_to_cart(customer, shop_item, quantity=1, reset=False):
+    """
+    Add ``quantity`` of ``shop_item`` to the customer's cart and return the
+    line, loaded as by cart_lines().
+
+    The quantity is incremented with ``UPDATE ... SET quantity = quantity + n``
+    and the row is only inserted when that matched nothing; an insert that
+    loses a race on the (customer, shop_item) unique key falls back to the
+    increment, so parallel adds never lose one another. A cart holding items
+    from another shop raises ShopMismatch, or is emptied first when ``reset``.
+    """
+    with transaction.atomic():
+        other_shops = Cart.objects.filter(customer=customer).exclude(shop_item__shop_id=shop_item.shop_id)
+        if reset:
+            other_shops.delete()
+        elif other_shops.exists():
+            raise ShopMismatch()
+
+        line = Cart.objects.filter(customer=customer, shop_item=shop_item)
+        if not line.update(quantity=F("quantity") + quantity):
+            try:
+                with transaction.atomic():
+                    Cart.objects.create(customer=customer, shop_item=shop_item, quantity=quantity)
+            except IntegrityError:
+                line.update(quantity=F("quantity") + quantity)
+
+    return cart_lines(customer).get(shop_item=shop_item)
+
+
+def validate_operations(operations):
+    """
+    Check every shop item named by ``operations`` with one query. Returns the
+    id of the shop being added to (None if the batch only removes lines).
+    """
+    shop_item_ids = {operation["shop_item"] for operation in operations}
+    shops = dict(ShopItem.objects.filter(id__in=shop_item_ids).values_list("id", "shop_id"))
+    unknown = sorted(shop_item_ids - set(shops))
+    if unknown:
+        raise InvalidCartOperations("Some shop items do not exist.", unknown)
+    adding_shops = {shops[operation["shop_item"]] for operation in operations if operation["op"] != "remove"}
+    if len(adding_shops) > 1:
+        raise InvalidCartOperations("A cart can only hold items from one shop.")
+    return adding_shops.pop() if adding_shops else None
+
+
+def fold_operations(quantities, operations):
+    """Apply ``operations`` in order to a ``{shop_item_id: quantity}`` dict (updated in place and returned)."""
+    for operation in operations:
+        shop_item_id = operation["shop_item"]
+        if operation["op"] == "remove":
+            quantities[shop_item_id] = 0
+        elif operation["op"] == "increment":
+            quantities[shop_item_id] = quantities.get(shop_item_id, 0) + operation["quantity"]
+        else:
+            quantities[shop_item_id] = operation["quantity"]
+    return quantities
+
+
+def apply_cart_operations(customer, operations, reset=False):
+    """
+    Apply a batch of ``{"shop_item", "quantity", "op"}`` operations to the
+    customer's cart, where ``op`` is "set", "increment" or "remove", in order.
+
+    Every referenced shop item is checked in one query and the cart is read
+    once (locked); the changes are then written with at most one bulk_create,
+    one bulk_update and one DELETE. Lines whose quantity drops to zero are
+    removed. Raises InvalidCartOperations, or ShopMismatch when the cart holds
+    another shop's items and ``reset`` is not set.
+    """
+    adding_shop = validate_operations(operations)
+
+    with transaction.atomic():
+        lines = {
+            line.shop_item_id: line
+            for line in Cart.objects.filter(customer=customer).select_related("shop_item").select_for_update(of=("self",))
+        }
+        stale = [line.id for line in lines.values() if adding_shop and line.shop_item.shop_id != adding_shop]
+        if stale and not reset:
+            raise ShopMismatch()
+
+        quantities = fold_operations(
+            {shop_item_id: line.quantity for shop_item_id, line in lines.items() if line.id not in stale},
+            operations,
+        )
+
+        to_create, to_update, to_delete = [], [], list(stale)
+        for shop_item_id, quantity in quantities.items():
+            line = lines.get(shop_item_id)
+            if quantity <= 0:
+                if line:
+                    to_delete.append(line.id)
+            elif line is None:
+                to_create.append(Cart(customer=customer, shop_item_id=shop_item_id, quantity=quantity))
+            elif line.quantity != quantity:
+                line.quantity = quantity
+                to_update.append(line)
+
+        if to_delete:
+            Cart.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            Cart.objects.bulk_update(to_update, ["quantity"])
+        if to_create:
+            Cart.objects.bulk_create(to_create)
+
+    return list(cart_lines(customer))
@@ -0,0 +1,124 @@
+from decimal import Decimal
+from django.db import transaction
+from products.autocomplete import autocomplete
+from products.inventory import InsufficientStock, reserve_stock
+from products.models import shop_time
+from reports.rollups import record_order_placed
+from .events import ORDER_CREATED, publish_order_event
+from .models import Cart, Order, OrderItem, OrderStatusHistory
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be turned into an order."""
+
+    def __init__(self, message, unavailable=None):
+        super().__init__(message)
+        self.unavailable = unavailable or []
+
+
+def load_cart(customer):
+    """Cart rows with shop item, shop, item and HSN joined in a single query."""
+    return list(
+        Cart.objects.filter(customer=customer)
+        .select_related("shop_item__shop", "shop_item__item__hsn")
+        .order_by("id")
+    )
+
+
+def build_order_items(cart_items):
+    """Price every cart line and split its GST in memory."""
+    order_items = []
+    for cart_item in cart_items:
+        shop_item = cart_item.shop_item
+        hsn = shop_item.item.hsn
+        gst_percent = Decimal(hsn.gst) if hsn and hsn.gst is not None else Decimal("0.00")
+        price = shop_item.effective_price
+        taxable_amount, gst = OrderItem.split_gst(price, gst_percent, cart_item.quantity)
+        order_items.append(OrderItem(
+            shop_item=shop_item,
+            quantity=cart_item.quantity,
+            price=price,
+            gst=gst,
+            taxable_amount=taxable_amount,
+        ))
+    return order_items
+
+
+def place_order(customer, delivery_address_id=None, delivery_charge=Decimal("0.00")):
+    """
+    Turn the customer's cart into an order.
+
+    The number of queries does not depend on the number of cart lines: one
+    query loads the cart with its shop items (carrying their effective
+    prices), items and HSNs, one conditional UPDATE reserves stock for every
+    line, and the order, its items and the cart delete are written in a single
+    transaction with bulk inserts. Lines outside their shop item's
+    time-of-day window are refused.
+    """
+    delivery_charge = Decimal(delivery_charge or "0.00").quantize(Decimal("0.01"))
+
+    with transaction.atomic():
+        cart_items = load_cart(customer)
+        if not cart_items:
+            raise CheckoutError("Cart is empty.")
+
+        shop = cart_items[0].shop_item.shop
+        if any(cart_item.shop_item.shop_id != shop.id for cart_item in cart_items):
+            raise CheckoutError("Cart contains items from more than one shop.")
+
+        now = shop_time()
+        closed = [cart_item for cart_item in cart_items if not cart_item.shop_item.is_available_at(now)]
+        if closed:
+            raise CheckoutError("Some items are not available at this time.", unavailable=[
+                {
+                    "shop_item": cart_item.shop_item_id,
+                    "name": cart_item.shop_item.item.name,
+                    "available_from": cart_item.shop_item.available_from,
+                    "available_till": cart_item.shop_item.available_till,
+                }
+                for cart_item in closed
+            ])
+
+        try:
+            reserve_stock({cart_item.shop_item_id: cart_item.quantity for cart_item in cart_items})
+        except InsufficientStock as exc:
+            raise CheckoutError("Some items are out of stock.", unavailable=[
+                {
+                    "shop_item": cart_item.shop_item_id,
+                    "name": cart_item.shop_item.item.name,
+                    "requested": cart_item.quantity,
+                    "available": exc.shortages[cart_item.shop_item_id],
+                }
+                for cart_item in cart_items
+                if cart_item.shop_item_id in exc.shortages
+            ])
+
+        order_items = build_order_items(cart_items)
+
+        total_inclusive = sum((item.subtotal for item in order_items), Decimal("0.00"))
+        order = Order(
+            customer=customer,
+            shop=shop,
+            delivery_address_id=delivery_address_id,
+            delivery_charge=delivery_charge,
+            gst=sum((item.gst for item in order_items), Decimal("0.00")).quantize(Decimal("0.01")),
+            taxable_total=sum((item.taxable_amount for item in order_items), Decimal("0.00")).quantize(Decimal("0.01")),
+            total_price=(total_inclusive + delivery_charge).quantize(Decimal("0.01")),
+        )
+        # bulk_create skips Order.save(), which would write the row twice and re-read the items.
+        Order.objects.bulk_create([order])
+
+        for item in order_items:
+            item.order = order
+        OrderItem.objects.bulk_create(order_items)
+        OrderStatusHistory.objects.create(order=order, to_value=order.status, changed_by=customer, created_at=order.created_at)
+
+        Cart.objects.filter(id__in=[cart_item.id for cart_item in cart_items]).delete()
+        record_order_placed(order, order_items)
+
+        # bulk_create sends no post_save, so announce the order here.
+        publish_order_event(order, ORDER_CREATED)
+        item_ids = [item.shop_item.item_id for item in order_items]
+        transaction.on_commit(lambda: autocomplete.record_order(shop.id, item_ids))
+
+    return order
@@ -0,0 +1,212 @@
+import math
+import threading
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from .models import DeliveryBoyLocation, Order
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+# A delivery boy on one of these orders is busy.
+ACTIVE_DELIVERY_STATUSES = ("accepted", "preparing", "out_for_delivery")
+DISPATCH_STATUSES = ("accepted", "out_for_delivery")
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class RiderIndex:
+    """
+    In-memory grid of free riders' positions for k-nearest lookups.
+
+    Riders are bucketed into ``cell_degrees`` squares. A lookup scans rings of
+    cells outward from the query point and stops once no unvisited cell can
+    hold anything closer than the k-th best so far, so it touches a handful of
+    cells instead of every rider. Moves and removals are O(1).
+    """
+
+    def __init__(self, cell_degrees=0.02):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._cells = defaultdict(dict)
+        self._riders = {}
+
+    def __len__(self):
+        return len(self._riders)
+
+    def __contains__(self, rider_id):
+        return rider_id in self._riders
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def upsert(self, rider_id, lat, lng):
+        lat, lng = float(lat), float(lng)
+        cell = self._cell(lat, lng)
+        with self._lock:
+            previous = self._riders.get(rider_id)
+            if previous and previous[2] != cell:
+                self._drop_from_cell(rider_id, previous[2])
+            self._riders[rider_id] = (lat, lng, cell)
+            self._cells[cell][rider_id] = (lat, lng)
+
+    def remove(self, rider_id):
+        with self._lock:
+            previous = self._riders.pop(rider_id, None)
+            if previous:
+                self._drop_from_cell(rider_id, previous[2])
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._riders.clear()
+
+    def _drop_from_cell(self, rider_id, cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(rider_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _ring(self, center, radius):
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for d in range(-radius, radius + 1):
+            yield row - radius, col + d
+            yield row + radius, col + d
+        for d in range(-radius + 1, radius):
+            yield row + d, col - radius
+            yield row + d, col + radius
+
+    def nearest(self, lat, lng, k=1, max_km=None):
+        """Up to ``k`` ``(distance_km, rider_id)`` pairs closest to ``(lat, lng)``, nearest first."""
+        lat, lng = float(lat), float(lng)
+        center = self._cell(lat, lng)
+        best = []
+        with self._lock:
+            remaining = len(self._riders)
+            radius = 0
+            while remaining:
+                for cell in self._ring(center, radius):
+                    bucket = self._cells.get(cell)
+                    if not bucket:
+                        continue
+                    remaining -= len(bucket)
+                    for rider_id, (rider_lat, rider_lng) in bucket.items():
+                        best.append((haversine_km(lat, lng, rider_lat, rider_lng), rider_id))
+                best.sort()
+                del best[k:]
+
+                # Anything not yet scanned lies outside the (2 * radius + 1)^2 block of cells around
+                # the query point, so it is at least as far as the nearest edge of that block.
+                row, col = center
+                south, north = (row - radius) * self.cell_degrees, (row + radius + 1) * self.cell_degrees
+                west, east = (col - radius) * self.cell_degrees, (col + radius + 1) * self.cell_degrees
+                widest = math.cos(math.radians(min(89.9, max(abs(south), abs(north)))))
+                bound_km = KM_PER_DEGREE * min(lat - south, north - lat, (lng - west) * widest, (east - lng) * widest)
+                if len(best) == k and best[-1][0] <= bound_km:
+                    break
+                if max_km is not None and bound_km > max_km:
+                    break
+                radius += 1
+
+        if max_km is not None:
+            best = [pair for pair in best if pair[0] <= max_km]
+        return best
+
+
+class Dispatcher:
+    """Assigns the nearest free delivery boy to orders, backed by a RiderIndex."""
+
+    def __init__(self, index=None, candidates=5):
+        self.index = index or RiderIndex()
+        self.candidates = candidates
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def ensure_loaded(self):
+        """Fill the index from the database on first use: available riders with no active order."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            busy = Order.objects.filter(delivery_boy=OuterRef("delivery_boy"), status__in=ACTIVE_DELIVERY_STATUSES)
+            free = DeliveryBoyLocation.objects.filter(is_available=True).exclude(Exists(busy))
+            for rider_id, lat, lng in free.values_list("delivery_boy_id", "latitude", "longitude").iterator():
+                self.index.upsert(rider_id, lat, lng)
+            self._loaded = True
+
+    def rider_is_busy(self, rider_id):
+        return Order.objects.filter(delivery_boy_id=rider_id, status__in=ACTIVE_DELIVERY_STATUSES).exists()
+
+    def update_rider(self, location):
+        """Reflect a saved DeliveryBoyLocation in the index."""
+        if location.is_available and not self.rider_is_busy(location.delivery_boy_id):
+            self.index.upsert(location.delivery_boy_id, location.latitude, location.longitude)
+        else:
+            self.index.remove(location.delivery_boy_id)
+
+    def release(self, rider_id):
+        """Put a rider back in the index at their last known position once they are free."""
+        location = DeliveryBoyLocation.objects.filter(delivery_boy_id=rider_id, is_available=True).first()
+        if location and not self.rider_is_busy(rider_id):
+            self.index.upsert(rider_id, location.latitude, location.longitude)
+
+    def assign(self, order, max_km=None, claimed=None):
+        """
+        Give ``order`` the nearest free rider to its shop. Returns the rider id, or None.
+
+        The claim is ``UPDATE ... WHERE delivery_boy IS NULL AND <rider has no
+        active order>``, so a stale index entry or another worker process can
+        never double-book a rider. Riders leave the index only once the
+        caller's transaction commits; if it rolls back they stay bookable.
+        ``claimed`` collects the riders taken in the current transaction so
+        that later calls in it (a bulk accept) skip them; pass the same set.
+        If the order turns out to be assigned already, it gets that rider and
+        None is returned.
+        """
+        shop = order.shop
+        if order.delivery_boy_id or not shop or shop.latitude is None or shop.longitude is None:
+            return None
+        self.ensure_loaded()
+        claimed = set() if claimed is None else claimed
+
+        nearest = self.index.nearest(shop.latitude, shop.longitude, k=self.candidates + len(claimed), max_km=max_km)
+        for _, rider_id in [pair for pair in nearest if pair[1] not in claimed][:self.candidates]:
+            busy = Order.objects.filter(delivery_boy_id=rider_id, status__in=ACTIVE_DELIVERY_STATUSES).exclude(pk=order.pk)
+            won = Order.objects.filter(pk=order.pk, delivery_boy__isnull=True).exclude(Exists(busy)).update(delivery_boy_id=rider_id)
+            if not won:
+                taken_by = Order.objects.filter(pk=order.pk).values_list("delivery_boy_id", flat=True).first()
+                if taken_by:
+                    # Another worker assigned the order first; says nothing about this rider.
+                    order.delivery_boy_id = taken_by
+                    return None
+            # Booked now, or already busy elsewhere: either way not free once this commits.
+            transaction.on_commit(lambda rider_id=rider_id: self.index.remove(rider_id))
+            claimed.add(rider_id)
+            if won:
+                order.delivery_boy_id = rider_id
+                return rider_id
+        return None
+
+
+dispatcher = Dispatcher()
+
+
+def dispatch_after_status_change(order, previous_status, claimed=None):
+    """
+    Assign a rider when an order is accepted / goes out for delivery; free them when it ends.
+    ``claimed`` is shared across the calls of one transaction (see Dispatcher.assign).
+    """
+    if order.status in DISPATCH_STATUSES and not order.delivery_boy_id:
+        dispatcher.assign(order, claimed=claimed)
+    elif order.status in ("completed", "cancelled") and order.delivery_boy_id and previous_status in ACTIVE_DELIVERY_STATUSES:
+        rider_id = order.delivery_boy_id
+        transaction.on_commit(lambda: dispatcher.release(rider_id))
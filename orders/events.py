@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+import threading
+from collections import defaultdict, deque
+from django.db import transaction
+
+ORDER_CREATED = "order.created"
+ORDER_STATUS_CHANGED = "order.status_changed"
+ORDER_PAYMENT_STATUS_CHANGED = "order.payment_status_changed"
+
+
+class Subscription:
+    """One live listener: an asyncio queue bound to the listener's event loop."""
+
+    def __init__(self, shop_id, loop, maxsize):
+        self.shop_id = shop_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        # Runs on the listener's loop. A slow client loses its oldest events rather than blocking publishers.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class OrderEventBroker:
+    """
+    In-process pub/sub of order events, keyed by shop.
+
+    Publishers may run on any thread; each event is handed to a subscriber's
+    own event loop with ``call_soon_threadsafe``. An idle subscriber costs one
+    small queue, so one ASGI worker can hold thousands of open streams. The
+    last ``backlog`` events per shop are kept so reconnecting clients can
+    resume from ``Last-Event-ID``.
+
+    Nothing crosses process boundaries: publishers and streams must share
+    one process (see orders.streams.shop_order_events).
+    """
+
+    def __init__(self, queue_size=100, backlog=200):
+        self.queue_size = queue_size
+        self.backlog = backlog
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscribers = defaultdict(set)
+        self._recent = defaultdict(lambda: deque(maxlen=self.backlog))
+
+    def subscribe(self, shop_id, last_event_id=None):
+        """Register a listener on the running loop, replaying events newer than ``last_event_id``."""
+        subscription = Subscription(shop_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers[shop_id].add(subscription)
+            missed = [event for event in self._recent[shop_id] if last_event_id is not None and event["id"] > last_event_id]
+        for event in missed:
+            subscription.deliver(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.shop_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.shop_id]
+
+    def publish(self, shop_id, event):
+        with self._lock:
+            event = {"id": next(self._ids), **event}
+            self._recent[shop_id].append(event)
+            subscribers = list(self._subscribers.get(shop_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The listener's loop has closed; it will be dropped on unsubscribe.
+                pass
+        return event
+
+    def subscriber_count(self, shop_id=None):
+        with self._lock:
+            if shop_id is not None:
+                return len(self._subscribers.get(shop_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+broker = OrderEventBroker()
+
+
+def order_event_payload(order, event_type):
+    return {
+        "type": event_type,
+        "order_id": order.id,
+        "shop_id": order.shop_id,
+        "status": order.status,
+        "payment_status": order.payment_status,
+        "total_price": str(order.total_price),
+        "updated_at": order.updated_at.isoformat() if order.updated_at else None,
+    }
+
+
+def publish_order_event(order, event_type):
+    """Publish an order event to the shop's listeners once the current transaction commits."""
+    if not order.shop_id:
+        return
+    payload = order_event_payload(order, event_type)
+    transaction.on_commit(lambda: broker.publish(order.shop_id, payload))
@@ -0,0 +1,117 @@
+import csv
+import itertools
+import json
+from datetime import datetime, time, timedelta
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .models import OrderItem
+
+CHUNK_SIZE = 2000
+
+# (column name, values() path) pairs.
+ORDER_COLUMNS = [
+    ("order_id", "id"),
+    ("created_at", "created_at"),
+    ("shop_id", "shop_id"),
+    ("shop_name", "shop__name"),
+    ("customer_id", "customer_id"),
+    ("customer", "customer__username"),
+    ("status", "status"),
+    ("payment_status", "payment_status"),
+    ("taxable_total", "taxable_total"),
+    ("gst", "gst"),
+    ("delivery_charge", "delivery_charge"),
+    ("total_price", "total_price"),
+]
+
+ITEM_COLUMNS = [
+    ("order_id", "order_id"),
+    ("created_at", "order__created_at"),
+    ("shop_id", "order__shop_id"),
+    ("shop_name", "order__shop__name"),
+    ("status", "order__status"),
+    ("payment_status", "order__payment_status"),
+    ("shop_item_id", "shop_item_id"),
+    ("item_name", "shop_item__item__name"),
+    ("hsn", "shop_item__item__hsn__hsncode"),
+    ("quantity", "quantity"),
+    ("price", "price"),
+    ("taxable_amount", "taxable_amount"),
+    ("gst", "gst"),
+]
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def filter_orders(orders, shop=None, status=None, start=None, end=None):
+    """Narrow an Order queryset by shop id, status and an inclusive created_at date range."""
+    if shop:
+        orders = orders.filter(shop_id=shop)
+    if status:
+        orders = orders.filter(status=status)
+    # Compare the raw column against day boundaries so the created_at index can be used.
+    if start:
+        orders = orders.filter(created_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        orders = orders.filter(created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+    return orders
+
+
+def export_rows(orders, kind="orders"):
+    """Columns and ``values()`` rows for orders or their items, fetched ``CHUNK_SIZE`` at a time."""
+    if kind == "items":
+        columns = ITEM_COLUMNS
+        rows = OrderItem.objects.filter(order__in=orders.order_by().values("id")).order_by("order_id", "id")
+    else:
+        columns = ORDER_COLUMNS
+        rows = orders.order_by("created_at", "id")
+    rows = rows.values(*[path for _, path in columns]).iterator(chunk_size=CHUNK_SIZE)
+    return columns, rows
+
+
+def _plain(value):
+    """Timestamps in full ISO 8601 (``2025-03-01T09:30:00.123456+00:00``), the same in every format."""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow([_plain(row[path]) for _, path in columns])
+
+
+def iter_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps({name: _plain(row[path]) for name, path in columns}, cls=DjangoJSONEncoder) + "\n"
+
+
+def iter_export(columns, rows, file_format="csv"):
+    if file_format == "ndjson":
+        return iter_ndjson(columns, rows)
+    return iter_csv(columns, rows)
+
+
+async def aiter_export(chunks):
+    """
+    Drive the (sync, DB-reading) ``chunks`` generator from the sync thread,
+    ``CHUNK_SIZE`` lines per hop, for ASGI. Handed a sync iterator, Django's
+    ASGI handler would first read it all into a list.
+    """
+    read = sync_to_async(lambda: "".join(itertools.islice(chunks, CHUNK_SIZE)))
+    try:
+        while block := await read():
+            yield block
+    finally:
+        await sync_to_async(chunks.close)()
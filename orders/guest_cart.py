@@ -0,0 +1,101 @@
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from products.models import ShopItem
+from .cart import ShopMismatch, apply_cart_operations, fold_operations, validate_operations
+from .models import Cart
+
+GUEST_CART_TTL = getattr(settings, "GUEST_CART_TTL", timedelta(days=7))
+GUEST_CART_HEADER = "X-Guest-Cart"
+
+_signer = signing.TimestampSigner(salt="orders.guest_cart")
+
+
+class GuestCart:
+    """
+    A basket for anonymous users, kept in the cache rather than the Cart table.
+
+    It is addressed by a signed token handed to the client, and holds the shop
+    id plus ``{shop_item_id: quantity}``. Nothing is written to the database
+    until the cart is merged into a customer's Cart rows at login.
+    """
+
+    def __init__(self, token=None):
+        self.key = self._unsign(token) if token else None
+        state = cache.get(self._cache_key()) if self.key else None
+        if state is None:
+            self.key = self.key or uuid.uuid4().hex
+            state = {"shop": None, "lines": {}}
+        self.shop_id = state["shop"]
+        self.lines = state["lines"]
+
+    @staticmethod
+    def _unsign(token):
+        try:
+            return _signer.unsign(token, max_age=GUEST_CART_TTL)
+        except signing.BadSignature:
+            # Tampered or expired: start a fresh cart under a new token.
+            return None
+
+    def _cache_key(self):
+        return f"guest-cart:{self.key}"
+
+    @property
+    def token(self):
+        return _signer.sign(self.key)
+
+    def save(self):
+        cache.set(self._cache_key(), {"shop": self.shop_id, "lines": self.lines}, GUEST_CART_TTL.total_seconds())
+
+    def clear(self):
+        self.shop_id, self.lines = None, {}
+        cache.delete(self._cache_key())
+
+    def apply(self, operations, reset=False):
+        """Same operations and shop rule as orders.cart.apply_cart_operations, applied to the cached lines."""
+        adding_shop = validate_operations(operations)
+        if adding_shop and self.lines and adding_shop != self.shop_id:
+            if not reset:
+                raise ShopMismatch()
+            self.lines = {}
+
+        quantities = fold_operations(dict(self.lines), operations)
+        self.lines = {shop_item_id: quantity for shop_item_id, quantity in quantities.items() if quantity > 0}
+        self.shop_id = (adding_shop or self.shop_id) if self.lines else None
+        self.save()
+
+    def cart_items(self):
+        """Unsaved Cart objects for the lines, loaded like orders.cart.cart_lines() in one query."""
+        shop_items = ShopItem.objects.filter(id__in=list(self.lines)).select_related("shop", "item__hsn").order_by("id")
+        return [Cart(shop_item=shop_item, quantity=self.lines[shop_item.id]) for shop_item in shop_items]
+
+    def merge_into(self, customer, reset=False):
+        """
+        Add the guest lines to the customer's cart with one bulk write and drop
+        the guest cart. When the saved cart holds another shop's items this
+        raises ShopMismatch and keeps the guest cart, so the customer can
+        choose; ``reset`` replaces the saved cart instead.
+        """
+        # Shop items deleted while the guest was browsing are dropped.
+        known = set(ShopItem.objects.filter(id__in=list(self.lines)).values_list("id", flat=True))
+        operations = [
+            {"shop_item": shop_item_id, "quantity": quantity, "op": "increment"}
+            for shop_item_id, quantity in self.lines.items()
+            if shop_item_id in known
+        ]
+        if operations:
+            apply_cart_operations(customer, operations, reset=reset)
+        merged = len(operations)
+        self.clear()
+        return merged
+
+
+def guest_cart_token(request):
+    """The guest cart token sent with a request, as a header, body field or query parameter."""
+    return (
+        request.headers.get(GUEST_CART_HEADER)
+        or (request.data.get("guest_cart") if hasattr(request.data, "get") else None)
+        or request.query_params.get("guest_cart")
+    )
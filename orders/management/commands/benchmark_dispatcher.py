@@ -0,0 +1,60 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from orders.dispatch import RiderIndex, haversine_km
+
+
+class Command(BaseCommand):
+    help = "Time k-nearest rider lookups on the dispatcher's grid index against a linear scan, with simulated riders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--riders", type=int, default=50000, help="Simulated riders.")
+        parser.add_argument("--queries", type=int, default=200, help="Lookups to time.")
+        parser.add_argument("-k", type=int, default=5, help="Riders returned per lookup.")
+        parser.add_argument("--center", default="11.2588,75.7804", help="lat,lng the riders are spread around.")
+        parser.add_argument("--spread", type=float, default=0.3, help="Half-width of the area, in degrees.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        lat0, lng0 = (float(part) for part in options["center"].split(","))
+        spread, k = options["spread"], options["k"]
+
+        def point():
+            return lat0 + rng.uniform(-spread, spread), lng0 + rng.uniform(-spread, spread)
+
+        riders = {rider_id: point() for rider_id in range(1, options["riders"] + 1)}
+        queries = [point() for _ in range(options["queries"])]
+
+        started = time.perf_counter()
+        index = RiderIndex()
+        for rider_id, (lat, lng) in riders.items():
+            index.upsert(rider_id, lat, lng)
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        indexed = [index.nearest(lat, lng, k=k) for lat, lng in queries]
+        grid = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scanned = [
+            sorted((haversine_km(lat, lng, r_lat, r_lng), rider_id) for rider_id, (r_lat, r_lng) in riders.items())[:k]
+            for lat, lng in queries
+        ]
+        linear = time.perf_counter() - started
+
+        mismatches = sum(
+            1 for got, want in zip(indexed, scanned)
+            if [round(distance, 9) for distance, _ in got] != [round(distance, 9) for distance, _ in want]
+        )
+
+        count = len(queries)
+        self.stdout.write(f"{len(riders)} riders, {count} queries, k={k}")
+        self.stdout.write(f"Index build:  {build * 1000:.1f} ms")
+        self.stdout.write(f"Grid index:   {grid * 1000:.1f} ms total, {grid / count * 1e6:.1f} us/query")
+        self.stdout.write(f"Linear scan:  {linear * 1000:.1f} ms total, {linear / count * 1e6:.1f} us/query")
+        self.stdout.write(f"Speed-up:     {linear / grid:.0f}x")
+        if mismatches:
+            self.stderr.write(self.style.ERROR(f"{mismatches} lookups disagreed with the linear scan."))
+        else:
+            self.stdout.write(self.style.SUCCESS("All lookups matched the linear scan."))
@@ -0,0 +1,36 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from orders.exports import FORMATS, export_rows, filter_orders, iter_export
+from orders.models import Order
+from reports.views import parse_day
+
+
+class Command(BaseCommand):
+    help = "Stream orders or order items to CSV / NDJSON with constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=["orders", "items"], default="orders")
+        parser.add_argument("--output-format", dest="file_format", choices=list(FORMATS), default="csv")
+        parser.add_argument("--shop", type=int, help="Only this shop id.")
+        parser.add_argument("--status", help="Only orders in this status.")
+        parser.add_argument("--from", dest="start", help="First day, inclusive (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="end", help="Last day, inclusive (YYYY-MM-DD).")
+        parser.add_argument("--file", help="Write here instead of stdout.")
+
+    def handle(self, *args, **options):
+        start = parse_day(options["start"]) if options["start"] else None
+        end = parse_day(options["end"]) if options["end"] else None
+        if (options["start"] and not start) or (options["end"] and not end):
+            raise CommandError("Dates must be in YYYY-MM-DD format.")
+
+        orders = filter_orders(Order.objects.all(), shop=options["shop"], status=options["status"], start=start, end=end)
+        columns, rows = export_rows(orders, options["kind"])
+        chunks = iter_export(columns, rows, options["file_format"])
+
+        if options["file"]:
+            with open(options["file"], "w", newline="", encoding="utf-8") as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from orders.models import Order
+from orders.totals import recompute_totals_for
+
+
+class Command(BaseCommand):
+    help = "Re-total historical orders from their items in chunks of single UPDATE statements."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Orders updated per statement.")
+        parser.add_argument("--shop", type=int, help="Only orders of this shop id.")
+        parser.add_argument("--since", help="Only orders created on or after this date (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options["shop"]:
+            orders = orders.filter(shop_id=options["shop"])
+        if options["since"]:
+            try:
+                since = parse_date(options["since"])
+            except ValueError:  # well-formed but not a real date, e.g. 2025-02-30
+                since = None
+            if since is None:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+            orders = orders.filter(created_at__date__gte=since)
+
+        chunk_size = max(options["chunk_size"], 1)
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(orders.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:chunk_size])
+            if not ids:
+                break
+            updated += recompute_totals_for(Order.objects.filter(id__in=ids))
+            last_id = ids[-1]
+            self.stdout.write(f"Re-totalled {updated} orders (last id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {updated} orders re-totalled."))
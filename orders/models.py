@@ -1,5 +1,7 @@
 from decimal import ROUND_HALF_UP, Decimal
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from shop.models import Shop
 from products.models import ShopItem
 from user.models import Address, User
@@ -61,34 +63,41 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def calculate_totals(self):
-        total_inclusive = Decimal("0.00")
-        total_gst = Decimal("0.00")
-        total_taxable = Decimal("0.00")
+    class Meta:
+        indexes = [
+            # Keyset pagination of order history over (created_at, id) per role.
+            models.Index(fields=["customer", "created_at", "id"], name="order_customer_created_idx"),
+            models.Index(fields=["shop", "created_at", "id"], name="order_shop_created_idx"),
+            models.Index(fields=["created_at", "id"], name="order_created_idx"),
+        ]
 
-        for item in self.items.all():
-            total_inclusive += item.subtotal
-            total_gst += item.gst
-            total_taxable += item.taxable_amount
+    def calculate_totals(self):
+        """Set total_price, gst and taxable_total from the items with one aggregate query (no save)."""
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        zero = models.Value(Decimal("0.00"))
+        totals = self.items.aggregate(
+            inclusive=Coalesce(models.Sum(models.F("price") * models.F("quantity"), output_field=money), zero, output_field=money),
+            gst=Coalesce(models.Sum("gst"), zero, output_field=money),
+            taxable=Coalesce(models.Sum("taxable_amount"), zero, output_field=money),
+        )
 
         if not self.delivery_charge:
             self.delivery_charge = Decimal("0.00")
 
-        # Use delivery conditions if not set
-        if self.delivery_charge == Decimal("0.00") and self.shop and self.shop.delivery_conditions.exists():
-            cond = self.shop.delivery_conditions.first()
-            if hasattr(cond, "delivery_charge"):
-                self.delivery_charge = Decimal(str(cond.delivery_charge))
+        self.gst = Decimal(totals["gst"]).quantize(Decimal("0.01"))
+        self.taxable_total = Decimal(totals["taxable"]).quantize(Decimal("0.01"))
+        self.total_price = (Decimal(totals["inclusive"]) + self.delivery_charge).quantize(Decimal("0.01"))
 
-        self.gst = total_gst.quantize(Decimal("0.01"))
-        self.taxable_total = total_taxable.quantize(Decimal("0.01"))
-        self.total_price = (total_inclusive + self.delivery_charge).quantize(Decimal("0.01"))
-
-    def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
+    def recalculate_totals(self):
+        """Recompute totals and persist them with a single UPDATE."""
         self.calculate_totals()
-        super().save(update_fields=["total_price", "gst", "taxable_total", "delivery_charge", "updated_at"])
+        Order.objects.filter(pk=self.pk).update(
+            total_price=self.total_price,
+            gst=self.gst,
+            taxable_total=self.taxable_total,
+            delivery_charge=self.delivery_charge,
+            updated_at=timezone.now(),
+        )
 
     def __str__(self):
         return f"Order {self.id} - {self.customer}"
@@ -102,19 +111,24 @@ class OrderItem(models.Model):
     gst = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     taxable_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
-    def calculate_gst(self):
-        """Extract GST portion and taxable amount from a GST-inclusive price."""
-        hsn = getattr(self.shop_item.item, "hsn", None)
-        gst_percent = Decimal(hsn.gst) if hsn and getattr(hsn, "gst", None) is not None else Decimal("0.00")
-
+    @staticmethod
+    def split_gst(price, gst_percent, quantity):
+        """Split a GST-inclusive unit price into (taxable_amount, gst) for ``quantity`` units."""
         divisor = (Decimal("100.00") + gst_percent) / Decimal("100.00")
 
         # Price already includes GST
-        taxable_per_unit = (self.price / divisor).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        gst_per_unit = (self.price - taxable_per_unit).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        taxable_per_unit = (price / divisor).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        gst_per_unit = (price - taxable_per_unit).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-        self.taxable_amount = (taxable_per_unit * self.quantity).quantize(Decimal("0.01"))
-        self.gst = (gst_per_unit * self.quantity).quantize(Decimal("0.01"))
+        taxable_amount = (taxable_per_unit * quantity).quantize(Decimal("0.01"))
+        gst = (gst_per_unit * quantity).quantize(Decimal("0.01"))
+        return taxable_amount, gst
+
+    def calculate_gst(self):
+        """Extract GST portion and taxable amount from a GST-inclusive price."""
+        hsn = getattr(self.shop_item.item, "hsn", None)
+        gst_percent = Decimal(hsn.gst) if hsn and getattr(hsn, "gst", None) is not None else Decimal("0.00")
+        self.taxable_amount, self.gst = self.split_gst(self.price, gst_percent, self.quantity)
 
     def save(self, *args, **kwargs):
         self.calculate_gst()
@@ -129,3 +143,47 @@ class OrderItem(models.Model):
         return f"{self.quantity} x {self.shop_item.item.name}"
 
 
+class OrderStatusHistory(models.Model):
+    """Append-only log of status and payment status changes, read back as an order's timeline."""
+    FIELD_CHOICES = [
+        ("status", "Status"),
+        ("payment_status", "Payment Status"),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="status_history")
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES, default="status")
+    from_value = models.CharField(max_length=20, blank=True)
+    to_value = models.CharField(max_length=20)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(fields=["order", "created_at", "id"], name="order_history_timeline_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Order status history is append-only.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Order {self.order_id} {self.field}: {self.from_value or '-'} -> {self.to_value}"
+
+
+class DeliveryBoyLocation(models.Model):
+    """Last reported position and availability of a delivery boy."""
+    delivery_boy = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="delivery_location",
+        limit_choices_to={"role": "deliveryboy"},
+    )
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    is_available = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.delivery_boy.username} @ {self.latitude}, {self.longitude}"
@@ -2,7 +2,7 @@ from decimal import Decimal
 from rest_framework import serializers
 from user.serializers import AddressSerializer
 from .models import Order, OrderItem
-from .models import Cart
+from .models import Cart, DeliveryBoyLocation
 
 class CartSerializer(serializers.ModelSerializer):
     shop_item_name = serializers.CharField(source="shop_item.item.name", read_only=True)
@@ -30,7 +30,7 @@ class CartSerializer(serializers.ModelSerializer):
         ]
 
     def get_price(self, obj):
-        return obj.shop_item.get_offer_price()
+        return obj.shop_item.effective_price
 
     def get_shop_lat(self, obj):
         lat = getattr(obj.shop_item.shop, "latitude", None)
@@ -50,7 +50,19 @@ class CartSerializer(serializers.ModelSerializer):
         return None
 
 
-    
+class CartOperationSerializer(serializers.Serializer):
+    OP_CHOICES = ["set", "increment", "remove"]
+
+    shop_item = serializers.IntegerField()  # validated in bulk by orders.cart.apply_cart_operations
+    quantity = serializers.IntegerField(min_value=0, default=1)
+    op = serializers.ChoiceField(choices=OP_CHOICES, default="set")
+
+
+class BulkCartSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=200)
+    reset = serializers.BooleanField(default=False)
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     shop_item_name = serializers.CharField(source="shop_item.item.name", read_only=True)
     subtotal = serializers.SerializerMethodField()
@@ -74,7 +86,43 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return (obj.price * obj.quantity).quantize(Decimal("0.01"))
 
 
-class OrderSerializer(serializers.ModelSerializer):
+def query_param_list(request, name):
+    """Comma-separated query parameter as a set, e.g. ``?expand=items`` -> {"items"}."""
+    if request is None:
+        return set()
+    return {value.strip() for value in request.query_params.get(name, "").split(",") if value.strip()}
+
+
+class ExpandableFieldsMixin:
+    """
+    Shape the serialized fields from the request's query string.
+
+    Fields listed in ``expandable_fields`` (expand name -> field name) are left
+    out unless asked for with ``?expand=``; ``?fields=a,b`` keeps only those fields.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method != "GET":
+            return
+
+        expand = query_param_list(request, "expand")
+        for name, field_name in self.expandable_fields.items():
+            if name not in expand:
+                self.fields.pop(field_name, None)
+
+        only = query_param_list(request, "fields")
+        if only:
+            only |= {self.expandable_fields[name] for name in expand if name in self.expandable_fields}
+            for field_name in set(self.fields) - only:
+                self.fields.pop(field_name)
+
+
+class OrderSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"items": "items_details"}
+
     items = OrderItemSerializer(many=True, write_only=True)
     items_details = OrderItemSerializer(source="items", many=True, read_only=True)
 
@@ -107,6 +155,9 @@ class OrderSerializer(serializers.ModelSerializer):
             "delivery_address",
         ]
         read_only_fields = [
+            # Changed only through update-status / update-payment-status (orders.status).
+            "status",
+            "payment_status",
             "created_at",
             "updated_at",
             "items_details",
@@ -120,11 +171,13 @@ class OrderSerializer(serializers.ModelSerializer):
         items_data = validated_data.pop("items", [])
         order = Order.objects.create(**validated_data)
 
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        order_items = [OrderItem(order=order, **item_data) for item_data in items_data]
+        for order_item in order_items:
+            order_item.calculate_gst()
+        # bulk_create skips the per-item totals signal; re-total once below.
+        OrderItem.objects.bulk_create(order_items)
 
-        order.calculate_totals()
-        order.save(update_fields=["total_price", "gst", "taxable_total", "delivery_charge"])
+        order.recalculate_totals()
         return order
 
 
@@ -163,3 +216,10 @@ class DistanceInputSerializer(serializers.Serializer):
     shop_lng = serializers.FloatField()
     shop_id = serializers.IntegerField()  # ID of the Shop for delivery condition
     total_order_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class DeliveryLocationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeliveryBoyLocation
+        fields = ["latitude", "longitude", "is_available", "updated_at"]
+        read_only_fields = ["updated_at"]
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from jobs.queue import enqueue
+from .events import ORDER_CREATED, publish_order_event
+from .models import Order, OrderItem
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def recalculate_order_totals(sender, instance, origin=None, **kwargs):
+    """Re-total the parent order in the background whenever one of its items changes."""
+    # Items deleted as part of deleting their order need no recompute.
+    if isinstance(origin, Order):
+        return
+    enqueue("orders.recompute_totals", {"order_id": instance.order_id})
+
+
+@receiver(post_save, sender=Order)
+def announce_new_order(sender, instance, created, **kwargs):
+    if created:
+        publish_order_event(instance, ORDER_CREATED)
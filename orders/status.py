@@ -0,0 +1,227 @@
+from django.db import transaction
+from django.utils import timezone
+from products.inventory import release_stock, reserve_stock
+from reports.rollups import record_order_change, record_orders_changed
+from .dispatch import dispatch_after_status_change
+from .models import Order, OrderItem, OrderStatusHistory
+
+# Allowed moves for each status. Completed orders are final; cancelled ones can
+# only be reopened as pending (which takes their stock back).
+STATUS_TRANSITIONS = {
+    "pending": {"accepted", "cancelled"},
+    "accepted": {"preparing", "out_for_delivery", "cancelled"},
+    "preparing": {"out_for_delivery", "cancelled"},
+    "out_for_delivery": {"completed", "cancelled"},
+    "completed": set(),
+    "cancelled": {"pending"},
+}
+
+PAYMENT_STATUS_TRANSITIONS = {
+    "pending": {"paid", "failed"},
+    "failed": {"pending", "paid"},
+    "paid": {"refunded"},
+    "refunded": set(),
+}
+
+TRANSITIONS = {
+    "status": STATUS_TRANSITIONS,
+    "payment_status": PAYMENT_STATUS_TRANSITIONS,
+}
+
+
+class StatusConflict(Exception):
+    """Raised when the order's status changed underneath the caller."""
+
+
+class InvalidTransition(Exception):
+    """Raised when the transition table does not allow the requested move."""
+
+    def __init__(self, field, current, target):
+        self.field = field
+        self.current = current
+        self.target = target
+        self.allowed = sorted(TRANSITIONS[field].get(current, ()))
+        super().__init__(f"Cannot change {field.replace('_', ' ')} from '{current}' to '{target}'.")
+
+
+def check_transition(field, current, target):
+    if target not in TRANSITIONS[field].get(current, ()):
+        raise InvalidTransition(field, current, target)
+
+
+def record_history(order, field, previous, user=None, when=None):
+    OrderStatusHistory.objects.create(
+        order=order,
+        field=field,
+        from_value=previous,
+        to_value=getattr(order, field),
+        changed_by=user,
+        created_at=when or timezone.now(),
+    )
+
+
+def _claim(order, field, new_value, expected=None):
+    """
+    ``UPDATE ... WHERE <field>=<expected>`` for one order, after checking the
+    move against the transition table. ``expected`` defaults to the value on
+    ``order``; a client can pass the value it last saw so that it never
+    overwrites a change it has not seen. Returns the previous value.
+    """
+    previous = getattr(order, field) if expected is None else expected
+    if getattr(order, field) != previous:
+        raise StatusConflict(f"Order {order.pk} {field.replace('_', ' ')} is no longer '{previous}'.")
+    check_transition(field, previous, new_value)
+
+    now = timezone.now()
+    claimed = Order.objects.filter(pk=order.pk, **{field: previous}).update(**{field: new_value, "updated_at": now})
+    if not claimed:
+        raise StatusConflict(f"Order {order.pk} {field.replace('_', ' ')} is no longer '{previous}'.")
+    setattr(order, field, new_value)
+    order.updated_at = now
+    return previous
+
+
+def change_status(order, new_status, user=None, expected=None):
+    """
+    Move ``order`` to ``new_status``, keeping reserved stock in step.
+
+    The move must be allowed by STATUS_TRANSITIONS, and the write is
+    ``UPDATE ... WHERE status=<expected>``, so when two requests race only one
+    of them wins, and stock is released once on cancellation and re-reserved
+    once if a cancelled order is reopened. Accepted orders get the nearest free
+    delivery boy (see orders.dispatch). Raises InvalidTransition,
+    StatusConflict if the status is no longer ``expected`` (by default the one
+    ``order`` was loaded with), or products.inventory.InsufficientStock if
+    reopening cannot get its stock back.
+    """
+    if new_status == order.status and expected in (None, new_status):
+        return order
+
+    with transaction.atomic():
+        previous = _claim(order, "status", new_status, expected)
+
+        if new_status == "cancelled" or previous == "cancelled":
+            quantities = {}
+            for shop_item_id, quantity in order.items.values_list("shop_item_id", "quantity"):
+                quantities[shop_item_id] = quantities.get(shop_item_id, 0) + quantity
+            if new_status == "cancelled":
+                release_stock(quantities)
+            else:
+                reserve_stock(quantities)
+
+        record_history(order, "status", previous, user, order.updated_at)
+        record_order_change(order, previous, order.payment_status)
+        dispatch_after_status_change(order, previous)
+    return order
+
+
+def change_payment_status(order, new_payment_status, user=None, expected=None):
+    """
+    Move ``order`` to ``new_payment_status`` along PAYMENT_STATUS_TRANSITIONS with
+    ``UPDATE ... WHERE payment_status=<expected>``, keeping the sales rollups in
+    step (refunds leave them). Raises InvalidTransition or StatusConflict.
+    """
+    if new_payment_status == order.payment_status and expected in (None, new_payment_status):
+        return order
+
+    with transaction.atomic():
+        previous = _claim(order, "payment_status", new_payment_status, expected)
+        record_history(order, "payment_status", previous, user, order.updated_at)
+        record_order_change(order, order.status, previous)
+    return order
+
+
+def _bulk_change(orders, ids, field, value, user=None, blocked=None):
+    """
+    Set ``field`` to ``value`` on the orders in ``ids`` that ``orders`` (the
+    caller's visible queryset) contains, without row locks: one ownership
+    read, then one ``UPDATE ... WHERE pk IN (...) AND <field>=<previous>`` per
+    previous value, like _claim does for a single order.
+
+    Orders the transition table does not allow to move are reported as
+    "invalid_transition"; those for which ``blocked(order)`` is true, or
+    whose value changed between the read and the UPDATE, as "conflict".
+    Returns ``(results, changed, previous)``: a result per requested id
+    ("updated", "unchanged", "invalid_transition", "conflict" or
+    "not_found"), the changed Order objects (already carrying the new value)
+    and their previous ``(status, payment_status)`` by id.
+    """
+    now = timezone.now()
+    results = {order_id: "not_found" for order_id in ids}
+    with transaction.atomic():
+        groups = {}
+        for order in orders.filter(pk__in=ids).select_related("shop").order_by("pk"):
+            current = getattr(order, field)
+            if current == value:
+                results[order.pk] = "unchanged"
+            elif value not in TRANSITIONS[field].get(current, ()):
+                results[order.pk] = "invalid_transition"
+            elif blocked and blocked(order):
+                results[order.pk] = "conflict"
+            else:
+                groups.setdefault(current, []).append(order)
+
+        changed, previous = [], {}
+        for current, group in groups.items():
+            pks = [order.pk for order in group]
+            claimed = Order.objects.filter(pk__in=pks, **{field: current}).update(**{field: value, "updated_at": now})
+            if claimed < len(pks):
+                # Some moved on since the read; the rows this UPDATE wrote carry its timestamp.
+                won = set(Order.objects.filter(pk__in=pks, **{field: value, "updated_at": now}).values_list("pk", flat=True))
+                group = [order for order in group if order.pk in won]
+            for order in group:
+                previous[order.pk] = (order.status, order.payment_status)
+                setattr(order, field, value)
+                order.updated_at = now
+                changed.append(order)
+            for pk in pks:
+                results[pk] = "updated" if pk in previous else "conflict"
+        changed.sort(key=lambda order: order.pk)
+
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(
+                order=order,
+                field=field,
+                from_value=previous[order.pk][0 if field == "status" else 1],
+                to_value=value,
+                changed_by=user,
+                created_at=now,
+            )
+            for order in changed
+        ])
+    return results, changed, previous
+
+
+def bulk_change_status(orders, ids, new_status, user=None):
+    """
+    Move every order in ``ids`` visible through ``orders`` to ``new_status`` with conditional UPDATEs.
+
+    Cancelled orders give their stock back in one statement. Orders leaving
+    "cancelled" are not reopened here, since each needs its own stock check;
+    they are reported as "conflict" and left for change_status.
+    """
+    with transaction.atomic():
+        results, changed, previous = _bulk_change(
+            orders, ids, "status", new_status, user, blocked=lambda order: order.status == "cancelled"
+        )
+
+        if new_status == "cancelled" and changed:
+            quantities = {}
+            items = OrderItem.objects.filter(order__in=[order.pk for order in changed])
+            for shop_item_id, quantity in items.values_list("shop_item_id", "quantity"):
+                quantities[shop_item_id] = quantities.get(shop_item_id, 0) + quantity
+            release_stock(quantities)
+
+        record_orders_changed(changed, previous)
+        claimed = set()
+        for order in changed:
+            dispatch_after_status_change(order, previous[order.pk][0], claimed=claimed)
+    return results, changed
+
+
+def bulk_change_payment_status(orders, ids, new_payment_status, user=None):
+    """Batch form of change_payment_status: conditional UPDATEs, with rollups adjusted per shop and day."""
+    with transaction.atomic():
+        results, changed, previous = _bulk_change(orders, ids, "payment_status", new_payment_status, user)
+        record_orders_changed(changed, previous)
+    return results, changed
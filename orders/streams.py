@@ -0,0 +1,84 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from shop.models import Shop
+from .events import broker
+
+HEARTBEAT_SECONDS = 15
+
+
+def _raw_token(request):
+    """JWT from the Authorization header, or ``?token=`` since EventSource cannot set headers."""
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        return header[len("Bearer "):].strip()
+    return request.GET.get("token")
+
+
+async def _authenticate(request):
+    raw = _raw_token(request)
+    if not raw:
+        return None
+    auth = JWTAuthentication()
+    try:
+        validated = auth.get_validated_token(raw)
+        return await sync_to_async(auth.get_user)(validated)
+    except (InvalidToken, TokenError):
+        return None
+
+
+def _format(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _event_stream(shop_id, last_event_id):
+    # Subscribe on first read so a stream that is never consumed holds no subscription.
+    subscription = broker.subscribe(shop_id, last_event_id=last_event_id)
+    try:
+        yield f"retry: {HEARTBEAT_SECONDS * 1000}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield _format(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def shop_order_events(request, shop_id):
+    """
+    Server-Sent Events feed of order created / status / payment-status changes for one shop.
+
+    Needs an ASGI server (e.g. ``uvicorn backend.asgi:application``): each
+    open stream is a coroutine parked on a queue, not a thread.
+
+    Events travel through the in-process OrderEventBroker, so they only reach
+    streams held by the process that changed the order. The whole API must
+    run in that one ASGI process: orders updated through WSGI workers, or a
+    second ASGI worker, would never show up here (see ASGI_APPLICATION in
+    backend/settings.py).
+    """
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+
+    shops = Shop.objects.filter(id=shop_id)
+    if not user.is_superuser:
+        shops = shops.filter(owner=user)
+    if not await shops.aexists():
+        return JsonResponse({"detail": "Shop not found."}, status=404)
+
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(_event_stream(shop_id, last_event_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,10 @@
+from jobs.queue import task
+from .models import Order
+
+
+@task("orders.recompute_totals")
+def recompute_totals(order_id):
+    """Re-total an order after its items changed."""
+    order = Order.objects.filter(pk=order_id).first()
+    if order:
+        order.recalculate_totals()
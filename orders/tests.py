@@ -1,3 +1,1097 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
+from backend.pagination import KeysetPagination
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from jobs.queue import claim_jobs, run_job
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from products.models import Category, HSN, Item, ShopItem, ShopItemOffer, SubCategory
+from reports.models import ShopDailyStatusCount
+from shop.models import Shop
+from user.models import User
+from .cart import ShopMismatch, add_to_cart, cart_lines, cart_summary
+from .checkout import CheckoutError, place_order
+from .dispatch import Dispatcher
+from .events import ORDER_CREATED, OrderEventBroker, broker
+from .models import Cart, DeliveryBoyLocation, Order, OrderItem, OrderStatusHistory
+from .status import (
+    InvalidTransition, StatusConflict,
+    _bulk_change, bulk_change_payment_status, bulk_change_status, change_payment_status, change_status,
+)
+from .streams import shop_order_events
 
-# Create your tests here.
+
+def run_due_jobs():
+    """Run queued jobs in this thread, inside the test's transaction (run_jobs uses a thread pool)."""
+    for job in claim_jobs("tests", limit=100):
+        run_job(job)
+
+
+def make_shop(owner, items=3, name="Shop", quantity=10):
+    """A shop with ``items`` shop items priced 105.00, 106.00, ...; odd-numbered ones carry a 5% HSN."""
+    shop = Shop.objects.create(name=name, owner=owner, gst_number=f"GST-{name}", contact_number="1")
+    category, _ = Category.objects.get_or_create(name="Food")
+    subcategory, _ = SubCategory.objects.get_or_create(category=category, name="Meals")
+    hsn, _ = HSN.objects.get_or_create(hsncode="1001", defaults={"gst": Decimal("5.00")})
+    shop_items = [
+        ShopItem.objects.create(
+            shop=shop,
+            item=Item.objects.create(subcategory=subcategory, name=f"{name} item {n}", hsn=hsn if n % 2 else None),
+            total_amount=Decimal("105.00") + n,
+            available_quantity=quantity,
+        )
+        for n in range(items)
+    ]
+    return shop, shop_items
+
+
+def order_from(customer, shop_items, quantity=1, **kwargs):
+    for shop_item in shop_items:
+        Cart.objects.create(customer=customer, shop_item=shop_item, quantity=quantity)
+    return place_order(customer, **kwargs)
+
+
+class InventoryReservationTests(TransactionTestCase):
+    """Checkout stock reservation under concurrency (needs a file-backed SQLite test DB)."""
+
+    def setUp(self):
+        owner = User.objects.create(username="owner", role="shopadmin")
+        self.shop = Shop.objects.create(name="Shop", owner=owner, gst_number="GST1", contact_number="1")
+        subcategory = SubCategory.objects.create(category=Category.objects.create(name="Food"), name="Meals")
+        hsn = HSN.objects.create(hsncode="1001", gst=Decimal("5.00"))
+        self.items = [
+            ShopItem.objects.create(
+                shop=self.shop,
+                item=Item.objects.create(subcategory=subcategory, name=f"Item {n}", hsn=hsn),
+                total_amount=Decimal("100.00"),
+                available_quantity=10,
+            )
+            for n in range(2)
+        ]
+
+    def make_customer(self, n, quantity=1):
+        customer = User.objects.create(username=f"customer{n}", role="customer", mobile_number=str(n))
+        for shop_item in self.items:
+            Cart.objects.create(customer=customer, shop_item=shop_item, quantity=quantity)
+        return customer
+
+    def test_rejects_oversold_lines(self):
+        customer = self.make_customer(1, quantity=11)
+
+        with self.assertRaises(CheckoutError) as ctx:
+            place_order(customer)
+
+        self.assertEqual({line["shop_item"] for line in ctx.exception.unavailable}, {item.id for item in self.items})
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(Cart.objects.filter(customer=customer).count(), 2)
+        for shop_item in self.items:
+            shop_item.refresh_from_db()
+            self.assertEqual(shop_item.available_quantity, 10)
+
+    def test_cancel_releases_stock(self):
+        order = place_order(self.make_customer(1, quantity=3))
+        self.assertEqual(ShopItem.objects.get(pk=self.items[0].pk).available_quantity, 7)
+
+        change_status(order, "cancelled")
+        change_status(Order.objects.get(pk=order.pk), "cancelled")
+
+        for shop_item in self.items:
+            shop_item.refresh_from_db()
+            self.assertEqual(shop_item.available_quantity, 10)
+
+    def test_parallel_checkouts_never_oversell(self):
+        workers = 25
+        customers = [self.make_customer(n) for n in range(workers)]
+        barrier = threading.Barrier(workers)
+        placed, rejected, errors = [], [], []
+
+        def checkout(customer):
+            try:
+                barrier.wait()
+                placed.append(place_order(customer).id)
+            except CheckoutError:
+                rejected.append(customer.id)
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(customer,)) for customer in customers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(placed), 10)
+        self.assertEqual(len(rejected), workers - 10)
+        for shop_item in self.items:
+            shop_item.refresh_from_db()
+            self.assertEqual(shop_item.available_quantity, 0)
+            self.assertEqual(OrderItem.objects.filter(shop_item=shop_item).count(), 10)
+
+
+class CartUpsertTests(TransactionTestCase):
+    """Add-to-cart increments under concurrency (needs a file-backed SQLite test DB)."""
+
+    def setUp(self):
+        owner = User.objects.create(username="owner", role="shopadmin")
+        subcategory = SubCategory.objects.create(category=Category.objects.create(name="Food"), name="Meals")
+        self.shop_items = [
+            ShopItem.objects.create(
+                shop=Shop.objects.create(name=f"Shop {n}", owner=owner, gst_number=f"GST{n}", contact_number="1"),
+                item=Item.objects.create(subcategory=subcategory, name=f"Item {n}"),
+                total_amount=Decimal("100.00"),
+                available_quantity=10,
+            )
+            for n in range(2)
+        ]
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+
+    def test_parallel_adds_to_the_same_item_are_all_counted(self):
+        workers = 20
+        barrier = threading.Barrier(workers)
+        errors = []
+
+        def add():
+            try:
+                barrier.wait()
+                add_to_cart(self.customer, self.shop_items[0], 2)
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        line = Cart.objects.get(customer=self.customer)
+        self.assertEqual(line.quantity, workers * 2)
+
+    def test_other_shop_requires_reset(self):
+        add_to_cart(self.customer, self.shop_items[0])
+
+        with self.assertRaises(ShopMismatch):
+            add_to_cart(self.customer, self.shop_items[1])
+
+        line = add_to_cart(self.customer, self.shop_items[1], 3, reset=True)
+        self.assertEqual(line.quantity, 3)
+        self.assertEqual(list(Cart.objects.filter(customer=self.customer).values_list("shop_item", flat=True)), [self.shop_items[1].id])
+
+
+class OrderTotalsTests(TestCase):
+    def setUp(self):
+        self.shop, shop_items = make_shop(User.objects.create(username="owner", role="shopadmin"))
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.order = order_from(self.customer, shop_items, quantity=2, delivery_charge=Decimal("7.00"))
+
+    def test_calculate_totals_matches_items(self):
+        items = list(self.order.items.all())
+        order = Order.objects.get(pk=self.order.pk)
+        Order.objects.filter(pk=order.pk).update(total_price=0, gst=0, taxable_total=0)
+        order = Order.objects.get(pk=order.pk)
+
+        with self.assertNumQueries(1):
+            order.calculate_totals()
+
+        self.assertEqual(order.total_price, sum(item.price * item.quantity for item in items) + Decimal("7.00"))
+        self.assertEqual(order.gst, sum(item.gst for item in items))
+        self.assertEqual(order.taxable_total, sum(item.taxable_amount for item in items))
+
+    def test_calculate_totals_without_items(self):
+        order = Order.objects.create(customer=self.customer, shop=self.shop)
+        order.calculate_totals()
+        self.assertEqual((order.total_price, order.gst, order.taxable_total), (Decimal("0.00"),) * 3)
+
+    def test_item_changes_retotal_through_the_job_queue(self):
+        expected = Order.objects.get(pk=self.order.pk).total_price
+        item = self.order.items.first()
+        item.quantity += 1
+        item.save()
+        run_due_jobs()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).total_price, expected + item.price)
+
+        item.delete()
+        run_due_jobs()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).total_price, expected + item.price - item.price * item.quantity)
+
+    def test_recompute_command(self):
+        expected = Order.objects.get(pk=self.order.pk)
+        Order.objects.filter(pk=self.order.pk).update(total_price=0, gst=0, taxable_total=0)
+
+        call_command("recompute_order_totals", "--chunk-size", "1", stdout=StringIO())
+
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(
+            (order.total_price, order.gst, order.taxable_total),
+            (expected.total_price, expected.gst, expected.taxable_total),
+        )
+
+    def test_recompute_command_rejects_bad_dates(self):
+        Order.objects.filter(pk=self.order.pk).update(total_price=0)
+        for since in ("2025-13-01", "2025-02-30", "yesterday"):
+            with self.assertRaisesMessage(CommandError, "YYYY-MM-DD"):
+                call_command("recompute_order_totals", "--since", since, stdout=StringIO())
+        self.assertEqual(Order.objects.get(pk=self.order.pk).total_price, 0)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.shop, self.shop_items = make_shop(User.objects.create(username="owner", role="shopadmin"), items=10, quantity=50)
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        hsn = HSN.objects.create(hsncode="2002", gst=Decimal("18.00"))
+        Item.objects.filter(shopitems__in=self.shop_items[::3]).update(hsn=hsn)
+        self.shop_items[1].total_amount = Decimal("99.99")
+        self.shop_items[1].save()
+
+    def test_query_count_does_not_depend_on_cart_lines(self):
+        order_from(self.customer, self.shop_items[:1])
+        Cart.objects.create(customer=self.customer, shop_item=self.shop_items[0])
+        with CaptureQueriesContext(connection) as one_line:
+            place_order(self.customer)
+
+        for shop_item in self.shop_items:
+            Cart.objects.create(customer=self.customer, shop_item=shop_item, quantity=2)
+        with self.assertNumQueries(len(one_line)):
+            order = place_order(self.customer)
+        self.assertEqual(order.items.count(), 10)
+
+    def test_totals_match_saving_items_one_by_one(self):
+        quantities = [n % 3 + 1 for n in range(len(self.shop_items))]
+        for shop_item, quantity in zip(self.shop_items, quantities):
+            Cart.objects.create(customer=self.customer, shop_item=shop_item, quantity=quantity)
+        order = place_order(self.customer, delivery_charge=Decimal("7.50"))
+
+        # The per-item path checkout replaced: OrderItem.save() splits GST, then the order is totalled.
+        expected = Order.objects.create(customer=self.customer, shop=self.shop, delivery_charge=Decimal("7.50"))
+        for shop_item, quantity in zip(ShopItem.objects.filter(pk__in=[item.pk for item in self.shop_items]).order_by("id"), quantities):
+            OrderItem(order=expected, shop_item=shop_item, quantity=quantity, price=shop_item.effective_price).save()
+        expected.calculate_totals()
+
+        def lines(order):
+            return list(order.items.order_by("shop_item_id").values_list("shop_item_id", "quantity", "price", "gst", "taxable_amount"))
+
+        self.assertEqual(lines(order), lines(expected))
+        self.assertEqual(
+            (order.total_price, order.gst, order.taxable_total),
+            (expected.total_price, expected.gst, expected.taxable_total),
+        )
+        stored = Order.objects.get(pk=order.pk)
+        self.assertEqual((stored.total_price, stored.gst, stored.taxable_total), (order.total_price, order.gst, order.taxable_total))
+
+
+class OrderListQueryTests(TestCase):
+    """The order list costs a fixed number of queries however many orders it shows."""
+
+    def setUp(self):
+        self.owner = User.objects.create(username="owner", role="shopadmin")
+        self.shop, self.shop_items = make_shop(self.owner)
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def place_orders(self, count):
+        for _ in range(count):
+            order_from(self.customer, self.shop_items)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def assertQueriesFlat(self, url):
+        self.place_orders(2)
+        with CaptureQueriesContext(connection) as few:
+            self.get(url)
+        self.place_orders(8)
+        with self.assertNumQueries(len(few)):
+            rows = self.get(url)
+        self.assertEqual(len(rows), 10)
+        return rows
+
+    def test_list_without_expansion(self):
+        rows = self.assertQueriesFlat("/api/orders/orders/")
+        self.assertNotIn("items_details", rows[0])
+        self.assertEqual(rows[0]["shop_name"], "Shop")
+        self.assertEqual(rows[0]["customer_name"], "customer")
+
+    def test_list_with_expanded_items(self):
+        rows = self.assertQueriesFlat("/api/orders/orders/?expand=items")
+        self.assertEqual(len(rows[0]["items_details"]), 3)
+
+    def test_fields_keep_expanded_items(self):
+        rows = self.assertQueriesFlat("/api/orders/orders/?fields=id,status&expand=items")
+        self.assertEqual(set(rows[0]), {"id", "status", "items_details"})
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create(username="owner", role="shopadmin")
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        shop, _ = make_shop(owner, items=0)
+        Order.objects.bulk_create([Order(customer=self.customer, shop=shop) for _ in range(45)])
+        # Ties on created_at must be broken by id without skipping or repeating rows.
+        first = Order.objects.order_by("id").first()
+        Order.objects.filter(id__lt=first.id + 10).update(created_at=first.created_at)
+        self.expected = list(Order.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse([q["sql"] for q in queries if "COUNT(" in q["sql"] or "OFFSET" in q["sql"]])
+            pages.append([row["id"] for row in response.json()["results"]])
+            url = response.json()[link]
+        return pages
+
+    def test_forward_round_trip(self):
+        pages = self.walk("/api/orders/orders/?page_size=7", "next")
+        self.assertEqual([len(page) for page in pages], [7] * 6 + [3])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_backward_from_the_last_page(self):
+        url = "/api/orders/orders/?page_size=7"
+        while True:
+            body = self.client.get(url).json()
+            if not body["next"]:
+                break
+            url = body["next"]
+        pages = self.walk(body["previous"], "previous")
+        self.assertEqual(sum(reversed(pages), []) + [row["id"] for row in body["results"]], self.expected)
+
+    def test_first_page_has_no_previous_link(self):
+        body = self.client.get("/api/orders/orders/?page_size=50").json()
+        self.assertIsNone(body["previous"])
+        self.assertIsNone(body["next"])
+        self.assertEqual(len(body["results"]), 45)
+
+    def test_invalid_cursor(self):
+        cursors = ["garbage", "eyJwIjpbMV19", KeysetPagination().encode_cursor(["not a date", 1], False)]
+        for cursor in cursors:
+            response = self.client.get("/api/orders/orders/", {"cursor": cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+
+class OrderEventBrokerTests(SimpleTestCase):
+    async def test_delivers_to_the_shops_subscribers_only(self):
+        broker = OrderEventBroker()
+        mine, other = broker.subscribe(1), broker.subscribe(2)
+
+        event = broker.publish(1, {"type": ORDER_CREATED})
+
+        self.assertEqual(await asyncio.wait_for(mine.get(), 1), event)
+        await asyncio.sleep(0)
+        self.assertTrue(other.queue.empty())
+
+    async def test_replays_events_after_last_event_id(self):
+        broker = OrderEventBroker()
+        first, second, third = (broker.publish(1, {"type": ORDER_CREATED, "n": n}) for n in range(3))
+
+        subscription = broker.subscribe(1, last_event_id=first["id"])
+
+        self.assertEqual([await subscription.get(), await subscription.get()], [second, third])
+        self.assertTrue(subscription.queue.empty())
+        self.assertTrue(broker.subscribe(1).queue.empty())
+
+    async def test_slow_subscriber_loses_oldest_events(self):
+        broker = OrderEventBroker(queue_size=2)
+        subscription = broker.subscribe(1)
+
+        events = [broker.publish(1, {"type": ORDER_CREATED, "n": n}) for n in range(4)]
+        await asyncio.sleep(0)
+
+        self.assertEqual([await subscription.get(), await subscription.get()], events[2:])
+
+    async def test_unsubscribe(self):
+        broker = OrderEventBroker()
+        subscription = broker.subscribe(1)
+        self.assertEqual(broker.subscriber_count(1), 1)
+
+        broker.unsubscribe(subscription)
+        broker.unsubscribe(subscription)
+
+        self.assertEqual(broker.subscriber_count(), 0)
+
+
+class OrderEventStreamTests(TransactionTestCase):
+    """The SSE view end to end (publishing waits for commit, so no TestCase transaction)."""
+
+    def setUp(self):
+        self.owner = User.objects.create(username="owner", role="shopadmin")
+        self.shop, self.shop_items = make_shop(self.owner)
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.factory = AsyncRequestFactory()
+
+    async def test_requires_a_token_for_an_owned_shop(self):
+        response = await shop_order_events(self.factory.get("/", {"token": "bad"}), self.shop.id)
+        self.assertEqual(response.status_code, 401)
+
+        token = str(AccessToken.for_user(self.customer))
+        response = await shop_order_events(self.factory.get("/", {"token": token}), self.shop.id)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_streams_order_events(self):
+        token = str(AccessToken.for_user(self.owner))
+        request = self.factory.get("/", headers={"Authorization": f"Bearer {token}"})
+        response = await shop_order_events(request, self.shop.id)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+        self.assertEqual(broker.subscriber_count(self.shop.id), 1)
+
+        def place_and_accept():
+            order = order_from(self.customer, self.shop_items)
+            client = APIClient()
+            client.force_authenticate(self.owner)
+            client.patch(f"/api/orders/orders/{order.id}/update-status/", {"status": "accepted"}, format="json")
+            return order
+
+        order = await sync_to_async(place_and_accept, thread_sensitive=False)()
+        received = [await asyncio.wait_for(anext(stream), 2) for _ in range(2)]
+
+        self.assertIn(b"event: order.created", received[0])
+        self.assertIn(b"event: order.status_changed", received[1])
+        self.assertEqual(json.loads(received[1].split(b"data: ")[1])["order_id"], order.id)
+
+        # A client disconnect makes the ASGI handler cancel the task reading the stream.
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(broker.subscriber_count(self.shop.id), 0)
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner", role="shopadmin")
+        self.shop, shop_items = make_shop(self.owner)
+        other_shop, other_items = make_shop(User.objects.create(username="other", role="shopadmin"), name="Other")
+        customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.orders = [order_from(customer, shop_items[:n + 1]) for n in range(3)]
+        self.hidden = order_from(customer, other_items)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def export(self, **params):
+        response = self.client.get("/api/orders/orders/export/", params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_orders(self):
+        rows = list(csv.DictReader(StringIO(self.export())))
+        self.assertEqual([int(row["order_id"]) for row in rows], [order.id for order in self.orders])
+        self.assertEqual(rows[0]["total_price"], str(self.orders[0].total_price))
+        self.assertEqual(rows[0]["shop_name"], "Shop")
+
+    def test_ndjson_items(self):
+        lines = [json.loads(line) for line in self.export(kind="items", output="ndjson").splitlines()]
+        self.assertEqual(len(lines), 1 + 2 + 3)
+        self.assertEqual({line["order_id"] for line in lines}, {order.id for order in self.orders})
+        self.assertEqual({line["hsn"] for line in lines}, {None, "1001"})
+
+    def test_timestamps_match_across_formats(self):
+        from_csv = next(csv.DictReader(StringIO(self.export())))["created_at"]
+        from_ndjson = json.loads(self.export(output="ndjson").splitlines()[0])["created_at"]
+        self.assertEqual(from_csv, from_ndjson)
+        self.assertEqual(from_csv, self.orders[0].created_at.isoformat())
+
+    def test_filters(self):
+        change_status(self.orders[1], "accepted")
+        rows = list(csv.DictReader(StringIO(self.export(status="accepted", shop=self.shop.id))))
+        self.assertEqual([int(row["order_id"]) for row in rows], [self.orders[1].id])
+
+        today = timezone.localdate()
+        self.assertEqual(len(self.export(**{"from": today, "to": today}).splitlines()), 4)
+        self.assertEqual(len(self.export(**{"from": today + timedelta(days=1)}).splitlines()), 1)
+
+    def test_rejects_bad_parameters_before_streaming(self):
+        for params in (
+            {"from": "2025-13-01"}, {"from": "2025-02-30"}, {"to": "tomorrow"},
+            {"shop": "abc"}, {"kind": "shops"}, {"output": "xlsx"},
+        ):
+            response = self.client.get("/api/orders/orders/export/", params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertFalse(response.streaming)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "items.csv")
+            call_command("export_orders", "--kind", "items", "--shop", str(self.shop.id), "--file", path)
+            with open(path, newline="", encoding="utf-8") as exported:
+                self.assertEqual(len(list(csv.DictReader(exported))), 6)
+
+        with self.assertRaises(CommandError):
+            call_command("export_orders", "--from", "2025-02-30", stdout=StringIO())
+
+    async def test_streams_asynchronously_under_asgi(self):
+        token = str(AccessToken.for_user(self.owner))
+        response = await self.async_client.get("/api/orders/orders/export/", headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(body.splitlines()), 4)
+
+
+class DispatcherTestMixin:
+    def make_rider(self, name, lat, lng):
+        rider = User.objects.create(username=name, role="deliveryboy")
+        DeliveryBoyLocation.objects.create(delivery_boy=rider, latitude=Decimal(lat), longitude=Decimal(lng))
+        return rider
+
+    def make_orders(self, count):
+        owner = User.objects.create(username="owner", role="shopadmin")
+        shop, shop_items = make_shop(owner, items=1, quantity=100)
+        Shop.objects.filter(pk=shop.pk).update(latitude=Decimal("10.000000"), longitude=Decimal("76.000000"))
+        customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        return [Order.objects.select_related("shop").get(pk=order_from(customer, shop_items).pk) for _ in range(count)]
+
+
+class DispatcherTests(DispatcherTestMixin, TestCase):
+    def setUp(self):
+        self.dispatcher = Dispatcher()
+        patcher = patch("orders.dispatch.dispatcher", self.dispatcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.near = self.make_rider("near", "10.001", "76.001")
+        self.far = self.make_rider("far", "10.2", "76.2")
+
+    def test_nearest_free_rider_is_assigned_and_released(self):
+        first, second, third = self.make_orders(3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change_status(first, "accepted")
+        with self.captureOnCommitCallbacks(execute=True):
+            change_status(second, "accepted")
+        with self.captureOnCommitCallbacks(execute=True):
+            change_status(third, "accepted")
+
+        self.assertEqual([order.delivery_boy_id for order in (first, second, third)], [self.near.id, self.far.id, None])
+        self.assertEqual(len(self.dispatcher.index), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change_status(first, "out_for_delivery")
+            change_status(first, "completed")
+        self.assertIn(self.near.id, self.dispatcher.index)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change_status(third, "out_for_delivery")
+        self.assertEqual(Order.objects.get(pk=third.pk).delivery_boy_id, self.near.id)
+
+    def test_rolled_back_assignment_keeps_the_rider_bookable(self):
+        order = self.make_orders(1)[0]
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.assertEqual(self.dispatcher.assign(order), self.near.id)
+                raise RuntimeError("checkout failed later")
+
+        self.assertIn(self.near.id, self.dispatcher.index)
+        self.assertIsNone(Order.objects.get(pk=order.pk).delivery_boy_id)
+
+    def test_bulk_accept_gives_each_order_its_own_rider(self):
+        orders = self.make_orders(3)
+        owner = orders[0].shop.owner
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_change_status(Order.objects.filter(shop__owner=owner), [order.pk for order in orders], "accepted")
+
+        riders = [Order.objects.get(pk=order.pk).delivery_boy_id for order in orders]
+        self.assertEqual(riders, [self.near.id, self.far.id, None])
+        self.assertEqual(len(self.dispatcher.index), 0)
+
+
+    def test_order_assigned_elsewhere_keeps_the_rider_free(self):
+        order = self.make_orders(1)[0]
+        # Another worker assigned the order after this copy was loaded.
+        Order.objects.filter(pk=order.pk).update(delivery_boy=self.far)
+        claimed = set()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(self.dispatcher.assign(order, claimed=claimed))
+
+        self.assertEqual(order.delivery_boy_id, self.far.id)
+        self.assertEqual(claimed, set())
+        self.assertIn(self.near.id, self.dispatcher.index)
+        self.assertEqual(Order.objects.get(pk=order.pk).delivery_boy_id, self.far.id)
+
+
+class DispatcherRaceTests(DispatcherTestMixin, TransactionTestCase):
+    """Two workers with their own (equally stale) indexes race for one rider (needs a file-backed SQLite test DB)."""
+
+    def test_one_rider_is_never_booked_twice(self):
+        rider = self.make_rider("rider", "10.001", "76.001")
+        orders = self.make_orders(2)
+        dispatchers = [Dispatcher(), Dispatcher()]
+        for dispatcher in dispatchers:
+            dispatcher.ensure_loaded()
+        barrier = threading.Barrier(2)
+        won, errors = [], []
+
+        def assign(dispatcher, order):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    # As change_status does: the order is accepted, then dispatched, in one transaction.
+                    Order.objects.filter(pk=order.pk).update(status="accepted")
+                    order.status = "accepted"
+                    won.append(dispatcher.assign(order))
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=assign, args=pair) for pair in zip(dispatchers, orders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertCountEqual(won, [None, rider.id])
+        self.assertEqual(Order.objects.filter(delivery_boy=rider).count(), 1)
+        # The loser learned the rider is taken; both indexes dropped them on commit.
+        self.assertFalse(any(rider.id in dispatcher.index for dispatcher in dispatchers))
+
+
+class BulkOrderUpdateTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner", role="shopadmin")
+        self.other_owner = User.objects.create(username="other", role="shopadmin")
+        self.shop, shop_items = make_shop(self.owner, quantity=100)
+        _, other_items = make_shop(self.other_owner, name="Other", quantity=100)
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.orders = [order_from(self.customer, shop_items) for _ in range(3)]
+        self.foreign = order_from(self.customer, other_items)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def bulk(self, payload, url="/api/orders/orders/bulk-update-status/"):
+        return self.client.patch(url, payload, format="json")
+
+    def results(self, response):
+        self.assertEqual(response.status_code, 200, response.data)
+        return {row["id"]: row["result"] for row in response.data["results"]}
+
+    def test_result_per_requested_id(self):
+        first, second, third = self.orders
+        change_status(second, "accepted")
+        change_status(third, "cancelled")
+
+        response = self.bulk({"ids": [first.id, second.id, third.id, 999999, first.id], "status": "accepted"})
+
+        self.assertEqual(
+            self.results(response),
+            {first.id: "updated", second.id: "unchanged", third.id: "invalid_transition", 999999: "not_found"},
+        )
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual([row["id"] for row in response.data["results"]], [first.id, second.id, third.id, 999999])
+
+    def test_other_shops_orders_are_not_found(self):
+        response = self.bulk({"ids": [self.orders[0].id, self.foreign.id], "status": "accepted"})
+
+        self.assertEqual(self.results(response), {self.orders[0].id: "updated", self.foreign.id: "not_found"})
+        self.assertEqual(Order.objects.get(pk=self.foreign.pk).status, "pending")
+
+        self.client.force_authenticate(self.other_owner)
+        response = self.bulk({"ids": [order.id for order in self.orders], "payment_status": "paid"},
+                             url="/api/orders/orders/bulk-update-payment-status/")
+        self.assertEqual(set(self.results(response).values()), {"not_found"})
+        self.assertFalse(Order.objects.filter(payment_status="paid").exists())
+
+    def test_customers_cannot_bulk_update(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.bulk({"ids": [self.orders[0].id], "status": "accepted"}).status_code, 403)
+
+    def test_rejects_bad_input(self):
+        for payload in (
+            {"ids": [self.orders[0].id], "status": "shipped"},
+            {"ids": [], "status": "accepted"},
+            {"ids": "1,2", "status": "accepted"},
+            {"ids": ["x"], "status": "accepted"},
+            {"ids": list(range(1, 1002)), "status": "accepted"},
+        ):
+            self.assertEqual(self.bulk(payload).status_code, 400, payload)
+
+    def test_cancel_releases_stock_and_updates_rollups(self):
+        shop_item = self.orders[0].items.first().shop_item
+        stock = ShopItem.objects.get(pk=shop_item.pk).available_quantity
+
+        response = self.bulk({"ids": [order.id for order in self.orders[:2]], "status": "cancelled"})
+
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(ShopItem.objects.get(pk=shop_item.pk).available_quantity, stock + 2)
+        self.assertEqual(
+            dict(ShopDailyStatusCount.objects.filter(shop=self.shop, orders__gt=0).values_list("status", "orders")),
+            {"pending": 1, "cancelled": 2},
+        )
+
+
+class OrderLifecycleTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner", role="shopadmin")
+        _, shop_items = make_shop(self.owner, quantity=100)
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.orders = [order_from(self.customer, shop_items) for _ in range(4)]
+        self.visible = Order.objects.filter(shop__owner=self.owner)
+
+    def history(self, order):
+        return list(OrderStatusHistory.objects.filter(order=order).values_list("field", "from_value", "to_value", "changed_by"))
+
+    def test_rejected_transitions(self):
+        order = self.orders[0]
+        with self.assertRaises(InvalidTransition) as ctx:
+            change_status(order, "completed")
+        self.assertEqual(ctx.exception.allowed, ["accepted", "cancelled"])
+
+        change_payment_status(order, "paid")
+        with self.assertRaises(InvalidTransition):
+            change_payment_status(order, "failed")
+
+        self.assertEqual(Order.objects.get(pk=order.pk).status, "pending")
+        self.assertEqual(self.history(order)[-1], ("payment_status", "pending", "paid", None))
+
+    def test_generic_patch_cannot_change_status(self):
+        order = self.orders[0]
+        for target in ("accepted", "out_for_delivery", "completed"):
+            change_status(Order.objects.get(pk=order.pk), target)
+        history = self.history(order)
+
+        for user, data in [
+            (self.customer, {"status": "cancelled"}),
+            (self.owner, {"status": "pending"}),
+            (self.owner, {"payment_status": "refunded"}),
+        ]:
+            client = APIClient()
+            client.force_authenticate(user)
+            for method in (client.patch, client.put):
+                response = method(f"/api/orders/orders/{order.pk}/", data, format="json")
+                self.assertEqual(response.status_code, 400, (user, data))
+
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual((order.status, order.payment_status), ("completed", "pending"))
+        self.assertEqual(self.history(order), history)
+
+    def test_stale_single_change_loses(self):
+        stale = Order.objects.get(pk=self.orders[0].pk)
+        change_status(Order.objects.get(pk=stale.pk), "accepted")
+
+        with self.assertRaises(StatusConflict):
+            change_status(stale, "cancelled")
+        with self.assertRaises(StatusConflict):
+            change_status(Order.objects.get(pk=stale.pk), "cancelled", expected="pending")
+
+        self.assertEqual(Order.objects.get(pk=stale.pk).status, "accepted")
+
+    def test_bulk_change_updates_conditionally_per_previous_status(self):
+        change_status(self.orders[0], "accepted")
+
+        with CaptureQueriesContext(connection) as queries:
+            bulk_change_status(self.visible, [order.pk for order in self.orders], "cancelled")
+
+        updates = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "orders_order"')]
+        self.assertEqual(len(updates), 2)
+        conditions = sorted(re.search(r'WHERE .*"orders_order"\."status" = \'(\w+)\'', sql).group(1) for sql in updates)
+        self.assertEqual(conditions, ["accepted", "pending"])
+
+    def test_bulk_change_reports_a_lost_race_as_conflict(self):
+        first, second, third, fourth = self.orders
+        change_status(third, "accepted")
+
+        def concurrent_writer(order):
+            # Runs between the read and the UPDATE: another request cancels `second`.
+            if order.pk == fourth.pk:
+                Order.objects.filter(pk=second.pk).update(status="cancelled")
+            return False
+
+        results, changed, previous = _bulk_change(
+            self.visible, [first.pk, second.pk, third.pk, fourth.pk], "status", "preparing", self.owner,
+            blocked=concurrent_writer,
+        )
+
+        self.assertEqual(results, {first.pk: "invalid_transition", second.pk: "invalid_transition",
+                                   third.pk: "updated", fourth.pk: "invalid_transition"})
+
+        results, changed, previous = _bulk_change(
+            self.visible, [first.pk, second.pk, fourth.pk], "status", "accepted", self.owner,
+            blocked=concurrent_writer,
+        )
+
+        self.assertEqual(results, {first.pk: "updated", second.pk: "conflict", fourth.pk: "updated"})
+        self.assertEqual([order.pk for order in changed], [first.pk, fourth.pk])
+        self.assertEqual(set(previous), {first.pk, fourth.pk})
+        self.assertEqual(Order.objects.get(pk=second.pk).status, "cancelled")
+        self.assertFalse(OrderStatusHistory.objects.filter(order=second, to_value="accepted").exists())
+
+    def test_history_rows(self):
+        first, second = self.orders[:2]
+        change_status(first, "accepted", user=self.owner)
+        bulk_change_status(self.visible, [first.pk, second.pk], "cancelled", user=self.owner)
+        bulk_change_payment_status(self.visible, [second.pk], "failed")
+
+        self.assertEqual(self.history(first), [
+            ("status", "", "pending", self.customer.id),
+            ("status", "pending", "accepted", self.owner.id),
+            ("status", "accepted", "cancelled", self.owner.id),
+        ])
+        self.assertEqual(self.history(second), [
+            ("status", "", "pending", self.customer.id),
+            ("status", "pending", "cancelled", self.owner.id),
+            ("payment_status", "pending", "failed", None),
+        ])
+
+    def test_history_is_append_only(self):
+        entry = OrderStatusHistory.objects.filter(order=self.orders[0]).first()
+        entry.to_value = "completed"
+        with self.assertRaises(ValueError):
+            entry.save()
+
+
+class CartReadTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create(username="owner", role="shopadmin")
+        self.shop, self.shop_items = make_shop(owner, items=8)
+        now = timezone.now()
+        ShopItemOffer.objects.create(
+            shop_item=self.shop_items[2], offer_pct=Decimal("12.50"), active=True,
+            offer_starting_datetime=now - timedelta(days=1), offer_ending_datetime=now + timedelta(days=1),
+        )
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def fill(self, shop_items):
+        for n, shop_item in enumerate(shop_items):
+            Cart.objects.create(customer=self.customer, shop_item=shop_item, quantity=n % 3 + 1)
+
+    def test_summary_runs_no_queries_and_matches_checkout(self):
+        self.fill(self.shop_items)
+        lines = list(cart_lines(self.customer))
+
+        with self.assertNumQueries(0):
+            summary = cart_summary(lines)
+
+        self.assertEqual((summary["shop_id"], summary["line_count"]), (self.shop.id, 8))
+        self.assertEqual(summary["item_count"], sum(line.quantity for line in lines))
+        order = place_order(self.customer)
+        self.assertEqual(
+            (summary["subtotal"], summary["gst"], summary["taxable_total"]),
+            (order.total_price, order.gst, order.taxable_total),
+        )
+
+    def test_empty_cart(self):
+        self.assertEqual(cart_summary([]), {
+            "shop_id": None, "shop_name": None, "line_count": 0, "item_count": 0,
+            "subtotal": Decimal("0.00"), "taxable_total": Decimal("0.00"), "gst": Decimal("0.00"),
+        })
+
+    def test_cart_read_costs_the_same_for_any_size(self):
+        self.fill(self.shop_items[:2])
+        with CaptureQueriesContext(connection) as few:
+            self.client.get("/api/orders/cart/")
+        self.fill(self.shop_items[2:])
+
+        with self.assertNumQueries(len(few)):
+            response = self.client.get("/api/orders/cart/")
+
+        self.assertEqual(len(response.data["items"]), 8)
+        self.assertEqual(response.data["summary"]["line_count"], 8)
+        prices = {line["shop_item"]: Decimal(str(line["price"])) for line in response.data["items"]}
+        self.assertEqual(prices[self.shop_items[2].id], ShopItem.objects.get(pk=self.shop_items[2].pk).effective_price)
+        self.assertLess(prices[self.shop_items[2].id], self.shop_items[2].total_amount)
+
+
+class CartBulkOperationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner", role="shopadmin")
+        self.shop, self.shop_items = make_shop(self.owner, items=10)
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        for n, shop_item in enumerate(self.shop_items[:3]):
+            Cart.objects.create(customer=self.customer, shop_item=shop_item, quantity=n + 1)
+
+    def cart(self):
+        return dict(Cart.objects.filter(customer=self.customer).values_list("shop_item", "quantity"))
+
+    def bulk(self, operations, **extra):
+        return self.client.post("/api/orders/cart/bulk/", {"operations": operations, **extra}, format="json")
+
+    def test_set_increment_and_remove(self):
+        first, second, third, *rest = self.shop_items
+        response = self.bulk([
+            {"shop_item": first.id, "op": "remove"},
+            {"shop_item": second.id, "quantity": 5},
+            {"shop_item": third.id, "quantity": 2, "op": "increment"},
+        ] + [{"shop_item": shop_item.id, "quantity": 1} for shop_item in rest])
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.cart(), {second.id: 5, third.id: 5, **{shop_item.id: 1 for shop_item in rest}})
+        self.assertEqual(response.data["summary"]["line_count"], 9)
+
+    def test_setting_zero_removes_the_line(self):
+        first = self.shop_items[0]
+        response = self.bulk([{"shop_item": first.id, "quantity": 0}])
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn(first.id, self.cart())
+
+    def test_writes_do_not_grow_with_the_batch(self):
+        def operations(shop_items):
+            return [{"shop_item": shop_item.id, "quantity": 4} for shop_item in shop_items]
+
+        with CaptureQueriesContext(connection) as few:
+            self.bulk(operations(self.shop_items[1:5]))
+        with self.assertNumQueries(len(few)):
+            self.bulk(operations(self.shop_items[1:]) + operations(self.shop_items[:1]))
+
+        self.assertEqual(set(self.cart().values()), {4})
+
+    def test_unknown_items_reject_the_whole_batch(self):
+        response = self.bulk([{"shop_item": self.shop_items[5].id, "quantity": 1}, {"shop_item": 9999}])
+
+        self.assertEqual((response.status_code, response.data["shop_items"]), (400, [9999]))
+        self.assertEqual(self.cart(), {self.shop_items[n].id: n + 1 for n in range(3)})
+
+    def test_empty_batch(self):
+        self.assertEqual(self.bulk([]).status_code, 400)
+
+    def test_other_shop_conflicts_unless_reset(self):
+        _, other_items = make_shop(self.owner, items=1, name="Other")
+        operations = [{"shop_item": other_items[0].id, "quantity": 2}]
+
+        self.assertEqual(self.bulk(operations).status_code, 409)
+        self.assertEqual(len(self.cart()), 3)
+
+        response = self.bulk(operations, reset=True)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.cart(), {other_items[0].id: 2})
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(username="owner", role="shopadmin")
+        self.shop, self.shop_items = make_shop(self.owner, items=3)
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.customer.set_password("pw")
+        self.customer.save()
+        self.client = APIClient()
+        self.token = self.client.get("/api/orders/guest-cart/").data["token"]
+
+    def cart(self):
+        return dict(Cart.objects.filter(customer=self.customer).values_list("shop_item", "quantity"))
+
+    def add(self, shop_item, quantity=1):
+        return self.client.post(
+            "/api/orders/guest-cart/", {"shop_item": shop_item.id, "quantity": quantity},
+            format="json", headers={"X-Guest-Cart": self.token},
+        )
+
+    def login(self, password="pw"):
+        return self.client.post(
+            "/api/users/login/", {"username": "customer", "password": password, "guest_cart": self.token}, format="json",
+        )
+
+    def merge(self, **extra):
+        return self.client.post("/api/orders/guest-cart/merge/", extra, format="json", headers={"X-Guest-Cart": self.token})
+
+    def test_guest_cart_stays_out_of_the_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.add(self.shop_items[0], 2)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data["token"], self.token)
+        self.assertFalse([q for q in queries if q["sql"].startswith(("INSERT", "UPDATE", "DELETE"))])
+        self.assertFalse(Cart.objects.exists())
+
+    def test_tampered_token_starts_a_new_cart(self):
+        self.add(self.shop_items[0])
+        response = self.client.get("/api/orders/guest-cart/", headers={"X-Guest-Cart": self.token + "x"})
+
+        self.assertNotEqual(response.data["token"], self.token)
+        self.assertEqual(response.data["items"], [])
+
+    def test_login_merges_a_same_shop_cart(self):
+        Cart.objects.create(customer=self.customer, shop_item=self.shop_items[0], quantity=1)
+        self.add(self.shop_items[0], 3)
+        self.add(self.shop_items[2], 3)
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["merged_cart_lines"], 2)
+        self.assertEqual(self.cart(), {self.shop_items[0].id: 4, self.shop_items[2].id: 3})
+        self.assertEqual(self.client.get("/api/orders/guest-cart/", headers={"X-Guest-Cart": self.token}).data["items"], [])
+
+    def test_login_keeps_a_saved_cart_from_another_shop(self):
+        _, other_items = make_shop(self.owner, items=1, name="Other")
+        Cart.objects.create(customer=self.customer, shop_item=other_items[0], quantity=2)
+        self.add(self.shop_items[0], 3)
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertIn("access", response.data)
+        self.assertEqual((response.data["merged_cart_lines"], response.data["requires_reset"]), (0, True))
+        self.assertEqual(self.cart(), {other_items[0].id: 2})
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.merge().status_code, 409)
+        response = self.merge(reset=True)
+        self.assertEqual(response.data["merged_lines"], 1)
+        self.assertEqual(self.cart(), {self.shop_items[0].id: 3})
+
+    def test_failed_login_leaves_the_guest_cart(self):
+        self.add(self.shop_items[0])
+
+        self.assertEqual(self.login(password="bad").status_code, 401)
+        self.assertEqual(len(self.client.get("/api/orders/guest-cart/", headers={"X-Guest-Cart": self.token}).data["items"]), 1)
+
+
+@override_settings(SHOP_TIME_ZONE="Asia/Kolkata")
+class CheckoutWindowTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create(username="owner", role="shopadmin")
+        _, self.shop_items = make_shop(owner, items=1)
+        ShopItem.objects.filter(pk=self.shop_items[0].pk).update(available_from="22:00", available_till="02:00")
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+
+    def place_at(self, hour):
+        Cart.objects.create(customer=self.customer, shop_item=self.shop_items[0], quantity=1)
+        with patch("django.utils.timezone.now", return_value=datetime(2025, 1, 1, hour, 0, tzinfo=dt_timezone.utc)):
+            return place_order(self.customer)
+
+    def test_late_night_order_is_taken_in_shop_time(self):
+        # 17:00 UTC is 22:30 at the shop.
+        self.assertEqual(self.place_at(17).items.count(), 1)
+
+    def test_order_outside_the_window_is_refused(self):
+        # 23:00 UTC is inside the window in UTC, but 04:30 at the shop.
+        with self.assertRaises(CheckoutError) as caught:
+            self.place_at(23)
+        self.assertEqual([line["shop_item"] for line in caught.exception.unavailable], [self.shop_items[0].id])
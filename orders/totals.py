@@ -0,0 +1,30 @@
+from decimal import Decimal
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+from .models import OrderItem
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _item_sum(expression):
+    """Correlated SUM over the outer order's items, 0 when it has none."""
+    items = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+    subquery = Subquery(items.annotate(total=Sum(expression)).values("total"), output_field=MONEY)
+    return Coalesce(subquery, Value(Decimal("0.00")), output_field=MONEY)
+
+
+def recompute_totals_for(queryset):
+    """
+    Recompute totals for every order in ``queryset`` with a single UPDATE.
+
+    Each total is a correlated subquery over the order's items, so no rows are
+    loaded into Python. Returns the number of orders updated.
+    """
+    line_total = ExpressionWrapper(F("price") * F("quantity"), output_field=MONEY)
+    return queryset.order_by().update(
+        gst=Round(_item_sum("gst"), 2),
+        taxable_total=Round(_item_sum("taxable_amount"), 2),
+        total_price=Round(_item_sum(line_total) + F("delivery_charge"), 2),
+        updated_at=timezone.now(),
+    )
@@ -1,12 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet, CartViewSet, calculate_delivery_distance
+from .views import OrderViewSet, CartViewSet, GuestCartViewSet, calculate_delivery_distance, delivery_location
+from .streams import shop_order_events
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='order')
 router.register("cart", CartViewSet, basename="cart")
+router.register("guest-cart", GuestCartViewSet, basename="guest-cart")
 
 urlpatterns = [
     path("calculate-delivery-distance/", calculate_delivery_distance, name="calculate-delivery-distance"),
+    path("delivery/location/", delivery_location, name="delivery-location"),
+    path("shops/<int:shop_id>/events/", shop_order_events, name="shop-order-events"),
     path('', include(router.urls)),
 ]
@@ -5,10 +5,14 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import Order, Cart, OrderItem
-from .serializers import OrderDetailSerializer, OrderSerializer, DistanceInputSerializer, CartSerializer
+from .models import Order, OrderItem, DeliveryBoyLocation
+from .serializers import OrderDetailSerializer, OrderSerializer, DistanceInputSerializer, CartSerializer, DeliveryLocationSerializer, BulkCartSerializer, CartOperationSerializer
 from shop.models import Shop
 from .utils import get_distance_duration
+from .cart import InvalidCartOperations, ShopMismatch, add_to_cart, apply_cart_operations, cart_lines, cart_summary
+from .checkout import CheckoutError, place_order
+from .guest_cart import GuestCart, guest_cart_token
+from .dispatch import dispatcher
 from rest_framework.decorators import action
 
 class CartViewSet(viewsets.ModelViewSet):
@@ -16,46 +20,32 @@ class CartViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        """Return only cart items for the logged-in user"""
-        return Cart.objects.filter(customer=self.request.user)
+        """Return only cart items for the logged-in user, with everything the serializer reads joined"""
+        return cart_lines(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        """Cart lines plus a server-computed summary, from a single query"""
+        cart_items = list(self.get_queryset())
+        return Response({
+            "items": self.get_serializer(cart_items, many=True).data,
+            "summary": cart_summary(cart_items),
+        })
 
     def perform_create(self, serializer):
         """Create or update cart item"""
-        customer = self.request.user
-        shop_item = serializer.validated_data["shop_item"]
-        quantity = serializer.validated_data.get("quantity", 1)
-        reset = self.request.data.get("reset", False)
-
-        # Get all current items in user's cart
-        existing_cart_items = Cart.objects.filter(customer=customer)
-
-        # If there are existing items, ensure same shop
-        if existing_cart_items.exists():
-            existing_shop = existing_cart_items.first().shop_item.shop
-            if shop_item.shop != existing_shop:
-                # Different shop detected
-                if not reset:
-                    # Ask confirmation from frontend
-                    return {
-                        "requires_reset": True,
-                        "detail": "Your cart contains items from another restaurant. Do you want to reset it to add this item?"
-                    }
-
-                # If reset=True, clear cart before adding new item
-                existing_cart_items.delete()
-
-        # Add or update item in cart
-        cart_item, created = Cart.objects.get_or_create(
-            customer=customer,
-            shop_item=shop_item,
-            defaults={"quantity": quantity},
-        )
-
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-
-        return cart_item
+        try:
+            return add_to_cart(
+                self.request.user,
+                serializer.validated_data["shop_item"],
+                serializer.validated_data.get("quantity", 1),
+                reset=self.request.data.get("reset", False),
+            )
+        except ShopMismatch:
+            # Ask confirmation from frontend
+            return {
+                "requires_reset": True,
+                "detail": "Your cart contains items from another restaurant. Do you want to reset it to add this item?"
+            }
 
     def create(self, request, *args, **kwargs):
         """Handle cart add requests with shop validation"""
@@ -72,42 +62,131 @@ class CartViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(read_serializer.data)
         return Response(read_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        Apply many cart changes at once and return the resulting cart.
+        Input: {"operations": [{"shop_item": id, "quantity": n, "op": "set|increment|remove"}], "reset": bool}
+        """
+        serializer = BulkCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            cart_items = apply_cart_operations(
+                request.user,
+                serializer.validated_data["operations"],
+                reset=serializer.validated_data["reset"],
+            )
+        except InvalidCartOperations as exc:
+            return Response({"detail": str(exc), "shop_items": exc.shop_items}, status=status.HTTP_400_BAD_REQUEST)
+        except ShopMismatch:
+            return Response(
+                {
+                    "requires_reset": True,
+                    "detail": "Your cart contains items from another restaurant. Do you want to reset it to add these items?"
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        return Response({
+            "items": self.get_serializer(cart_items, many=True).data,
+            "summary": cart_summary(cart_items),
+        })
+
     @action(detail=False, methods=["post"])
     def checkout(self, request):
         """Checkout the current cart"""
-        customer = request.user
-        cart_items = Cart.objects.filter(customer=customer)
-
-        if not cart_items.exists():
-            return Response({"detail": "Cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Ensure all items belong to the same shop
-        shop = cart_items.first().shop_item.shop
-
-        # Create the order
-        delivery_charge = Decimal(str(request.data.get("delivery_charge", 0)))
-        order = Order.objects.create(
-        customer=customer,
-        shop=shop,
-        delivery_address_id=request.data.get("delivery_address"),
-        delivery_charge=delivery_charge,
-    )
+        try:
+            order = place_order(
+                customer=request.user,
+                delivery_address_id=request.data.get("delivery_address"),
+                delivery_charge=Decimal(str(request.data.get("delivery_charge", 0))),
+            )
+        except CheckoutError as exc:
+            if exc.unavailable:
+                return Response(
+                    {"detail": str(exc), "unavailable": exc.unavailable},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"message": "Order placed successfully!", "order_id": order.id})
 
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                shop_item=item.shop_item,
-                quantity=item.quantity,
-                price=item.shop_item.get_offer_price(),
+
+class GuestCartViewSet(viewsets.ViewSet):
+    """
+    Cart for users who are not logged in, kept in the cache under a signed
+    token. Send the token back in the X-Guest-Cart header (or as "guest_cart");
+    every response returns it with the cart.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def cart_response(self, cart, response_status=status.HTTP_200_OK):
+        cart_items = cart.cart_items()
+        return Response({
+            "token": cart.token,
+            "items": CartSerializer(cart_items, many=True).data,
+            "summary": cart_summary(cart_items),
+        }, status=response_status)
+
+    def apply(self, request, operations, reset=False):
+        cart = GuestCart(guest_cart_token(request))
+        try:
+            cart.apply(operations, reset=reset)
+        except InvalidCartOperations as exc:
+            return Response({"detail": str(exc), "shop_items": exc.shop_items}, status=status.HTTP_400_BAD_REQUEST)
+        except ShopMismatch:
+            return Response(
+                {
+                    "requires_reset": True,
+                    "detail": "Your cart contains items from another restaurant. Do you want to reset it to add this item?"
+                },
+                status=status.HTTP_409_CONFLICT,
             )
+        return self.cart_response(cart)
 
-        order.calculate_totals()
-        order.save()
+    def list(self, request):
+        return self.cart_response(GuestCart(guest_cart_token(request)))
 
-        # Clear cart after checkout
-        cart_items.delete()
+    def create(self, request):
+        """Add a quantity of a shop item (same body as the cart endpoint)"""
+        serializer = CartOperationSerializer(data={**request.data, "op": "increment"})
+        serializer.is_valid(raise_exception=True)
+        return self.apply(request, [serializer.validated_data], reset=request.data.get("reset", False))
 
-        return Response({"message": "Order placed successfully!", "order_id": order.id})
+    def partial_update(self, request, pk=None):
+        """Set the quantity of the line for shop item ``pk``"""
+        serializer = CartOperationSerializer(data={"shop_item": pk, "quantity": request.data.get("quantity"), "op": "set"})
+        serializer.is_valid(raise_exception=True)
+        return self.apply(request, [serializer.validated_data])
+
+    update = partial_update
+
+    def destroy(self, request, pk=None):
+        """Remove the line for shop item ``pk``"""
+        serializer = CartOperationSerializer(data={"shop_item": pk, "op": "remove"})
+        serializer.is_valid(raise_exception=True)
+        return self.apply(request, [serializer.validated_data])
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        serializer = BulkCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.apply(request, serializer.validated_data["operations"], reset=serializer.validated_data["reset"])
+
+    @action(detail=False, methods=["post"], url_path="merge", permission_classes=[IsAuthenticated])
+    def merge(self, request):
+        """Move the guest cart into the logged-in user's cart"""
+        try:
+            merged = GuestCart(guest_cart_token(request)).merge_into(request.user, reset=request.data.get("reset", False))
+        except ShopMismatch:
+            return Response(
+                {
+                    "requires_reset": True,
+                    "detail": "Your cart contains items from another restaurant. Do you want to reset it to add these items?"
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response({"merged_lines": merged})
 
 
 class IsCustomer(permissions.BasePermission):
@@ -126,23 +205,39 @@ class IsShopAdmin(permissions.BasePermission):
         )
 
 
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F, Prefetch
+from django.http import StreamingHttpResponse
+from backend.pagination import CreatedAtKeysetPagination
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Order
-from .serializers import OrderSerializer, OrderDetailSerializer
+from .exports import FORMATS, aiter_export, export_rows, filter_orders, iter_export
+from .events import ORDER_PAYMENT_STATUS_CHANGED, ORDER_STATUS_CHANGED, publish_order_event
+from .models import Order, OrderItem, OrderStatusHistory
+from .serializers import OrderSerializer, OrderDetailSerializer, query_param_list
+from .status import (
+    TRANSITIONS, InvalidTransition, StatusConflict,
+    bulk_change_payment_status, bulk_change_status, change_payment_status, change_status,
+)
+from products.inventory import InsufficientStock
+from reports.views import parse_day
+
+BULK_UPDATE_LIMIT = 1000
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     """Handles order listing, retrieval, and management for customers, shop admins, and superusers."""
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtKeysetPagination
 
     def get_serializer_class(self):
         if self.action in ["retrieve", "order_details"]:
             return OrderDetailSerializer
         return OrderSerializer
 
-    def get_queryset(self):
+    def get_base_queryset(self):
+        """Orders visible to the current user, without any joins."""
         user = self.request.user
 
         if getattr(user, "role", None) == "customer":
@@ -156,6 +251,25 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         return Order.objects.none()
 
+    def get_queryset(self):
+        """
+        Join or prefetch everything the serializer for this action reads, so
+        the number of queries does not depend on the number of orders.
+        """
+        queryset = self.get_base_queryset()
+        items = Prefetch("items", queryset=OrderItem.objects.select_related("shop_item__item").order_by("id"))
+
+        if self.action in ["retrieve", "order_details"]:
+            return queryset.select_related("customer", "shop", "delivery_address").prefetch_related(items)
+
+        if self.action == "list":
+            queryset = queryset.select_related("customer", "shop")
+            if "items" in query_param_list(self.request, "expand"):
+                queryset = queryset.prefetch_related(items)
+            return queryset
+
+        return queryset
+
     def create(self, request, *args, **kwargs):
         """Prevent direct creation of orders via this endpoint."""
         return Response(
@@ -163,6 +277,19 @@ class OrderViewSet(viewsets.ModelViewSet):
             status=status.HTTP_405_METHOD_NOT_ALLOWED,
         )
 
+    def update(self, request, *args, **kwargs):
+        """
+        Status fields are refused here: update-status / update-payment-status
+        check the transition and record, release and announce it.
+        """
+        fields = [name for name in ("status", "payment_status") if name in request.data]
+        if fields:
+            return Response(
+                {"detail": f"Use update-status or update-payment-status to change {' and '.join(fields)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return super().update(request, *args, **kwargs)
+
     # ✅ Get full order details
     @action(detail=True, methods=["get"], url_path="details")
     def order_details(self, request, pk=None):
@@ -175,6 +302,19 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = OrderDetailSerializer(order)
         return Response(serializer.data)
 
+    # ✅ Status timeline
+    @action(detail=True, methods=["get"], url_path="history")
+    def history(self, request, pk=None):
+        """Status and payment status changes of an order, oldest first."""
+        if not self.get_base_queryset().filter(pk=pk).exists():
+            return Response({"detail": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
+        entries = (
+            OrderStatusHistory.objects.filter(order_id=pk)
+            .order_by("created_at", "id")
+            .values("field", "from_value", "to_value", "created_at", changed_by_name=F("changed_by__username"))
+        )
+        return Response(list(entries))
+
     # ✅ Update order status
     @action(detail=True, methods=["patch"], url_path="update-status")
     def update_status(self, request, pk=None):
@@ -201,8 +341,18 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        order.status = new_status
-        order.save(update_fields=["status", "updated_at"])
+        try:
+            change_status(order, new_status, user=user, expected=request.data.get("expected_status"))
+        except InvalidTransition as exc:
+            return Response({"detail": str(exc), "allowed": exc.allowed}, status=status.HTTP_400_BAD_REQUEST)
+        except StatusConflict as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except InsufficientStock:
+            return Response(
+                {"detail": "Not enough stock to reopen this order."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        publish_order_event(order, ORDER_STATUS_CHANGED)
 
         return Response(
             {"message": f"Order status updated to '{new_status}' successfully."},
@@ -235,14 +385,140 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        order.payment_status = new_payment_status
-        order.save(update_fields=["payment_status", "updated_at"])
+        try:
+            change_payment_status(
+                order, new_payment_status, user=user, expected=request.data.get("expected_payment_status")
+            )
+        except InvalidTransition as exc:
+            return Response({"detail": str(exc), "allowed": exc.allowed}, status=status.HTTP_400_BAD_REQUEST)
+        except StatusConflict as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        publish_order_event(order, ORDER_PAYMENT_STATUS_CHANGED)
 
         return Response(
             {"message": f"Payment status updated to '{new_payment_status}' successfully."},
             status=status.HTTP_200_OK,
         )
 
+    def _bulk_ids(self, request):
+        """Validate the "ids" list of a bulk request; returns (ids, error response)."""
+        ids = request.data.get("ids")
+        if not isinstance(ids, list) or not ids:
+            return None, Response({"detail": "ids must be a non-empty list of order ids."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > BULK_UPDATE_LIMIT:
+            return None, Response(
+                {"detail": f"At most {BULK_UPDATE_LIMIT} orders can be updated at once."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            return list(dict.fromkeys(int(order_id) for order_id in ids)), None
+        except (TypeError, ValueError):
+            return None, Response({"detail": "ids must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # ✅ Update the status of many orders at once
+    @action(detail=False, methods=["patch"], url_path="bulk-update-status")
+    def bulk_update_status(self, request):
+        """
+        Set one status on a list of orders with one conditional UPDATE per current status.
+        Input: {"ids": [...], "status": "..."}; returns a result per id.
+        """
+        user = request.user
+        if not (getattr(user, "role", None) == "shopadmin" or user.is_superuser):
+            return Response(
+                {"detail": "Only shop admins or superusers can update order status."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        new_status = request.data.get("status")
+        valid_statuses = dict(Order.STATUS_CHOICES)
+        if new_status not in valid_statuses:
+            return Response(
+                {"detail": f"Invalid status. Valid options: {list(valid_statuses.keys())}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ids, error = self._bulk_ids(request)
+        if error:
+            return error
+
+        results, changed = bulk_change_status(self.get_base_queryset(), ids, new_status, user)
+        for order in changed:
+            publish_order_event(order, ORDER_STATUS_CHANGED)
+
+        return Response({
+            "status": new_status,
+            "updated": len(changed),
+            "results": [{"id": order_id, "result": result} for order_id, result in results.items()],
+        })
+
+    # ✅ Update the payment status of many orders at once
+    @action(detail=False, methods=["patch"], url_path="bulk-update-payment-status")
+    def bulk_update_payment_status(self, request):
+        """
+        Set one payment status on a list of orders with one conditional UPDATE per current value.
+        Input: {"ids": [...], "payment_status": "..."}; returns a result per id.
+        """
+        user = request.user
+        if not (getattr(user, "role", None) == "shopadmin" or user.is_superuser):
+            return Response(
+                {"detail": "Only shop admins or superusers can update payment status."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        new_payment_status = request.data.get("payment_status")
+        valid_payment_statuses = dict(Order.PAYMENT_STATUS_CHOICES)
+        if new_payment_status not in valid_payment_statuses:
+            return Response(
+                {"detail": f"Invalid payment status. Valid options: {list(valid_payment_statuses.keys())}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ids, error = self._bulk_ids(request)
+        if error:
+            return error
+
+        results, changed = bulk_change_payment_status(self.get_base_queryset(), ids, new_payment_status, user)
+        for order in changed:
+            publish_order_event(order, ORDER_PAYMENT_STATUS_CHANGED)
+
+        return Response({
+            "payment_status": new_payment_status,
+            "updated": len(changed),
+            "results": [{"id": order_id, "result": result} for order_id, result in results.items()],
+        })
+
+    # ✅ Stream orders / order items as CSV or NDJSON
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        """
+        Stream the visible orders (or their items) without building the list in memory.
+        Query params: kind=orders|items, output=csv|ndjson, shop, status, from, to (YYYY-MM-DD)
+        """
+        kind = request.query_params.get("kind", "orders")
+        file_format = request.query_params.get("output", "csv")
+        if kind not in ("orders", "items") or file_format not in FORMATS:
+            return Response(
+                {"detail": f"kind must be 'orders' or 'items'; output must be one of {list(FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Checked before streaming starts: once the 200 is sent, an error can only cut the file short.
+        params = request.query_params
+        start = parse_day(params["from"]) if params.get("from") else None
+        end = parse_day(params["to"]) if params.get("to") else None
+        if (params.get("from") and not start) or (params.get("to") and not end):
+            return Response({"detail": "from/to must be dates in YYYY-MM-DD format."}, status=status.HTTP_400_BAD_REQUEST)
+        shop = params.get("shop")
+        if shop and not shop.isdigit():
+            return Response({"detail": "shop must be a shop id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        orders = filter_orders(self.get_base_queryset(), shop=shop, status=params.get("status"), start=start, end=end)
+        columns, rows = export_rows(orders, kind)
+        chunks = iter_export(columns, rows, file_format)
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_export(chunks)
+        response = StreamingHttpResponse(chunks, content_type=FORMATS[file_format])
+        response["Content-Disposition"] = f'attachment; filename="{kind}.{file_format}"'
+        return response
+
     # ✅ Expose status choices to frontend
     @action(detail=False, methods=["get"], url_path="status-choices")
     def status_choices(self, request):
@@ -250,6 +526,8 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Response({
             "order_status_choices": dict(Order.STATUS_CHOICES),
             "payment_status_choices": dict(Order.PAYMENT_STATUS_CHOICES),
+            "status_transitions": {key: sorted(value) for key, value in TRANSITIONS["status"].items()},
+            "payment_status_transitions": {key: sorted(value) for key, value in TRANSITIONS["payment_status"].items()},
         })
 
 
@@ -315,3 +593,28 @@ def calculate_delivery_distance(request):
     }
 
     return Response(response, status=status.HTTP_200_OK)
+
+
+# ---------------- Delivery Boy Location ---------------- #
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def delivery_location(request):
+    """
+    Delivery boys report their position and availability here; the dispatcher
+    picks the nearest free one when an order is accepted.
+    Input: latitude, longitude, is_available
+    """
+    if getattr(request.user, "role", None) != "deliveryboy":
+        return Response({"detail": "Only delivery boys can report a location."}, status=status.HTTP_403_FORBIDDEN)
+
+    location = DeliveryBoyLocation.objects.filter(delivery_boy=request.user).first()
+    if request.method == "GET":
+        if not location:
+            return Response({"detail": "No location reported yet."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(DeliveryLocationSerializer(location).data)
+
+    serializer = DeliveryLocationSerializer(location, data=request.data, partial=location is not None)
+    serializer.is_valid(raise_exception=True)
+    location = serializer.save(delivery_boy=request.user)
+    dispatcher.update_rider(location)
+    return Response(serializer.data, status=status.HTTP_200_OK)
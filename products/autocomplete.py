@@ -0,0 +1,258 @@
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from django.db.models import Count, Exists, OuterRef
+from orders.models import OrderItem
+from shop.models import Shop
+from .models import Item, ShopItem
+
+ITEM = "item"
+SHOP = "shop"
+KINDS = (ITEM, SHOP)
+
+MAX_SUGGESTIONS = 20
+
+# Prefixes matching more keys than this get their top suggestions cached.
+SCAN_LIMIT = 256
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation, so ``Café-Bar`` is typed as ``cafe bar``."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD.sub(" ", text.casefold()).strip()
+
+
+def word_keys(name):
+    """The name from each word on (``chicken biryani`` -> itself and ``biryani``), so any word can be typed first."""
+    words = normalize(name).split()
+    return [" ".join(words[start:]) for start in range(len(words))]
+
+
+class PrefixIndex:
+    """
+    Top-k completions from a sorted array of ``(key, kind, id)``.
+
+    A prefix is a contiguous slice of the array, found with two binary
+    searches. Small slices are ranked on the spot; for short prefixes that
+    match many names the top MAX_SUGGESTIONS are cached, and patched in place
+    as entries are added or gain weight (an order), so writes do not throw
+    the hot lists away.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._entries = {}  # (kind, id) -> [name, weight, keys]
+        self._top = {}  # (prefix, kind) -> [(kind, id), ...] best first
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, entry):
+        return entry in self._entries
+
+    def build(self, rows):
+        """Replace the contents with ``rows`` of ``(kind, id, name, weight)``; one sort instead of n inserts."""
+        entries, keys = {}, []
+        for kind, entry_id, name, weight in rows:
+            entry_keys = word_keys(name)
+            entries[kind, entry_id] = [name, weight, entry_keys]
+            keys.extend((key, kind, entry_id) for key in entry_keys)
+        keys.sort()
+        with self._lock:
+            self._entries, self._keys, self._top = entries, keys, {}
+
+    def upsert(self, kind, entry_id, name, weight=None):
+        with self._lock:
+            previous = self._entries.get((kind, entry_id))
+            if weight is None:
+                weight = previous[1] if previous else 0
+            if previous and previous[0] == name:
+                self._reweigh((kind, entry_id), weight)
+                return
+            if previous:
+                self._drop(kind, entry_id, previous[2])
+            entry_keys = word_keys(name)
+            for key in entry_keys:
+                bisect.insort(self._keys, (key, kind, entry_id))
+            self._entries[kind, entry_id] = [name, weight, entry_keys]
+            self._promote((kind, entry_id))
+
+    def remove(self, kind, entry_id):
+        with self._lock:
+            previous = self._entries.pop((kind, entry_id), None)
+            if previous:
+                self._drop(kind, entry_id, previous[2])
+
+    def add_weight(self, kind, entry_id, delta):
+        with self._lock:
+            entry = self._entries.get((kind, entry_id))
+            if entry:
+                self._reweigh((kind, entry_id), entry[1] + delta)
+
+    def _drop(self, kind, entry_id, entry_keys):
+        for key in entry_keys:
+            position = bisect.bisect_left(self._keys, (key, kind, entry_id))
+            if position < len(self._keys) and self._keys[position] == (key, kind, entry_id):
+                del self._keys[position]
+        self._evict((kind, entry_id), entry_keys)
+
+    def _rank(self, entry):
+        name, weight, _ = self._entries[entry]
+        return -weight, name, entry
+
+    def _cached_prefixes(self, entry, entry_keys):
+        seen = set()
+        for key in entry_keys:
+            for length in range(1, len(key) + 1):
+                for cache_key in ((key[:length], entry[0]), (key[:length], None)):
+                    if cache_key in self._top and cache_key not in seen:
+                        seen.add(cache_key)
+                        yield cache_key
+
+    def _evict(self, entry, entry_keys):
+        """A removed or lighter entry leaves a gap only an index scan can fill: drop the lists it was in."""
+        for cache_key in list(self._cached_prefixes(entry, entry_keys)):
+            if entry in self._top[cache_key]:
+                del self._top[cache_key]
+
+    def _promote(self, entry):
+        """A new or heavier entry can only move up, so the cached lists are patched in place."""
+        rank = self._rank(entry)
+        for cache_key in self._cached_prefixes(entry, self._entries[entry][2]):
+            ranked = self._top[cache_key]
+            if entry in ranked:
+                ranked.remove(entry)
+            elif len(ranked) == MAX_SUGGESTIONS and rank >= self._rank(ranked[-1]):
+                continue
+            ranked.insert(bisect.bisect_left([self._rank(other) for other in ranked], rank), entry)
+            del ranked[MAX_SUGGESTIONS:]
+
+    def _reweigh(self, entry, weight):
+        lighter = weight < self._entries[entry][1]
+        self._entries[entry][1] = weight
+        if lighter:
+            self._evict(entry, self._entries[entry][2])
+        else:
+            self._promote(entry)
+
+    def _scan(self, prefix, kind):
+        start = bisect.bisect_left(self._keys, (prefix,))
+        end = bisect.bisect_left(self._keys, (prefix + "\U0010ffff",), lo=start)
+        # An entry can match through several of its words; count it once.
+        matched = {(entry_kind, entry_id) for _, entry_kind, entry_id in self._keys[start:end] if kind in (None, entry_kind)}
+        return heapq.nsmallest(MAX_SUGGESTIONS, matched, key=self._rank), end - start
+
+    def warm(self, depth=2):
+        """Rank the wide one- and two-letter prefixes up front; they are the first thing typed and the costliest to scan."""
+        with self._lock:
+            for length in range(1, depth + 1):
+                for prefix in {key[:length] for key, _, _ in self._keys}:
+                    for kind in (None, *KINDS):
+                        ranked, matched = self._scan(prefix, kind)
+                        if matched > SCAN_LIMIT:
+                            self._top[prefix, kind] = ranked
+
+    def complete(self, prefix, k=8, kind=None):
+        """Up to ``k`` entries ``(kind, id, name, weight)`` whose name has a word starting with ``prefix``, heaviest first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        k = min(k, MAX_SUGGESTIONS)
+        with self._lock:
+            ranked = self._top.get((prefix, kind))
+            if ranked is None:
+                ranked, matched = self._scan(prefix, kind)
+                if matched > SCAN_LIMIT:
+                    self._top[prefix, kind] = ranked
+            return [(entry[0], entry[1], *self._entries[entry][:2]) for entry in ranked[:k]]
+
+
+class Autocomplete:
+    """
+    Type-ahead over item and shop names, weighted by how often they were
+    ordered (OrderItem rows), served from a PrefixIndex in this process.
+
+    The index is filled on first use and then kept current by the model
+    signals and by checkout, without reloading. Like orders.dispatch, it lives
+    per process: a change made in another worker reaches this one only on
+    its next restart.
+    """
+
+    def __init__(self, index=None):
+        self.index = index or PrefixIndex()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self.index.build(self._rows())
+            self.index.warm()
+            self._loaded = True
+
+    def _rows(self):
+        item_sales = dict(
+            OrderItem.objects.values("shop_item__item").annotate(n=Count("id")).values_list("shop_item__item", "n")
+        )
+        shop_sales = dict(
+            OrderItem.objects.values("shop_item__shop").annotate(n=Count("id")).values_list("shop_item__shop", "n")
+        )
+        for item_id, name in self._listed_items().values_list("id", "name").iterator(chunk_size=5000):
+            yield ITEM, item_id, name, item_sales.get(item_id, 0)
+        for shop_id, name in Shop.objects.filter(is_active=True).values_list("id", "name").iterator(chunk_size=5000):
+            yield SHOP, shop_id, name, shop_sales.get(shop_id, 0)
+
+    @staticmethod
+    def _listed_items():
+        """Items some active shop has on its menu; nobody can order the rest."""
+        listed = ShopItem.objects.filter(item=OuterRef("pk"), is_available=True, shop__is_active=True)
+        return Item.objects.filter(Exists(listed))
+
+    def complete(self, prefix, k=8, kind=None):
+        self.ensure_loaded()
+        return self.index.complete(prefix, k=k, kind=kind)
+
+    # ---------------- Incremental updates ---------------- #
+    def refresh_items(self, item_ids):
+        """Re-read the names (and menu presence) of ``item_ids``; weights are kept."""
+        if not self._loaded:
+            return
+        item_ids = set(item_ids)
+        listed = dict(self._listed_items().filter(id__in=item_ids).values_list("id", "name"))
+        for item_id in item_ids:
+            if item_id in listed:
+                self.index.upsert(ITEM, item_id, listed[item_id])
+            else:
+                self.index.remove(ITEM, item_id)
+
+    def refresh_shop(self, shop):
+        if not self._loaded:
+            return
+        if shop.is_active:
+            self.index.upsert(SHOP, shop.id, shop.name)
+        else:
+            self.index.remove(SHOP, shop.id)
+
+    def remove(self, kind, entry_id):
+        if self._loaded:
+            self.index.remove(kind, entry_id)
+
+    def record_order(self, shop_id, item_ids):
+        """Count a placed order's lines towards the popularity of its items and shop."""
+        if not self._loaded:
+            return
+        for item_id in item_ids:
+            self.index.add_weight(ITEM, item_id, 1)
+        self.index.add_weight(SHOP, shop_id, len(item_ids))
+
+
+autocomplete = Autocomplete()
@@ -0,0 +1,354 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_time
+from .autocomplete import autocomplete
+from .menu_cache import invalidate_menus
+from .models import HSN, Category, Item, ShopItem, SubCategory
+from .search import index_shop_items
+from .tasks import add_shop_categories
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+IMPORT_CHUNK_SIZE = 1000
+
+# A chunk that loses a race with a concurrent import is read and written again this many times in all.
+CHUNK_ATTEMPTS = 2
+
+# Past this many, errors are only counted.
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_COLUMNS = (
+    "category", "subcategory", "name", "description", "hsn", "gst",
+    "price", "quantity", "available_from", "available_till", "is_available",
+)
+
+TRUE_VALUES = ("1", "true", "yes", "y")
+FALSE_VALUES = ("0", "false", "no", "n")
+
+
+class CatalogImportError(Exception):
+    """Raised when the file as a whole cannot be read (bad format or header)."""
+
+
+def import_format(filename, requested=None):
+    """The import format from an explicit ``requested`` value or the file extension."""
+    file_format = (requested or filename.rsplit(".", 1)[-1]).lower()
+    file_format = "jsonl" if file_format in ("ndjson", "json") else file_format
+    if file_format not in IMPORT_FORMATS:
+        raise CatalogImportError(f"Unsupported format '{file_format}'. Use one of: {', '.join(IMPORT_FORMATS)}.")
+    return file_format
+
+
+def _lines(binary_file):
+    """Decode ``binary_file`` a line at a time, so a line that is not UTF-8 is reported by its number."""
+    for line_number, line in enumerate(binary_file, start=1):
+        try:
+            yield line.decode("utf-8-sig" if line_number == 1 else "utf-8")
+        except UnicodeDecodeError:
+            raise CatalogImportError(f"Line {line_number} is not valid UTF-8.")
+
+
+def iter_rows(binary_file, file_format):
+    """
+    Yield ``(row_number, dict)`` from a binary file object without reading it
+    all into memory. A line that cannot be decoded or parsed as CSV stops the
+    import with CatalogImportError; chunks already written stay imported.
+    """
+    lines = _lines(binary_file)
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        try:
+            missing = {"category", "subcategory", "name", "price"} - set(reader.fieldnames or ())
+            if missing:
+                raise CatalogImportError(f"CSV header is missing: {', '.join(sorted(missing))}.")
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as exc:
+            # DictReader.line_num only moves on success; the underlying reader's counts the failing line.
+            raise CatalogImportError(f"Line {reader.reader.line_num}: {exc}.")
+        return
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, row if isinstance(row, dict) else None
+
+
+# ---------------- Row parsing ---------------- #
+
+def _text(row, name):
+    value = row.get(name)
+    return "" if value is None else str(value).strip()
+
+
+def _decimal(row, name, errors, required=False):
+    value = _text(row, name)
+    if not value:
+        if required:
+            errors[name] = "This field is required."
+        return None
+    try:
+        number = Decimal(value)
+        # NaN and Infinity parse, but compare and quantize badly.
+        if not number.is_finite():
+            raise InvalidOperation
+        number = number.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        errors[name] = "A valid number is required."
+        return None
+    if number < 0 or number >= Decimal("1e8"):
+        errors[name] = "Must be between 0 and 99999999.99."
+        return None
+    return number
+
+
+def _time(row, name, errors):
+    value = _text(row, name)
+    if not value:
+        return None
+    try:
+        parsed = parse_time(value)
+    except ValueError:
+        # Well-formed but out of range, like 25:00.
+        parsed = None
+    if parsed is None:
+        errors[name] = "Use HH:MM or HH:MM:SS."
+    return parsed
+
+
+def parse_row(row):
+    """``(row, None)`` with the values parsed, or ``(None, errors)``. Names are stripped and keep their casing."""
+    if row is None:
+        return None, {"row": "Not a JSON object."}
+    errors = {}
+    parsed = {name: _text(row, name) for name in ("category", "subcategory", "name", "description", "hsn")}
+    for name in ("category", "subcategory", "name"):
+        if not parsed[name]:
+            errors[name] = "This field is required."
+    for name, limit in (("category", 100), ("subcategory", 100), ("name", 150), ("hsn", 20)):
+        if len(parsed[name]) > limit:
+            errors[name] = f"At most {limit} characters."
+
+    parsed["price"] = _decimal(row, "price", errors, required=True)
+    parsed["gst"] = _decimal(row, "gst", errors)
+    if parsed["gst"] is not None and parsed["gst"] >= 1000:
+        errors["gst"] = "Must be below 1000."
+
+    quantity = _text(row, "quantity") or "0"
+    try:
+        parsed["quantity"] = int(quantity)
+        if parsed["quantity"] < 0:
+            raise ValueError
+    except ValueError:
+        errors["quantity"] = "A whole number of 0 or more is required."
+
+    parsed["available_from"] = _time(row, "available_from", errors)
+    parsed["available_till"] = _time(row, "available_till", errors)
+
+    available = _text(row, "is_available").lower()
+    if available and available not in TRUE_VALUES + FALSE_VALUES:
+        errors["is_available"] = "Use true or false."
+    parsed["is_available"] = available not in FALSE_VALUES
+    return (None, errors) if errors else (parsed, None)
+
+
+# ---------------- Import ---------------- #
+
+class CatalogImport:
+    """
+    Upsert Items and a shop's ShopItems from parsed rows, a chunk at a time.
+
+    Categories, subcategories and HSNs are resolved through in-memory maps
+    (matched case-insensitively, missing ones created in bulk); items match
+    on their exact name within the subcategory, like the unique constraint. Each
+    chunk costs a fixed handful of queries: read the existing items and shop
+    items, then one bulk_create and one bulk_update per model. The work the
+    model signals would do per row (search index, autocomplete) is done per
+    chunk, and shop category membership and the menu cache once at the end.
+    """
+
+    def __init__(self, shop, chunk_size=IMPORT_CHUNK_SIZE):
+        self.shop = shop
+        self.chunk_size = chunk_size
+        self.categories = {name.casefold(): pk for pk, name in Category.objects.values_list("id", "name")}
+        self.subcategories = {
+            (category_id, name.casefold()): pk for pk, category_id, name in SubCategory.objects.values_list("id", "category_id", "name")
+        }
+        self.hsns = {code.casefold(): pk for pk, code in HSN.objects.values_list("id", "hsncode")}
+        self.pairs = set()  # (subcategory_id, category_id) the shop now sells
+        self.report = {
+            "rows": 0, "imported": 0, "error_count": 0, "errors": [],
+            "created_items": 0, "updated_items": 0, "created_shop_items": 0, "updated_shop_items": 0,
+        }
+
+    def run(self, rows):
+        chunk = []
+        try:
+            for row_number, row in rows:
+                self.report["rows"] += 1
+                parsed, errors = parse_row(row)
+                if errors:
+                    self.error(row_number, errors)
+                    continue
+                chunk.append((row_number, parsed))
+                if len(chunk) == self.chunk_size:
+                    self.import_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self.import_chunk(chunk)
+        finally:
+            # Chunks committed before a failure are live too.
+            add_shop_categories(self.shop.id, self.pairs)
+            invalidate_menus([self.shop.id])
+        return self.report
+
+    def error(self, row_number, errors):
+        self.report["error_count"] += 1
+        if len(self.report["errors"]) < MAX_REPORTED_ERRORS:
+            self.report["errors"].append({"row": row_number, "errors": errors})
+
+    # ---------------- Lookups ---------------- #
+    def _resolve(self, chunk):
+        """Fill in category/subcategory/HSN ids, creating the missing ones in bulk; drops rows that cannot resolve."""
+        new_categories = {row["category"].casefold(): row["category"] for _, row in chunk if row["category"].casefold() not in self.categories}
+        if new_categories:
+            Category.objects.bulk_create([Category(name=name) for name in new_categories.values()], ignore_conflicts=True)
+            self.categories.update(
+                (name.casefold(), pk) for pk, name in Category.objects.filter(name__in=new_categories.values()).values_list("id", "name")
+            )
+
+        new_subcategories = {}
+        for _, row in chunk:
+            key = (self.categories[row["category"].casefold()], row["subcategory"].casefold())
+            if key not in self.subcategories:
+                new_subcategories[key] = row["subcategory"]
+        if new_subcategories:
+            SubCategory.objects.bulk_create(
+                [SubCategory(category_id=category_id, name=name) for (category_id, _), name in new_subcategories.items()],
+                ignore_conflicts=True,
+            )
+            category_ids = {category_id for category_id, _ in new_subcategories}
+            self.subcategories.update(
+                ((category_id, name.casefold()), pk)
+                for pk, category_id, name in SubCategory.objects.filter(category_id__in=category_ids).values_list("id", "category_id", "name")
+            )
+
+        new_hsns = {}
+        for _, row in chunk:
+            code = row["hsn"]
+            if code and code.casefold() not in self.hsns and row["gst"] is not None:
+                new_hsns[code.casefold()] = HSN(hsncode=code, gst=row["gst"])
+        if new_hsns:
+            HSN.objects.bulk_create(new_hsns.values(), ignore_conflicts=True)
+            codes = [hsn.hsncode for hsn in new_hsns.values()]
+            self.hsns.update((code.casefold(), pk) for pk, code in HSN.objects.filter(hsncode__in=codes).values_list("id", "hsncode"))
+
+        resolved = {}
+        for row_number, row in chunk:
+            category_id = self.categories[row["category"].casefold()]
+            row["subcategory_id"] = self.subcategories[category_id, row["subcategory"].casefold()]
+            row["category_id"] = category_id
+            row["hsn_id"] = None
+            if row["hsn"]:
+                row["hsn_id"] = self.hsns.get(row["hsn"].casefold())
+                if row["hsn_id"] is None:
+                    self.error(row_number, {"hsn": f"Unknown HSN code '{row['hsn']}'; give its gst to create it."})
+                    continue
+            # An item repeated in the file: the last row wins.
+            resolved[row["subcategory_id"], row["name"]] = (row_number, row)
+        return resolved
+
+    # ---------------- Upserts ---------------- #
+    def import_chunk(self, chunk):
+        # Lookups are created with ignore_conflicts, so they are safe outside the chunk's transaction.
+        rows = self._resolve(chunk)
+        for attempt in range(CHUNK_ATTEMPTS):
+            counts = {key: value for key, value in self.report.items() if key != "errors"}
+            try:
+                with transaction.atomic():
+                    items, touched = self._upsert_items(rows)
+                    touched |= self._upsert_shop_items(rows, items)
+                break
+            except IntegrityError:
+                # Another import inserted some of these items after they were read;
+                # reading again turns those inserts into updates.
+                self.report.update(counts)
+        else:
+            for row_number, _ in rows.values():
+                self.error(row_number, {"row": "Changed by a concurrent import; import it again."})
+            return
+        self.report["imported"] += len(rows)
+
+        # Derived data the per-row signals would have refreshed, for the rows that changed.
+        if touched:
+            index_shop_items(ShopItem.objects.filter(item_id__in=touched))
+            autocomplete.refresh_items(touched)
+        self.pairs.update((row["subcategory_id"], row["category_id"]) for _, row in rows.values())
+
+    def _upsert_items(self, rows):
+        # Only name IN (...): with subcategory_id IN (...) as well, SQLite probes
+        # the unique index once per (subcategory, name) pair, a cross product.
+        names = {row["name"] for _, row in rows.values()}
+        existing = {
+            (item.subcategory_id, item.name): item
+            for item in Item.objects.filter(name__in=names)
+            if (item.subcategory_id, item.name) in rows
+        }
+
+        items, created, changed = {}, [], []
+        for key, (_, row) in rows.items():
+            item = existing.get(key)
+            if item is None:
+                item = Item(subcategory_id=row["subcategory_id"], name=row["name"], description=row["description"] or None, hsn_id=row["hsn_id"])
+                created.append(item)
+            else:
+                description = row["description"] or item.description
+                hsn_id = row["hsn_id"] or item.hsn_id
+                if (description, hsn_id) != (item.description, item.hsn_id):
+                    item.description, item.hsn_id = description, hsn_id
+                    changed.append(item)
+            items[key] = item
+
+        Item.objects.bulk_create(created, batch_size=500)
+        Item.objects.bulk_update(changed, ["description", "hsn"], batch_size=500)
+        self.report["created_items"] += len(created)
+        self.report["updated_items"] += len(changed)
+        return items, {item.id for item in created + changed}
+
+    def _upsert_shop_items(self, rows, items):
+        existing = {
+            shop_item.item_id: shop_item
+            for shop_item in ShopItem.objects.filter(shop=self.shop, item_id__in=[item.id for item in items.values()])
+        }
+        fields = ["total_amount", "available_quantity", "available_from", "available_till", "is_available"]
+        created, changed = [], []
+        for key, (_, row) in rows.items():
+            item = items[key]
+            values = dict(zip(fields, (row["price"], row["quantity"], row["available_from"], row["available_till"], row["is_available"])))
+            shop_item = existing.get(item.id)
+            if shop_item is None:
+                # bulk_create skips ShopItem.save(), so the denormalized price is set here.
+                shop_item = ShopItem(shop=self.shop, item=item, effective_price=row["price"], **values)
+                created.append(shop_item)
+            elif any(getattr(shop_item, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(shop_item, field, value)
+                shop_item.effective_price = ShopItem.discounted_price(shop_item.total_amount, shop_item.current_offer_pct)
+                changed.append(shop_item)
+
+        ShopItem.objects.bulk_create(created, batch_size=500)
+        ShopItem.objects.bulk_update(changed, fields + ["effective_price"], batch_size=500)
+        self.report["created_shop_items"] += len(created)
+        self.report["updated_shop_items"] += len(changed)
+        return {shop_item.item_id for shop_item in created + changed}
+
+
+def import_catalog(shop, binary_file, file_format, chunk_size=IMPORT_CHUNK_SIZE):
+    """Stream ``binary_file`` (CSV or JSONL) into ``shop``'s catalog; returns the report dict."""
+    return CatalogImport(shop, chunk_size=chunk_size).run(iter_rows(binary_file, file_format))
@@ -0,0 +1,78 @@
+from decimal import Decimal, InvalidOperation
+from rest_framework.exceptions import ValidationError
+
+TRUE_VALUES = ("1", "true", "yes")
+
+
+def _int(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: ["A valid integer is required."]})
+
+
+def _price(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: ["A valid number is required."]})
+    if not price.is_finite() or price < 0:
+        raise ValidationError({name: ["A valid number is required."]})
+    return price
+
+
+def _flag(params, name):
+    return params.get(name, "").lower() in TRUE_VALUES
+
+
+def filter_items(items, params):
+    """``?category=&subcategory=&hsn=`` on an Item queryset."""
+    category = _int(params, "category")
+    if category is not None:
+        items = items.filter(subcategory__category_id=category)
+    subcategory = _int(params, "subcategory")
+    if subcategory is not None:
+        items = items.filter(subcategory_id=subcategory)
+    hsn = _int(params, "hsn")
+    if hsn is not None:
+        items = items.filter(hsn_id=hsn)
+    return items
+
+
+def filter_shop_items(shop_items, params):
+    """
+    ``?category=&subcategory=&min_price=&max_price=&in_stock=&offer_only=`` on
+    a ShopItem queryset. Prices are the stored ``effective_price`` (after the
+    current offer), so every filter is a plain column comparison.
+    """
+    category = _int(params, "category")
+    if category is not None:
+        shop_items = shop_items.filter(item__subcategory__category_id=category)
+    subcategory = _int(params, "subcategory")
+    if subcategory is not None:
+        shop_items = shop_items.filter(item__subcategory_id=subcategory)
+    min_price = _price(params, "min_price")
+    if min_price is not None:
+        shop_items = shop_items.filter(effective_price__gte=min_price)
+    max_price = _price(params, "max_price")
+    if max_price is not None:
+        shop_items = shop_items.filter(effective_price__lte=max_price)
+    if _flag(params, "in_stock"):
+        shop_items = shop_items.filter(available_quantity__gt=0)
+    if _flag(params, "offer_only"):
+        shop_items = shop_items.filter(current_offer_pct__isnull=False)
+    return shop_items
+
+
+def filter_subcategories(subcategories, params):
+    """``?category=`` on a SubCategory queryset."""
+    category = _int(params, "category")
+    if category is not None:
+        subcategories = subcategories.filter(category_id=category)
+    return subcategories
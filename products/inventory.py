@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from .menu_cache import invalidate_menus
+from .models import ShopItem
+
+
+class InsufficientStock(Exception):
+    """Raised when a reservation asks for more than is available; ``shortages`` maps shop_item_id -> available."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(f"Insufficient stock for shop items {sorted(shortages)}")
+
+
+def _per_item(quantities):
+    """``CASE id WHEN .. THEN qty END`` so every line is handled by one statement."""
+    return Case(
+        *[When(id=shop_item_id, then=Value(quantity)) for shop_item_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def reserve_stock(quantities):
+    """
+    Atomically take ``quantities`` (shop_item_id -> qty) out of ``available_quantity``.
+
+    One conditional UPDATE decrements every line only where enough stock is
+    left, so concurrent checkouts never read-modify-write and cannot oversell.
+    If any line falls short nothing is reserved and InsufficientStock is raised.
+    """
+    quantities = {shop_item_id: quantity for shop_item_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+
+    try:
+        with transaction.atomic():
+            needed = _per_item(quantities)
+            updated = ShopItem.objects.filter(id__in=quantities, available_quantity__gte=needed).update(
+                available_quantity=F("available_quantity") - needed
+            )
+            if updated != len(quantities):
+                # Leaving the block with an exception rolls back the lines that did fit.
+                raise InsufficientStock({})
+            # .update() sends no signals; the menu only changes for lines that just ran out.
+            _invalidate_menus_of(ShopItem.objects.filter(id__in=quantities, available_quantity=0))
+    except InsufficientStock:
+        available = dict(ShopItem.objects.filter(id__in=quantities).values_list("id", "available_quantity"))
+        raise InsufficientStock({
+            shop_item_id: available.get(shop_item_id, 0)
+            for shop_item_id, quantity in quantities.items()
+            if available.get(shop_item_id, 0) < quantity
+        })
+
+
+def release_stock(quantities):
+    """Return ``quantities`` (shop_item_id -> qty) to ``available_quantity`` in one UPDATE."""
+    quantities = {shop_item_id: quantity for shop_item_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+    with transaction.atomic():
+        returned = _per_item(quantities)
+        ShopItem.objects.filter(id__in=quantities).update(available_quantity=F("available_quantity") + returned)
+        # Lines now holding exactly what was returned were sold out, and are back on the menu.
+        _invalidate_menus_of(ShopItem.objects.filter(id__in=quantities, available_quantity=returned))
+
+
+def _invalidate_menus_of(shop_items):
+    """
+    The menu shows stock only as in/out of stock (MenuShopItemSerializer), so
+    just the shops of ``shop_items`` that crossed zero get a new version.
+    Read in the writer's transaction, so a concurrent writer sees our rows.
+    """
+    invalidate_menus(shop_items.values_list("shop_id", flat=True).distinct())
@@ -0,0 +1,130 @@
+import itertools
+import random
+import sqlite3
+import time
+from django.core.management.base import BaseCommand
+from products.search import SEARCH_COLUMNS, create_table_sql, match_expression, rank_config_sql
+
+WORDS = (
+    "chicken mutton beef fish prawn paneer egg veg mushroom potato tomato onion garlic ginger "
+    "biryani fried rice noodles curry masala tikka kebab roll shawarma pizza burger sandwich "
+    "dosa idli vada parotta chapati appam puttu porotta pulao soup salad juice shake lassi "
+    "tea coffee cake pastry ice cream kulfi halwa payasam ladoo jalebi chocolate vanilla mango "
+    "spicy crispy grilled tandoori butter cheese garlic pepper lemon honey smoked roasted "
+    "milk bread butter ghee oil sugar salt flour atta rice dal soap shampoo detergent biscuit"
+).split()
+CATEGORIES = ("Food", "Bakery", "Beverages", "Grocery", "Dairy", "Snacks", "Desserts", "Household")
+PLACES = ("Kozhikode", "Kochi", "Thrissur", "Kannur", "Malappuram", "Palakkad", "Kollam", "Calicut Beach")
+
+
+class Command(BaseCommand):
+    help = "Time FTS5 catalog search against a LIKE scan on a synthetic catalog, in a scratch SQLite database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1_000_000, help="Synthetic shop items.")
+        parser.add_argument("--shops", type=int, default=5000)
+        parser.add_argument("--queries", type=int, default=50, help="Searches to time.")
+        parser.add_argument("--vocabulary", type=int, default=5000, help="Synthetic brand/dish words besides the common ones.")
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--database", default=":memory:", help="SQLite file for the scratch catalog.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        db = sqlite3.connect(options["database"])
+        db.executescript(
+            "DROP TABLE IF EXISTS shop; DROP TABLE IF EXISTS shopitem; DROP TABLE IF EXISTS products_search;"
+            "CREATE TABLE shop (id INTEGER PRIMARY KEY, name TEXT, location TEXT, pincode TEXT, is_active INTEGER);"
+            "CREATE TABLE shopitem (id INTEGER PRIMARY KEY, shop_id INTEGER, is_available INTEGER, available_quantity INTEGER,"
+            " item_name TEXT, description TEXT, subcategory TEXT, category TEXT);"
+        )
+        db.execute(create_table_sql())
+        db.execute(rank_config_sql())
+
+        # Real catalogs have a long tail of brand and dish names; word use is roughly Zipfian.
+        syllables = ("ka", "ra", "mo", "li", "ta", "su", "ne", "pa", "vi", "do", "ha", "ri", "ko", "ma", "zu", "be")
+        vocabulary = list(WORDS) + list({
+            "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(options["vocabulary"])
+        })
+        cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+
+        def words(count):
+            return rng.choices(vocabulary, cum_weights=cum_weights, k=count)
+
+        def phrase(low, high):
+            return " ".join(words(rng.randint(low, high)))
+
+        started = time.perf_counter()
+        shops = [
+            (shop_id, f"{phrase(1, 2).title()} Store", rng.choice(PLACES), str(673000 + rng.randrange(40)), int(rng.random() > 0.05))
+            for shop_id in range(1, options["shops"] + 1)
+        ]
+        db.executemany("INSERT INTO shop VALUES (?, ?, ?, ?, ?)", shops)
+        batch = []
+        for shop_item_id in range(1, options["items"] + 1):
+            shop = shops[rng.randrange(len(shops))]
+            batch.append((
+                shop_item_id, shop[0], int(rng.random() > 0.1), rng.randrange(0, 50),
+                phrase(2, 4).title(), phrase(6, 14), phrase(1, 2).title(), rng.choice(CATEGORIES), shop[1], shop[2],
+            ))
+            if len(batch) == 20000:
+                self._load(db, batch)
+                batch = []
+        if batch:
+            self._load(db, batch)
+        db.execute("INSERT INTO products_search(products_search) VALUES ('optimize')")
+        db.commit()
+        build = time.perf_counter() - started
+
+        queries = []
+        for _ in range(options["queries"]):
+            # Typed-so-far prefixes of catalog words, as from a search box.
+            typed = rng.sample(vocabulary, rng.randint(1, 2))
+            queries.append(" ".join(word[:rng.randint(3, len(word))] if len(word) > 3 else word for word in typed))
+        page_size = options["page_size"]
+
+        fts_sql = (
+            "SELECT products_search.rowid FROM products_search "
+            "JOIN shopitem si ON si.id = products_search.rowid JOIN shop sh ON sh.id = si.shop_id "
+            "WHERE products_search MATCH ? AND si.is_available AND sh.is_active "
+            "ORDER BY products_search.rank, products_search.rowid LIMIT ?"
+        )
+        started = time.perf_counter()
+        fts_hits = [db.execute(fts_sql, (match_expression(query), page_size)).fetchall() for query in queries]
+        fts = time.perf_counter() - started
+
+        # Without the index every row is tested, and all matches are needed before any ranking.
+        searched = ("item_name", "description", "subcategory", "category")
+        started = time.perf_counter()
+        scanned = []
+        for query in queries:
+            conditions, params = [], []
+            for word in query.split():
+                conditions.append("(" + " OR ".join(
+                    [f"si.{column} LIKE ?" for column in searched] + ["sh.name LIKE ?", "sh.location LIKE ?"]
+                ) + ")")
+                params += [f"%{word}%"] * (len(searched) + 2)
+            scanned.append(db.execute(
+                "SELECT si.id FROM shopitem si JOIN shop sh ON sh.id = si.shop_id "
+                f"WHERE si.is_available AND sh.is_active AND {' AND '.join(conditions)}", params
+            ).fetchall())
+        like = time.perf_counter() - started
+
+        count = len(queries)
+        self.stdout.write(f"{options['items']} shop items in {options['shops']} shops, {count} queries, page size {page_size}")
+        self.stdout.write(f"Columns indexed: {', '.join(SEARCH_COLUMNS)}")
+        self.stdout.write(f"Catalog + index build: {build:.1f} s")
+        self.stdout.write(f"FTS5 ranked page: {fts * 1000:.1f} ms total, {fts / count * 1000:.2f} ms/query")
+        self.stdout.write(f"LIKE scan:        {like * 1000:.1f} ms total, {like / count * 1000:.2f} ms/query")
+        self.stdout.write(f"Speed-up:         {like / fts:.0f}x")
+        empty = sum(1 for hits in fts_hits if not hits)
+        self.stdout.write(self.style.SUCCESS(
+            f"Average matches per query (LIKE): {sum(len(rows) for rows in scanned) / count:.0f}; FTS5 pages empty: {empty}"
+        ))
+
+    def _load(self, db, batch):
+        db.executemany("INSERT INTO shopitem VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [row[:8] for row in batch])
+        db.executemany(
+            f"INSERT INTO products_search(rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(row[0], *row[4:]) for row in batch],
+        )
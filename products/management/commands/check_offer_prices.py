@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.menu_cache import invalidate_menus
+from products.models import ShopItem
+from products.pricing import price_drift
+
+
+class Command(BaseCommand):
+    help = "Compare ShopItem.current_offer_pct / effective_price with the current offers, and optionally fix them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Rewrite the rows that disagree.")
+        parser.add_argument("--shop", type=int, help="Only shop items of this shop id.")
+        parser.add_argument("--limit", type=int, default=20, help="Mismatches to list.")
+
+    def handle(self, *args, **options):
+        items = ShopItem.objects.all()
+        if options["shop"]:
+            items = items.filter(shop_id=options["shop"])
+
+        drifted = price_drift(items)
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All shop item prices match their offers."))
+            return
+
+        for shop_item in drifted[:options["limit"]]:
+            self.stdout.write(
+                f"ShopItem {shop_item.id}: offer {shop_item.stored_offer_pct} -> {shop_item.current_offer_pct}, "
+                f"price {shop_item.stored_price} -> {shop_item.effective_price}"
+            )
+
+        if not options["fix"]:
+            raise CommandError(f"{len(drifted)} shop items disagree with their offers. Run with --fix to repair them.")
+        ShopItem.objects.bulk_update(drifted, ["current_offer_pct", "effective_price"], batch_size=500)
+        invalidate_menus({shop_item.shop_id for shop_item in drifted})
+        self.stdout.write(self.style.SUCCESS(f"Fixed {len(drifted)} shop items."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.catalog_import import IMPORT_CHUNK_SIZE, IMPORT_COLUMNS, IMPORT_FORMATS, CatalogImportError, import_catalog, import_format
+from shop.models import Shop
+
+
+class Command(BaseCommand):
+    help = f"Stream a CSV / JSONL catalog into a shop's Items and ShopItems. Columns: {', '.join(IMPORT_COLUMNS)}."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file.")
+        parser.add_argument("--shop", type=int, required=True, help="Shop id to import into.")
+        parser.add_argument("--input-format", dest="file_format", choices=IMPORT_FORMATS, help="Default: from the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument("--show-errors", type=int, default=20, help="Row errors to list.")
+
+    def handle(self, *args, **options):
+        shop = Shop.objects.filter(id=options["shop"]).first()
+        if shop is None:
+            raise CommandError(f"Shop {options['shop']} does not exist.")
+
+        try:
+            file_format = import_format(options["path"], options["file_format"])
+            with open(options["path"], "rb") as catalog:
+                report = import_catalog(shop, catalog, file_format, chunk_size=options["chunk_size"])
+        except (CatalogImportError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report["errors"][:options["show_errors"]]:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(
+            f"{report['rows']} rows: {report['created_items']} items created, {report['updated_items']} updated; "
+            f"{report['created_shop_items']} shop items created, {report['updated_shop_items']} updated."
+        )
+        style = self.style.WARNING if report["error_count"] else self.style.SUCCESS
+        self.stdout.write(style(f"Imported {report['imported']} rows, {report['error_count']} rejected."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from every ShopItem (e.g. after bulk writes that skipped signals)."
+
+    def handle(self, *args, **options):
+        written = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} shop items."))
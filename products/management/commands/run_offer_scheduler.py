@@ -0,0 +1,46 @@
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from products.offer_scheduler import OfferScheduler
+
+
+class Command(BaseCommand):
+    help = "Switch offers on and off at their start and end times until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=15.0, help="Seconds between checks for new or edited offers.")
+        parser.add_argument("--once", action="store_true", help="Catch up on due boundaries and exit.")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+
+        def stop(signum, frame):
+            self.stopping = True
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        scheduler = OfferScheduler()
+        scheduler.load()
+        self.stdout.write(f"Tracking {len(scheduler.heap)} upcoming offer boundaries")
+        if options["once"]:
+            return
+
+        next_poll = time.monotonic() + options["poll_interval"]
+        while not self.stopping:
+            close_old_connections()
+            if time.monotonic() >= next_poll:
+                scheduler.poll_changes()
+                next_poll = time.monotonic() + options["poll_interval"]
+            changed = scheduler.run_due()
+            if changed:
+                self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} switched {changed} offers")
+
+            # Sleep until the next boundary or the next poll, whichever is first (in short steps, to stop promptly).
+            wait = next_poll - time.monotonic()
+            boundary = scheduler.next_boundary()
+            if boundary is not None:
+                wait = min(wait, (boundary - timezone.now()).total_seconds())
+            time.sleep(min(max(wait, 0), 1.0))
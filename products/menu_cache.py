@@ -0,0 +1,120 @@
+import bisect
+import hashlib
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag, urlencode
+from .models import ShopItem
+
+MENU_SNAPSHOT_TTL = getattr(settings, "MENU_SNAPSHOT_TTL", timedelta(days=1))
+
+
+def _version_key(shop_id):
+    return f"menu-version:{shop_id}"
+
+
+def menu_version(shop_id):
+    """
+    The current menu version of a shop. Versions are opaque tokens that live in
+    the cache with no expiry; a missing one (first hit, or evicted) is minted,
+    which simply orphans any snapshot cached under the old one.
+    """
+    version = cache.get(_version_key(shop_id))
+    if version is None:
+        cache.add(_version_key(shop_id), uuid.uuid4().hex, None)
+        version = cache.get(_version_key(shop_id))
+    return version
+
+
+def _bump(shop_ids):
+    cache.set_many({_version_key(shop_id): uuid.uuid4().hex for shop_id in shop_ids}, None)
+
+
+def invalidate_menus(shop_ids):
+    """
+    Move the given shops to a new menu version. Called from the model signals
+    and from the bulk writers (pricing, stock) that bypass them.
+    """
+    shop_ids = {shop_id for shop_id in shop_ids if shop_id is not None}
+    if not shop_ids:
+        return
+    _bump(shop_ids)
+    # Bump again once the writer commits: a snapshot built in between still read the old rows.
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(shop_ids))
+
+
+# The query params a menu page is built from: products.filters.filter_shop_items, then the pagination.
+MENU_PARAMS = ("category", "subcategory", "min_price", "max_price", "in_stock", "offer_only", "cursor", "page_size")
+
+
+def menu_params(request):
+    """The recognised menu params of ``request``, last value wins as in the filters; anything else is ignored."""
+    return {name: request.GET[name] for name in MENU_PARAMS if name in request.GET}
+
+
+def menu_url(request):
+    """The absolute URL of the menu page with only its menu params, used for the links inside a snapshot."""
+    query = urlencode(sorted(menu_params(request).items()))
+    return request.build_absolute_uri(f"{request.path}?{query}" if query else request.path)
+
+
+def _base_key(request):
+    # Image and page URLs in the snapshot are absolute, so each host/scheme gets its own
+    # copy, and each page/filter combination its own. Unknown params (cache busters,
+    # tracking tags) are left out, so they cannot fill the cache with copies.
+    return hashlib.md5(menu_url(request).encode()).hexdigest()[:12]
+
+
+def menu_boundaries(shop_id, version):
+    """
+    The sorted times of day at which some item of the shop opens or closes,
+    cached per menu version. Between two boundaries the menu cannot change
+    by the clock alone.
+    """
+    key = f"menu-boundaries:{shop_id}:{version}"
+    boundaries = cache.get(key)
+    if boundaries is None:
+        times = ShopItem.objects.filter(shop_id=shop_id).values_list("available_from", "available_till").distinct()
+        boundaries = sorted({time for pair in times for time in pair if time is not None})
+        cache.set(key, boundaries, MENU_SNAPSHOT_TTL.total_seconds())
+    return boundaries
+
+
+def menu_etag(shop_id, request, at):
+    """
+    ETag of the shop's menu as served to ``request`` at time of day ``at``:
+    the version, the time bucket ``at`` falls in, and the host/query. Only
+    cache reads once warm, so no DB query.
+    """
+    version = menu_version(shop_id)
+    bucket = bisect.bisect_right(menu_boundaries(shop_id, version), at)
+    return quote_etag(f"{shop_id}-{version}-{bucket}-{_base_key(request)}")
+
+
+def _strong(etag):
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def not_modified(etag, request):
+    """True when the request's If-None-Match already names ``etag``."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    etags = {_strong(tag) for tag in parse_etags(header)}
+    return "*" in etags or _strong(etag) in etags
+
+
+def menu_snapshot(etag, render):
+    """
+    The menu bytes cached under ``etag`` (which carries the version);
+    ``render()`` builds them on a miss, the only time the DB is read.
+    """
+    key = f"menu:{etag}"
+    body = cache.get(key)
+    if body is None:
+        body = render()
+        cache.set(key, body, MENU_SNAPSHOT_TTL.total_seconds())
+    return body
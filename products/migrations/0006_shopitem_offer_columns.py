@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:59
+
+from decimal import ROUND_HALF_UP, Decimal
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_offer_columns(apps, schema_editor):
+    ShopItem = apps.get_model('products', 'ShopItem')
+    ShopItemOffer = apps.get_model('products', 'ShopItemOffer')
+    now = timezone.now()
+    current = {}
+    for shop_item_id, offer_pct in ShopItemOffer.objects.filter(
+        active=True, offer_starting_datetime__lte=now, offer_ending_datetime__gt=now
+    ).order_by('-id').values_list('shop_item_id', 'offer_pct'):
+        current[shop_item_id] = offer_pct  # lowest id wins
+
+    items = []
+    for shop_item in ShopItem.objects.only('id', 'total_amount').iterator():
+        offer_pct = current.get(shop_item.id)
+        price = shop_item.total_amount
+        if offer_pct is not None:
+            price -= (price * offer_pct / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        shop_item.current_offer_pct = offer_pct
+        shop_item.effective_price = price
+        items.append(shop_item)
+    ShopItem.objects.bulk_update(items, ['current_offer_pct', 'effective_price'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_shopcategory_image_shopitem_image_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopitem',
+            name='current_offer_pct',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='shopitem',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(fill_offer_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_shopitem_offer_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopitemoffer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='shopitemoffer',
+            index=models.Index(fields=['offer_starting_datetime'], name='offer_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopitemoffer',
+            index=models.Index(fields=['offer_ending_datetime'], name='offer_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopitemoffer',
+            index=models.Index(fields=['updated_at', 'id'], name='offer_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def index_existing_shop_items(apps, schema_editor):
+    ShopItem = apps.get_model('products', 'ShopItem')
+    rows = ShopItem.objects.values_list(
+        'id', 'item__name', 'item__description', 'item__subcategory__name',
+        'item__subcategory__category__name', 'shop__name', 'shop__location',
+    ).order_by('id')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO products_search(rowid, item_name, description, subcategory, category, shop_name, shop_location) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            [[row[0], *(value or '' for value in row[1:])] for row in rows.iterator(chunk_size=2000)],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_offer_schedule_indexes'),
+        ('shop', '0004_alter_shop_address_alter_shop_location_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                "CREATE VIRTUAL TABLE products_search USING fts5("
+                "item_name, description, subcategory, category, shop_name, shop_location, "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            ),
+            reverse_sql='DROP TABLE products_search',
+        ),
+        migrations.RunSQL(
+            sql="INSERT INTO products_search(products_search, rank) VALUES ('rank', 'bm25(10.0, 1.0, 4.0, 2.0, 5.0, 1.0)')",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunPython(index_existing_shop_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_search_index'),
+        ('shop', '0004_alter_shop_address_alter_shop_location_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['name', 'id'], name='item_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopitem',
+            index=models.Index(fields=['shop', 'is_available', 'id'], name='shopitem_menu_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopitem',
+            index=models.Index(fields=['shop', 'effective_price'], name='shopitem_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopitem',
+            index=models.Index(condition=models.Q(('available_quantity__gt', 0)), fields=['shop', 'id'], name='shopitem_in_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopitem',
+            index=models.Index(condition=models.Q(('current_offer_pct__isnull', False)), fields=['shop', 'id'], name='shopitem_offer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(fields=['name', 'id'], name='subcategory_name_idx'),
+        ),
+    ]
@@ -1,4 +1,8 @@
+import zoneinfo
+from django.conf import settings
 from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
 from shop.models import Shop
 from decimal import Decimal, ROUND_HALF_UP
 
@@ -20,6 +24,9 @@ class SubCategory(models.Model):
 
     class Meta:
         unique_together = ('category', 'name')
+        indexes = [
+            models.Index(fields=["name", "id"], name="subcategory_name_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.category.name})"
@@ -42,6 +49,10 @@ class Item(models.Model):
 
     class Meta:
         unique_together = ('subcategory', 'name')
+        indexes = [
+            # Catalog lists are keyset-paginated over (name, id).
+            models.Index(fields=["name", "id"], name="item_name_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.subcategory.name}"
@@ -79,6 +90,53 @@ class ShopSubCategory(models.Model):
         return f"{self.subcategory.name} ({self.shop.name})"
 
 
+def shop_timezone():
+    """settings.SHOP_TIME_ZONE: the shops' wall clock, for item windows and report days and months."""
+    return zoneinfo.ZoneInfo(getattr(settings, "SHOP_TIME_ZONE", settings.TIME_ZONE))
+
+
+def shop_time(now=None):
+    """
+    The time of day at the shops for the instant ``now`` (default: now), in
+    settings.SHOP_TIME_ZONE, which is what item windows are written in.
+    """
+    return timezone.localtime(now, shop_timezone()).time()
+
+
+def window_contains(start, end, at):
+    """
+    Whether the time of day ``at`` falls in ``[start, end)``. A missing start
+    or end leaves that side open; ``start > end`` wraps past midnight
+    (22:00-02:00) and ``start == end`` means all day.
+    """
+    if start is None or end is None:
+        return (start is None or start <= at) and (end is None or at < end)
+    if start < end:
+        return start <= at < end
+    if start > end:
+        return at >= start or at < end
+    return True
+
+
+class ShopItemQuerySet(models.QuerySet):
+    def available_at(self, at=None):
+        """
+        Shop items whose ``available_from``/``available_till`` window contains
+        the time of day ``at`` (default: now, in shop time), with the rules of
+        window_contains, as one WHERE clause on the row's own columns.
+        """
+        at = at or shop_time()
+        end = F("available_till")
+        open_start = Q(available_from__isnull=True)
+        open_end = Q(available_till__isnull=True)
+        same_day = (open_start | open_end | Q(available_from__lt=end)) & (
+            open_start | Q(available_from__lte=at)
+        ) & (open_end | Q(available_till__gt=at))
+        overnight = Q(available_from__gt=end) & (Q(available_from__lte=at) | Q(available_till__gt=at))
+        all_day = Q(available_from=end)
+        return self.filter(same_day | overnight | all_day)
+
+
 # ✅ Added image + fallback
 class ShopItem(models.Model):
     shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="shopitems")
@@ -89,13 +147,36 @@ class ShopItem(models.Model):
     available_till = models.TimeField(null=True, blank=True)
     is_available = models.BooleanField(default=True)
     image = models.ImageField(upload_to='shopitem_images/', blank=True, null=True)
+    # Denormalized from the current offer by products.pricing, so price reads are column reads.
+    current_offer_pct = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False)
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+
+    objects = ShopItemQuerySet.as_manager()
 
     class Meta:
         unique_together = ('shop', 'item')
+        indexes = [
+            # Customer menus: keyset over id within a shop, plus one index per filter.
+            models.Index(fields=["shop", "is_available", "id"], name="shopitem_menu_idx"),
+            models.Index(fields=["shop", "effective_price"], name="shopitem_price_idx"),
+            models.Index(fields=["shop", "id"], condition=models.Q(available_quantity__gt=0), name="shopitem_in_stock_idx"),
+            models.Index(fields=["shop", "id"], condition=models.Q(current_offer_pct__isnull=False), name="shopitem_offer_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.effective_price = self.discounted_price(self.total_amount, self.current_offer_pct)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "total_amount" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "effective_price"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.item.name} @ {self.shop.name}"
 
+    def is_available_at(self, at=None):
+        """Python twin of ShopItemQuerySet.available_at, for rows already in memory."""
+        return window_contains(self.available_from, self.available_till, at or shop_time())
+
     @property
     def display_image(self):
         if self.image:
@@ -119,16 +200,32 @@ class ShopItem(models.Model):
 
     @property
     def active_offer(self):
-        return self.offers.filter(active=True).first()
+        """The offer currently applied: active and inside its window, lowest id first."""
+        return self.offers.current().first()
 
     def get_offer_price(self):
-        offer = self.active_offer
-        if offer:
-            discounted_price = (self.total_amount * (offer.offer_pct) / 100).quantize(
-                Decimal('0.01'), rounding=ROUND_HALF_UP
-            )
-            return self.total_amount - discounted_price
-        return self.total_amount
+        return self.effective_price
+
+    def price_with_offer(self, offer):
+        """Unit price after applying ``offer`` (an already-loaded ShopItemOffer or None)."""
+        return self.discounted_price(self.total_amount, offer.offer_pct if offer else None)
+
+    @staticmethod
+    def discounted_price(total_amount, offer_pct):
+        """``total_amount`` less ``offer_pct`` percent (None for no offer), rounded to the paisa."""
+        if offer_pct is None:
+            return total_amount
+        discounted_price = (total_amount * offer_pct / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return total_amount - discounted_price
+
+
+class ShopItemOfferQuerySet(models.QuerySet):
+    def current(self, now=None):
+        """Offers that apply right now: switched on and inside their start/end window."""
+        now = now or timezone.now()
+        return self.filter(
+            active=True, offer_starting_datetime__lte=now, offer_ending_datetime__gt=now
+        ).order_by("id")
 
 
 class ShopItemOffer(models.Model):
@@ -138,6 +235,17 @@ class ShopItemOffer(models.Model):
     offer_pct = models.DecimalField(max_digits=5, decimal_places=2)
     max_quantity = models.PositiveIntegerField(default=1)
     active = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ShopItemOfferQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # The offer scheduler reads upcoming boundaries and recent edits, never the whole table.
+            models.Index(fields=["offer_starting_datetime"], name="offer_start_idx"),
+            models.Index(fields=["offer_ending_datetime"], name="offer_end_idx"),
+            models.Index(fields=["updated_at", "id"], name="offer_updated_idx"),
+        ]
 
     def __str__(self):
         return f"Offer {self.offer_pct}% for {self.shop_item.item.name} in {self.shop_item.shop.name}"
@@ -0,0 +1,128 @@
+import heapq
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import ShopItemOffer
+from .pricing import refresh_prices
+
+START = "start"
+END = "end"
+
+# Edits are re-read this far back, so a transaction that commits a little after
+# its updated_at timestamp is not missed. Re-queued entries are harmless.
+POLL_OVERLAP = timedelta(seconds=30)
+
+
+class OfferScheduler:
+    """
+    Switches offers on at ``offer_starting_datetime`` and off at
+    ``offer_ending_datetime``.
+
+    Upcoming boundaries sit in a min-heap of ``(when, kind, offer_id)``, so
+    the next one is always at the top and waking up costs O(log n). New and
+    edited offers are picked up incrementally through the ``updated_at``
+    index; the offers table is never scanned as a whole after start-up, which
+    only reads offers that have not ended yet. Heap entries made stale by an
+    edit are dropped when they surface.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.windows = {}  # offer_id -> (start, end) the heap entries were made for
+        self.seen_until = None  # updated_at of the latest change picked up
+
+    def load(self, now=None):
+        """Catch up on boundaries missed while not running, then queue the upcoming ones."""
+        now = now or timezone.now()
+        self.seen_until = ShopItemOffer.objects.order_by("-updated_at").values_list("updated_at", flat=True).first()
+
+        stale = ShopItemOffer.objects.filter(active=True, offer_ending_datetime__lte=now)
+        due = ShopItemOffer.objects.filter(active=False, offer_starting_datetime__lte=now, offer_ending_datetime__gt=now)
+        self.apply(list(due.values_list("id", flat=True)), list(stale.values_list("id", flat=True)), now)
+
+        for offer_id, start, end in ShopItemOffer.objects.filter(offer_ending_datetime__gt=now).values_list(
+            "id", "offer_starting_datetime", "offer_ending_datetime"
+        ).iterator():
+            self.schedule(offer_id, start, end, now)
+
+    def schedule(self, offer_id, start, end, now):
+        if end <= now:
+            self.windows.pop(offer_id, None)
+            return
+        if self.windows.get(offer_id) == (start, end):
+            return
+        self.windows[offer_id] = (start, end)
+        if start > now:
+            heapq.heappush(self.heap, (start, START, offer_id))
+        if end > now:
+            heapq.heappush(self.heap, (end, END, offer_id))
+
+    def poll_changes(self, now=None):
+        """Queue the boundaries of offers created or edited since the last poll (uses the updated_at index)."""
+        now = now or timezone.now()
+        changes = ShopItemOffer.objects.order_by("updated_at", "id")
+        if self.seen_until:
+            changes = changes.filter(updated_at__gte=self.seen_until - POLL_OVERLAP)
+
+        due, ended = [], []
+        for offer_id, start, end, active, updated_at in changes.values_list(
+            "id", "offer_starting_datetime", "offer_ending_datetime", "active", "updated_at"
+        ).iterator():
+            self.seen_until = max(self.seen_until or updated_at, updated_at)
+            moved = self.windows.get(offer_id) != (start, end)
+            self.schedule(offer_id, start, end, now)
+            # A new offer, or a window moved across "now", has already passed a boundary.
+            # Toggling ``active`` by hand without touching the window is left alone.
+            if moved and start <= now < end and not active:
+                due.append(offer_id)
+            elif moved and end <= now and active:
+                ended.append(offer_id)
+        if due or ended:
+            self.apply(due, ended, now)
+
+    def next_boundary(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now=None):
+        """Pop every boundary that has been reached; returns (offer ids to start, offer ids to end)."""
+        now = now or timezone.now()
+        starting, ending = set(), set()
+        while self.heap and self.heap[0][0] <= now:
+            when, kind, offer_id = heapq.heappop(self.heap)
+            window = self.windows.get(offer_id)
+            # Drop entries for deleted offers or for a window that has since been edited.
+            if window is None or when != window[0 if kind == START else 1]:
+                continue
+            if kind == START:
+                starting.add(offer_id)
+            else:
+                ending.add(offer_id)
+                del self.windows[offer_id]
+        return list(starting - ending), list(ending)
+
+    def apply(self, starting, ending, now=None):
+        """
+        Flip ``active`` with one UPDATE per direction and re-derive the
+        affected shop items' prices. Returns the number of offers flipped.
+        """
+        if not starting and not ending:
+            return 0
+        now = now or timezone.now()
+        with transaction.atomic():
+            # Re-check the window in the UPDATE itself, so an edit made since the heap entry was queued wins.
+            started = ShopItemOffer.objects.filter(
+                id__in=starting, offer_starting_datetime__lte=now, offer_ending_datetime__gt=now
+            )
+            ended = ShopItemOffer.objects.filter(id__in=ending, offer_ending_datetime__lte=now)
+            # Prices move at a boundary even for offers that were already switched on by hand.
+            shop_item_ids = set(started.values_list("shop_item_id", flat=True)) | set(ended.values_list("shop_item_id", flat=True))
+            # .update() leaves updated_at alone, so these flips are not picked up again as edits.
+            changed = started.filter(active=False).update(active=True) + ended.filter(active=True).update(active=False)
+            if shop_item_ids:
+                refresh_prices(shop_item_ids, now)
+        return changed
+
+    def run_due(self, now=None):
+        now = now or timezone.now()
+        starting, ending = self.pop_due(now)
+        return self.apply(starting, ending, now)
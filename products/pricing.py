@@ -0,0 +1,47 @@
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from .menu_cache import invalidate_menus
+from .models import ShopItem, ShopItemOffer
+
+
+def current_offer_pct(now=None):
+    """Subquery for the percentage of a shop item's current offer (see ShopItemOfferQuerySet.current)."""
+    offers = ShopItemOffer.objects.current(now).filter(shop_item=OuterRef("pk"))
+    return Subquery(offers.values("offer_pct")[:1])
+
+
+def price_drift(items=None, now=None):
+    """
+    Shop items (of the ``items`` queryset, default all) whose stored
+    ``current_offer_pct`` / ``effective_price`` differ from what their offers
+    say at ``now``, read with one query. The returned items carry the expected
+    values, and the stored ones as ``stored_offer_pct`` / ``stored_price``.
+    """
+    items = ShopItem.objects.all() if items is None else items
+    items = items.annotate(expected_pct=current_offer_pct(now or timezone.now())).only(
+        "id", "shop_id", "total_amount", "current_offer_pct", "effective_price"
+    )
+
+    drifted = []
+    for shop_item in items.iterator(chunk_size=2000):
+        price = ShopItem.discounted_price(shop_item.total_amount, shop_item.expected_pct)
+        if shop_item.current_offer_pct != shop_item.expected_pct or shop_item.effective_price != price:
+            shop_item.stored_offer_pct, shop_item.stored_price = shop_item.current_offer_pct, shop_item.effective_price
+            shop_item.current_offer_pct = shop_item.expected_pct
+            shop_item.effective_price = price
+            drifted.append(shop_item)
+    return drifted
+
+
+def refresh_prices(shop_item_ids=None, now=None):
+    """
+    Bring the denormalized offer columns up to date, for ``shop_item_ids`` or
+    every shop item. Only rows that changed are written, in bulk, and only
+    their shops' menu snapshots are invalidated. Returns the number of rows
+    fixed.
+    """
+    items = None if shop_item_ids is None else ShopItem.objects.filter(id__in=shop_item_ids)
+    drifted = price_drift(items, now)
+    ShopItem.objects.bulk_update(drifted, ["current_offer_pct", "effective_price"], batch_size=500)
+    invalidate_menus({shop_item.shop_id for shop_item in drifted})
+    return len(drifted)
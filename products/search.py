@@ -0,0 +1,146 @@
+import re
+from django.db import connection
+from shop.models import Shop
+from .models import ShopItem
+
+SEARCH_TABLE = "products_search"
+
+# One FTS5 row per ShopItem (rowid = shop item id), so a hit is "this product in this shop".
+SEARCH_COLUMNS = ("item_name", "description", "subcategory", "category", "shop_name", "shop_location")
+
+# bm25 weights, in SEARCH_COLUMNS order: a name hit outranks a description hit.
+SEARCH_WEIGHTS = (10.0, 1.0, 4.0, 2.0, 5.0, 1.0)
+
+SEARCH_MAX_RESULTS = 1000
+
+INDEX_BATCH_SIZE = 500
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def create_table_sql(table=SEARCH_TABLE):
+    """
+    DDL of the search table. ``prefix='2 3'`` keeps 2- and 3-character prefix
+    indexes so ``bir*`` is an index lookup rather than a scan of the term list.
+    """
+    return (
+        f"CREATE VIRTUAL TABLE {table} USING fts5("
+        f"{', '.join(SEARCH_COLUMNS)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+
+
+def rank_config_sql(table=SEARCH_TABLE):
+    """Make ``ORDER BY rank`` use the weighted bm25, so it stays on FTS5's fast path."""
+    weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+    return f"INSERT INTO {table}({table}, rank) VALUES ('rank', 'bm25({weights})')"
+
+
+def match_expression(query):
+    """
+    The FTS5 MATCH string for free text typed by a user: every word must
+    match as a prefix (``chick bir`` -> ``"chick"* AND "bir"*``), so results
+    show up while typing. None when there is nothing to search.
+    """
+    tokens = _TOKEN.findall(query.lower())[:10]
+    if not tokens:
+        return None
+    # Only word characters survive, so quoting each token cannot break out of the expression.
+    return " AND ".join(f'"{token}"*' for token in tokens)
+
+
+# ---------------- Index maintenance ---------------- #
+
+def _documents(shop_items):
+    return shop_items.values_list(
+        "id",
+        "item__name",
+        "item__description",
+        "item__subcategory__name",
+        "item__subcategory__category__name",
+        "shop__name",
+        "shop__location",
+    ).order_by("id").iterator(chunk_size=2000)
+
+
+def _delete(cursor, shop_item_ids):
+    cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(shop_item_ids))})", shop_item_ids)
+
+
+def remove_shop_items(shop_item_ids):
+    shop_item_ids = list(shop_item_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(shop_item_ids), INDEX_BATCH_SIZE):
+            _delete(cursor, shop_item_ids[start:start + INDEX_BATCH_SIZE])
+
+
+def index_shop_items(shop_items):
+    """(Re)write the search rows of the ``shop_items`` queryset. Returns the number of rows written."""
+    insert = (
+        f"INSERT INTO {SEARCH_TABLE}(rowid, {', '.join(SEARCH_COLUMNS)}) "
+        f"VALUES (%s{', %s' * len(SEARCH_COLUMNS)})"
+    )
+    written = 0
+    batch = []
+    with connection.cursor() as cursor:
+        for row in _documents(shop_items):
+            batch.append([row[0], *(value or "" for value in row[1:])])
+            if len(batch) == INDEX_BATCH_SIZE:
+                written += _write(cursor, insert, batch)
+                batch = []
+        if batch:
+            written += _write(cursor, insert, batch)
+    return written
+
+
+def _write(cursor, insert, batch):
+    _delete(cursor, [row[0] for row in batch])
+    cursor.executemany(insert, batch)
+    return len(batch)
+
+
+def rebuild_index():
+    """Drop every search row and index all shop items again, then merge the FTS segments."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    written = index_shop_items(ShopItem.objects.all())
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return written
+
+
+# ---------------- Queries ---------------- #
+
+def search(query, shop_id=None, pincode=None, in_stock=False, limit=20, offset=0):
+    """
+    Ids of shop items matching ``query``, best first, as ``(shop_item_id, score)``.
+
+    Only items listed on menus (``is_available``) of active shops are
+    returned. Filters are applied in the same statement as the MATCH, so a
+    page is one query however many documents match.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+
+    conditions = [f"{SEARCH_TABLE} MATCH %s", "si.is_available", "sh.is_active"]
+    params = [expression]
+    if shop_id is not None:
+        conditions.append("si.shop_id = %s")
+        params.append(shop_id)
+    if pincode:
+        conditions.append("sh.pincode = %s")
+        params.append(pincode)
+    if in_stock:
+        conditions.append("si.available_quantity > 0")
+
+    sql = (
+        f"SELECT {SEARCH_TABLE}.rowid, {SEARCH_TABLE}.rank FROM {SEARCH_TABLE} "
+        f"JOIN {ShopItem._meta.db_table} si ON si.id = {SEARCH_TABLE}.rowid "
+        f"JOIN {Shop._meta.db_table} sh ON sh.id = si.shop_id "
+        f"WHERE {' AND '.join(conditions)} "
+        f"ORDER BY {SEARCH_TABLE}.rank, {SEARCH_TABLE}.rowid LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, limit, offset])
+        # bm25 is negative, lower is better; flip it so clients see "higher is better".
+        return [(shop_item_id, round(-rank, 4)) for shop_item_id, rank in cursor.fetchall()]
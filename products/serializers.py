@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from django.utils import timezone
 from .models import (
     HSN, Category, SubCategory, Item,
     ShopSubCategory, ShopItem, ShopItemOffer
@@ -89,7 +88,7 @@ class ShopItemSerializer(serializers.ModelSerializer):
 
     def get_discount_amount(self, obj):
         """Return the offer price for UI highlighting (single-unit)."""
-        return obj.get_offer_price()
+        return obj.effective_price
 
     def get_display_image(self, obj):
         request = self.context.get("request")
@@ -132,15 +131,10 @@ class CustomerShopItemSerializer(serializers.ModelSerializer):
         ]
 
     def get_offer_pct(self, obj):
-        now = timezone.now()
-        offer = obj.offers.filter(
-            offer_starting_datetime__lte=now,
-            offer_ending_datetime__gte=now
-        ).first()
-        return offer.offer_pct if offer else None
+        return obj.current_offer_pct
 
     def get_discount_amount(self, obj):
-        return obj.get_offer_price()
+        return obj.effective_price
 
     def get_display_image(self, obj):
         request = self.context.get("request")
@@ -151,6 +145,21 @@ class CustomerShopItemSerializer(serializers.ModelSerializer):
         return None
 
 
+class MenuShopItemSerializer(CustomerShopItemSerializer):
+    """
+    CustomerShopItemSerializer for the cached menu snapshot: stock is reduced
+    to ``in_stock``, so orders only change the menu when an item runs out or
+    comes back.
+    """
+    in_stock = serializers.SerializerMethodField()
+
+    class Meta(CustomerShopItemSerializer.Meta):
+        fields = [field if field != 'available_quantity' else 'in_stock' for field in CustomerShopItemSerializer.Meta.fields]
+
+    def get_in_stock(self, obj):
+        return obj.available_quantity > 0
+
+
 class AvailableSubCategorySerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source="subcategory.id")
     name = serializers.CharField(source="subcategory.name")
@@ -0,0 +1,132 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from jobs.queue import enqueue
+from shop.models import Shop
+from .autocomplete import ITEM, SHOP, autocomplete
+from .menu_cache import invalidate_menus
+from .models import HSN, Category, Item, ShopItem, ShopItemOffer, SubCategory
+from .pricing import refresh_prices
+from .search import index_shop_items, remove_shop_items
+
+
+@receiver(post_save, sender=ShopItemOffer)
+@receiver(post_delete, sender=ShopItemOffer)
+def reprice_shop_item(sender, instance, **kwargs):
+    """Re-derive the shop item's offer columns (window boundaries are handled by products.offer_scheduler)."""
+    # Offers deleted along with their shop item leave nothing to reprice.
+    if isinstance(kwargs.get("origin"), ShopItem):
+        return
+    # refresh_prices invalidates the shop's menu when the price actually moved.
+    refresh_prices([instance.shop_item_id])
+
+
+# ---------------- MENU SNAPSHOTS ---------------- #
+
+@receiver(post_save, sender=ShopItem)
+@receiver(post_delete, sender=ShopItem)
+def invalidate_shop_item_menu(sender, instance, **kwargs):
+    invalidate_menus([instance.shop_id])
+
+
+@receiver(post_save, sender=Item)
+def invalidate_item_menus(sender, instance, **kwargs):
+    # Deleting an Item cascades to its ShopItems, whose own signals cover it.
+    invalidate_menus(ShopItem.objects.filter(item=instance).values_list("shop_id", flat=True).distinct())
+
+
+@receiver(post_save, sender=HSN)
+@receiver(pre_delete, sender=HSN)
+def invalidate_hsn_menus(sender, instance, **kwargs):
+    # pre_delete: once deleted, the items' hsn is already nulled and they can no longer be found.
+    invalidate_menus(ShopItem.objects.filter(item__hsn=instance).values_list("shop_id", flat=True).distinct())
+
+
+@receiver(post_save, sender=Shop)
+def invalidate_shop_menu(sender, instance, **kwargs):
+    # The menu carries the shop name.
+    invalidate_menus([instance.id])
+
+
+# ---------------- SEARCH INDEX ---------------- #
+
+@receiver(post_save, sender=ShopItem)
+def index_shop_item(sender, instance, **kwargs):
+    index_shop_items(ShopItem.objects.filter(id=instance.id))
+
+
+@receiver(post_delete, sender=ShopItem)
+def unindex_shop_item(sender, instance, **kwargs):
+    remove_shop_items([instance.id])
+
+
+@receiver(post_save, sender=Item)
+def index_item(sender, instance, created, **kwargs):
+    if not created:
+        index_shop_items(ShopItem.objects.filter(item=instance))
+
+
+# Only these fields reach the search rows; other edits (contact details, opening, images) need no reindex.
+SEARCH_FIELDS = {Shop: ("name", "location"), SubCategory: ("name",), Category: ("name",)}
+
+
+@receiver(pre_save, sender=Shop)
+@receiver(pre_save, sender=SubCategory)
+@receiver(pre_save, sender=Category)
+def note_search_fields_change(sender, instance, update_fields=None, **kwargs):
+    fields = SEARCH_FIELDS[sender]
+    instance._search_fields_changed = False
+    if instance.pk is None or (update_fields is not None and not set(fields) & set(update_fields)):
+        return
+    stored = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    instance._search_fields_changed = stored is not None and stored != tuple(getattr(instance, field) for field in fields)
+
+
+# A shop or category rename can touch thousands of rows, so those are reindexed off the request path.
+@receiver(post_save, sender=Shop)
+def reindex_shop(sender, instance, created, **kwargs):
+    if not created and instance._search_fields_changed:
+        enqueue("products.reindex_search", {"shop_id": instance.id})
+
+
+@receiver(post_save, sender=SubCategory)
+def reindex_subcategory(sender, instance, created, **kwargs):
+    if not created and instance._search_fields_changed:
+        enqueue("products.reindex_search", {"subcategory_id": instance.id})
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, **kwargs):
+    if not created and instance._search_fields_changed:
+        enqueue("products.reindex_search", {"category_id": instance.id})
+
+
+# ---------------- AUTOCOMPLETE ---------------- #
+
+@receiver(post_save, sender=ShopItem)
+@receiver(post_delete, sender=ShopItem)
+def refresh_shop_item_completion(sender, instance, **kwargs):
+    # Whether the item is on any menu may have changed.
+    autocomplete.refresh_items([instance.item_id])
+
+
+@receiver(post_save, sender=Item)
+def refresh_item_completion(sender, instance, **kwargs):
+    autocomplete.refresh_items([instance.id])
+
+
+@receiver(post_delete, sender=Item)
+def remove_item_completion(sender, instance, **kwargs):
+    autocomplete.remove(ITEM, instance.id)
+
+
+@receiver(post_save, sender=Shop)
+def refresh_shop_completion(sender, instance, created, **kwargs):
+    autocomplete.refresh_shop(instance)
+    if not created:
+        # Opening or closing a shop adds or drops the items only it sells.
+        autocomplete.refresh_items(ShopItem.objects.filter(shop=instance).values_list("item_id", flat=True))
+
+
+@receiver(post_delete, sender=Shop)
+def remove_shop_completion(sender, instance, **kwargs):
+    autocomplete.remove(SHOP, instance.id)
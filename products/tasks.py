@@ -0,0 +1,42 @@
+from jobs.queue import task
+from .models import Item, ShopCategory, ShopItem, ShopSubCategory
+from .search import index_shop_items
+
+
+@task("products.sync_shop_categories")
+def sync_shop_categories(shop_id, item_ids):
+    """Make sure the shop lists the subcategories and categories of ``item_ids``."""
+    pairs = set(
+        Item.objects.filter(id__in=item_ids, subcategory__isnull=False)
+        .values_list("subcategory_id", "subcategory__category_id")
+    )
+    add_shop_categories(shop_id, pairs)
+
+
+def add_shop_categories(shop_id, pairs):
+    """Add the missing ShopSubCategory/ShopCategory rows for ``pairs`` of (subcategory_id, category_id)."""
+    subcategory_ids = {subcategory_id for subcategory_id, _ in pairs}
+    category_ids = {category_id for _, category_id in pairs if category_id}
+
+    existing = set(ShopSubCategory.objects.filter(shop_id=shop_id, subcategory_id__in=subcategory_ids).values_list("subcategory_id", flat=True))
+    ShopSubCategory.objects.bulk_create([
+        ShopSubCategory(shop_id=shop_id, subcategory_id=subcategory_id) for subcategory_id in subcategory_ids - existing
+    ])
+
+    existing = set(ShopCategory.objects.filter(shop_id=shop_id, category_id__in=category_ids).values_list("category_id", flat=True))
+    ShopCategory.objects.bulk_create([
+        ShopCategory(shop_id=shop_id, category_id=category_id) for category_id in category_ids - existing
+    ])
+
+
+@task("products.reindex_search")
+def reindex_search(shop_id=None, subcategory_id=None, category_id=None):
+    """Rewrite the search rows under a renamed shop, subcategory or category."""
+    shop_items = ShopItem.objects.all()
+    if shop_id is not None:
+        shop_items = shop_items.filter(shop_id=shop_id)
+    if subcategory_id is not None:
+        shop_items = shop_items.filter(item__subcategory_id=subcategory_id)
+    if category_id is not None:
+        shop_items = shop_items.filter(item__subcategory__category_id=category_id)
+    index_shop_items(shop_items)
@@ -1,3 +1,735 @@
-from django.test import TestCase
+import random
+import tempfile
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+from decimal import Decimal
+from io import BytesIO, StringIO
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from jobs.models import Job
+from jobs.queue import claim_jobs, run_job
+from orders.checkout import place_order
+from orders.models import Cart
+from shop.models import Shop
+from user.models import User
+from .autocomplete import ITEM, KINDS, SHOP, PrefixIndex, autocomplete, normalize, word_keys
+from .catalog_import import IMPORT_CHUNK_SIZE, CatalogImportError, import_catalog
+from .inventory import release_stock, reserve_stock
+from .menu_cache import menu_version
+from .models import Category, HSN, Item, ShopCategory, ShopItem, ShopItemOffer, ShopSubCategory, SubCategory, shop_time
+from .offer_scheduler import OfferScheduler
+from .pricing import price_drift, refresh_prices
+from .search import match_expression, rebuild_index, search
 
-# Create your tests here.
+
+class ProductTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner", role="shopadmin")
+        self.shop = Shop.objects.create(name="Shop", owner=self.owner, gst_number="GST1", contact_number="1")
+        self.subcategory = SubCategory.objects.create(category=Category.objects.create(name="Food"), name="Meals")
+        self.hsn = HSN.objects.create(hsncode="1001", gst=Decimal("5.00"))
+        self.shop_items = [self.add_item(f"Item {n}", Decimal("100.00") + n) for n in range(3)]
+        self.now = timezone.now()
+
+    def add_item(self, name, price, shop=None, quantity=10):
+        item = Item.objects.create(subcategory=self.subcategory, name=name, hsn=self.hsn)
+        return ShopItem.objects.create(shop=shop or self.shop, item=item, total_amount=price, available_quantity=quantity)
+
+    def offer(self, shop_item, pct, starts=-1, ends=1, active=True):
+        """An offer of ``pct`` percent running from ``starts`` to ``ends`` hours from now."""
+        return ShopItemOffer.objects.create(
+            shop_item=shop_item, offer_pct=Decimal(pct), active=active,
+            offer_starting_datetime=self.now + timedelta(hours=starts),
+            offer_ending_datetime=self.now + timedelta(hours=ends),
+        )
+
+    def reload(self, instance):
+        return type(instance).objects.get(pk=instance.pk)
+
+
+class OfferPricingTests(ProductTestCase):
+    def test_offer_changes_reprice_the_shop_item(self):
+        shop_item = self.shop_items[0]
+        offer = self.offer(shop_item, "10")
+        shop_item = self.reload(shop_item)
+        self.assertEqual((shop_item.current_offer_pct, shop_item.effective_price), (Decimal("10.00"), Decimal("90.00")))
+
+        offer.active = False
+        offer.save()
+        self.assertEqual(self.reload(shop_item).effective_price, Decimal("100.00"))
+
+        offer.active = True
+        offer.save()
+        offer.delete()
+        shop_item = self.reload(shop_item)
+        self.assertEqual((shop_item.current_offer_pct, shop_item.effective_price), (None, Decimal("100.00")))
+
+    def test_price_change_keeps_the_offer(self):
+        shop_item = self.shop_items[1]
+        self.offer(shop_item, "25")
+        shop_item = self.reload(shop_item)
+        shop_item.total_amount = Decimal("200.00")
+        shop_item.save(update_fields=["total_amount"])
+
+        self.assertEqual(self.reload(shop_item).effective_price, Decimal("150.00"))
+
+    def test_future_offer_applies_once_its_window_opens(self):
+        shop_item = self.shop_items[1]
+        self.offer(shop_item, "50", starts=1, ends=2)
+        self.assertEqual(self.reload(shop_item).effective_price, Decimal("101.00"))
+
+        self.assertEqual(refresh_prices(now=self.now + timedelta(minutes=61)), 1)
+        self.assertEqual(self.reload(shop_item).effective_price, Decimal("50.50"))
+        self.assertEqual(refresh_prices(now=self.now + timedelta(minutes=61)), 0)
+
+    def test_price_drift_reports_stored_and_expected_values(self):
+        self.offer(self.shop_items[0], "10")
+        ShopItem.objects.filter(pk=self.shop_items[0].pk).update(effective_price=Decimal("1.00"))
+        ShopItem.objects.filter(pk=self.shop_items[2].pk).update(current_offer_pct=Decimal("5.00"))
+
+        with self.assertNumQueries(1):
+            drifted = {shop_item.id: shop_item for shop_item in price_drift()}
+
+        self.assertEqual(set(drifted), {self.shop_items[0].id, self.shop_items[2].id})
+        first = drifted[self.shop_items[0].id]
+        self.assertEqual((first.stored_price, first.effective_price), (Decimal("1.00"), Decimal("90.00")))
+        third = drifted[self.shop_items[2].id]
+        self.assertEqual((third.stored_offer_pct, third.current_offer_pct), (Decimal("5.00"), None))
+
+        self.assertEqual(refresh_prices([self.shop_items[0].id]), 1)
+        self.assertEqual([shop_item.id for shop_item in price_drift()], [self.shop_items[2].id])
+
+    def test_check_offer_prices_command(self):
+        ShopItem.objects.filter(pk=self.shop_items[0].pk).update(effective_price=Decimal("1.00"))
+
+        with self.assertRaises(CommandError):
+            call_command("check_offer_prices", stdout=StringIO())
+        out = StringIO()
+        call_command("check_offer_prices", "--fix", stdout=out)
+
+        self.assertIn("Fixed 1 shop items.", out.getvalue())
+        self.assertEqual(self.reload(self.shop_items[0]).effective_price, Decimal("100.00"))
+        call_command("check_offer_prices", stdout=StringIO())
+
+
+class OfferSchedulerTests(ProductTestCase):
+    def at(self, minutes):
+        return self.now + timedelta(minutes=minutes)
+
+    def test_load_ends_stale_offers_and_queues_upcoming_ones(self):
+        stale = self.offer(self.shop_items[2], "5", starts=-3, ends=-1)
+        upcoming = self.offer(self.shop_items[1], "50", starts=1, ends=2, active=False)
+        scheduler = OfferScheduler()
+
+        scheduler.load(self.now)
+
+        self.assertFalse(self.reload(stale).active)
+        self.assertEqual(scheduler.next_boundary(), upcoming.offer_starting_datetime)
+
+    def test_boundaries_flip_offers_and_reprice(self):
+        shop_item = self.shop_items[1]
+        offer = self.offer(shop_item, "50", starts=1, ends=2, active=False)
+        scheduler = OfferScheduler()
+        scheduler.load(self.now)
+
+        self.assertEqual(scheduler.run_due(self.at(30)), 0)
+        self.assertEqual(scheduler.run_due(self.at(60)), 1)
+        self.assertTrue(self.reload(offer).active)
+        self.assertEqual(self.reload(shop_item).effective_price, Decimal("50.50"))
+
+        self.assertEqual(scheduler.run_due(self.at(120)), 1)
+        self.assertFalse(self.reload(offer).active)
+        self.assertEqual(self.reload(shop_item).effective_price, Decimal("101.00"))
+        self.assertIsNone(scheduler.next_boundary())
+
+    def test_edited_window_replaces_the_queued_boundary(self):
+        offer = self.offer(self.shop_items[1], "50", starts=-1, ends=1)
+        scheduler = OfferScheduler()
+        scheduler.load(self.now)
+
+        offer.offer_ending_datetime = self.at(180)
+        offer.save()
+        scheduler.poll_changes(self.now)
+
+        self.assertEqual(scheduler.run_due(self.at(61)), 0)
+        self.assertTrue(self.reload(offer).active)
+        self.assertEqual(scheduler.run_due(self.at(181)), 1)
+        self.assertFalse(self.reload(offer).active)
+
+    def test_poll_activates_new_offers_and_respects_manual_toggles(self):
+        scheduler = OfferScheduler()
+        scheduler.load(self.now)
+        offer = self.offer(self.shop_items[0], "10", starts=-1, ends=24, active=False)
+
+        scheduler.poll_changes(self.now)
+        self.assertTrue(self.reload(offer).active)
+
+        offer = self.reload(offer)
+        offer.active = False
+        offer.save()
+        scheduler.poll_changes(self.now)
+        self.assertFalse(self.reload(offer).active)
+
+    def test_deleted_offer_is_skipped(self):
+        offer = self.offer(self.shop_items[0], "10", starts=1, ends=2, active=False)
+        scheduler = OfferScheduler()
+        scheduler.load(self.now)
+        offer.delete()
+
+        self.assertEqual(scheduler.run_due(self.at(120)), 0)
+
+
+class MenuSnapshotTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.url = f"/api/products/shops/{self.shop.id}/items/"
+        self.etag = self.client.get(self.url)["ETag"]
+
+    def revalidate(self):
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+
+    def assertUnchanged(self):
+        self.assertEqual(self.revalidate().status_code, 304)
+
+    def assertChanged(self):
+        response = self.revalidate()
+        self.assertEqual(response.status_code, 200)
+        self.etag = response["ETag"]
+        return {line["id"]: line for line in response.json()["results"]}
+
+    def test_matching_etag_gets_304_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertUnchanged()
+            cached = self.client.get(self.url)
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/{self.etag}, "other"').status_code, 304)
+
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached["Cache-Control"], "no-cache")
+        self.assertEqual(len(cached.json()["results"]), 3)
+
+    def test_stock_shows_as_in_stock_only(self):
+        line = self.client.get(self.url).json()["results"][0]
+
+        self.assertIs(line["in_stock"], True)
+        self.assertNotIn("available_quantity", line)
+
+    def test_orders_change_the_menu_only_when_stock_crosses_zero(self):
+        shop_item = self.shop_items[0]
+
+        reserve_stock({shop_item.id: 4})
+        self.assertUnchanged()
+        release_stock({shop_item.id: 2})
+        self.assertUnchanged()
+
+        reserve_stock({shop_item.id: 8})
+        self.assertIs(self.assertChanged()[shop_item.id]["in_stock"], False)
+        release_stock({shop_item.id: 1})
+        self.assertIs(self.assertChanged()[shop_item.id]["in_stock"], True)
+
+    def test_catalogue_edits_change_the_menu(self):
+        shop_item = self.shop_items[1]
+
+        self.offer(shop_item, "50")
+        self.assertEqual(Decimal(str(self.assertChanged()[shop_item.id]["discount_amount"])), Decimal("50.50"))
+        self.reload(shop_item).save()
+        self.assertChanged()
+        self.hsn.save()
+        self.assertChanged()
+        self.shop.name = "Renamed"
+        self.shop.save()
+        self.assertEqual(self.assertChanged()[shop_item.id]["shop_name"], "Renamed")
+
+    def test_other_shops_keep_their_menu(self):
+        other = Shop.objects.create(name="Other", owner=self.owner, gst_number="GST2", contact_number="1")
+        other_item = self.add_item("Other item", Decimal("50.00"), shop=other, quantity=1)
+        self.etag = self.client.get(self.url)["ETag"]
+
+        reserve_stock({other_item.id: 1})
+        self.assertUnchanged()
+
+
+class SearchTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        for shop_item, (name, description) in zip(self.shop_items, [
+            ("Chicken Biryani", "Malabar dum"), ("Chicken Fried Rice", ""), ("Mutton Biryani", "Biryani rice"),
+        ]):
+            Item.objects.filter(pk=shop_item.item_id).update(name=name, description=description)
+            self.reload(shop_item.item).save()
+
+    def ids(self, query, **filters):
+        return [shop_item_id for shop_item_id, _ in search(query, **filters)]
+
+    def reindex_jobs(self):
+        return Job.objects.filter(task="products.reindex_search")
+
+    def run_reindex_jobs(self):
+        for job in claim_jobs("tests", limit=100):
+            run_job(job)
+
+    def test_every_word_matches_as_a_prefix(self):
+        self.assertEqual(match_expression('chick bir!! "x'), '"chick"* AND "bir"* AND "x"*')
+        self.assertEqual(self.ids("chick bir"), [self.shop_items[0].id])
+        self.assertCountEqual(self.ids("biryani"), [self.shop_items[0].id, self.shop_items[2].id])
+        self.assertEqual(self.ids("malab"), [self.shop_items[0].id])
+        self.assertEqual(self.ids('"); DROP'), [])
+        self.assertIsNone(match_expression("!!"))
+
+    def test_name_hits_outrank_description_hits(self):
+        mutton = self.shop_items[2]
+        Item.objects.filter(pk=mutton.item_id).update(name="Mutton Curry", description="Rice and biryani masala")
+        self.reload(mutton.item).save()
+        # bm25 needs the term to be rare in the corpus to score above zero.
+        for n in range(6):
+            self.add_item(f"Snack {n}", Decimal("20.00"))
+
+        hits = search("biryani")
+        self.assertEqual([shop_item_id for shop_item_id, _ in hits], [self.shop_items[0].id, mutton.id])
+        self.assertGreater(hits[0][1], hits[1][1])
+
+    def test_filters(self):
+        other = Shop.objects.create(
+            name="Paragon", owner=self.owner, gst_number="GST2", contact_number="2", pincode="673001", location="Kozhikode",
+        )
+        sold_out = ShopItem.objects.create(shop=other, item=self.shop_items[0].item, total_amount=Decimal("150.00"))
+
+        self.assertCountEqual(self.ids("chicken biryani"), [self.shop_items[0].id, sold_out.id])
+        self.assertEqual(self.ids("chicken biryani", pincode="673001"), [sold_out.id])
+        self.assertEqual(self.ids("chicken biryani", in_stock=True), [self.shop_items[0].id])
+        self.assertEqual(self.ids("biryani", shop_id=other.id), [sold_out.id])
+        self.assertEqual(self.ids("kozhik"), [sold_out.id])
+
+        ShopItem.objects.filter(pk=self.shop_items[0].pk).update(is_available=False)
+        Shop.objects.filter(pk=other.pk).update(is_active=False)
+        self.assertEqual(self.ids("chicken biryani"), [])
+
+    def test_renames_are_reindexed_by_a_job(self):
+        self.shop.name = "Rahmath"
+        self.shop.save()
+        self.subcategory.category.name = "Kerala"
+        self.subcategory.category.save()
+        self.assertEqual(self.ids("rahmath"), [])
+
+        self.run_reindex_jobs()
+
+        self.assertEqual(len(self.ids("rahmath")), 3)
+        self.assertEqual(len(self.ids("kerala")), 3)
+
+    def test_unrelated_shop_edits_queue_no_reindex(self):
+        self.shop.contact_number = "99"
+        self.shop.save()
+        self.shop.is_active = False
+        self.shop.save(update_fields=["is_active"])
+        self.subcategory.save()
+        self.assertFalse(self.reindex_jobs().exists())
+
+        self.shop.location = "Kozhikode"
+        self.shop.save()
+        self.assertEqual(self.reindex_jobs().count(), 1)
+
+    def test_shop_item_changes_update_the_index(self):
+        shop_item = self.shop_items[1]
+        Item.objects.filter(pk=shop_item.item_id).update(name="Ghee Rice")
+        self.reload(shop_item.item).save()
+        self.assertEqual(self.ids("ghee"), [shop_item.id])
+        self.assertEqual(self.ids("fried"), [])
+
+        shop_item.delete()
+        self.assertEqual(self.ids("ghee"), [])
+        self.assertEqual(rebuild_index(), 2)
+        self.assertCountEqual(self.ids("biryani"), [self.shop_items[0].id, self.shop_items[2].id])
+
+    def test_search_view_pages(self):
+        client = APIClient()
+        response = client.get("/api/products/search/", {"q": "bi", "page_size": 1})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()["results"]), 1)
+        second = client.get(response.json()["next"]).json()
+        self.assertEqual(len(second["results"]), 1)
+        self.assertIsNotNone(second["previous"])
+        self.assertEqual(client.get("/api/products/search/").status_code, 400)
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def brute_force(self, index, prefix, kind=None, k=8):
+        matches = [
+            (entry, name, weight) for entry, (name, weight, _) in index._entries.items()
+            if kind in (None, entry[0]) and any(word.startswith(prefix) for word in normalize(name).split())
+        ]
+        matches.sort(key=lambda match: (-match[2], match[1], match[0]))
+        return [entry for entry, _, _ in matches[:k]]
+
+    def assertMatchesBruteForce(self, index, prefixes):
+        for prefix in prefixes:
+            for kind in (None, ITEM, SHOP):
+                got = [(entry_kind, entry_id) for entry_kind, entry_id, _, _ in index.complete(prefix, kind=kind)]
+                self.assertEqual(got, self.brute_force(index, prefix, kind), (prefix, kind))
+
+    def test_normalize_and_word_keys(self):
+        self.assertEqual(normalize("  Café-Bar_Crème!! "), "cafe bar creme")
+        self.assertEqual(word_keys("Chicken  Biryani (Full)"), ["chicken biryani full", "biryani full", "full"])
+
+    def test_any_word_can_be_typed_first(self):
+        index = PrefixIndex()
+        index.build([(ITEM, 1, "Chicken Biryani", 3), (ITEM, 2, "Mutton Biryani", 5), (SHOP, 1, "Biryani House", 1)])
+
+        self.assertEqual([name for _, _, name, _ in index.complete("BIR")], ["Mutton Biryani", "Chicken Biryani", "Biryani House"])
+        self.assertEqual([name for _, _, name, _ in index.complete("bir", kind=SHOP)], ["Biryani House"])
+        self.assertEqual([name for _, _, name, _ in index.complete("biryani h")], ["Biryani House"])
+        self.assertEqual(index.complete("bir", k=1)[0][1:], (2, "Mutton Biryani", 5))
+        self.assertEqual(index.complete("  "), [])
+
+    def test_cached_prefixes_stay_correct_through_writes(self):
+        rng = random.Random(7)
+        words = ["".join(rng.choice("abcdef") for _ in range(rng.randint(3, 6))) for _ in range(60)]
+        index = PrefixIndex()
+        index.build(
+            [(ITEM, n, " ".join(rng.sample(words, 2)), rng.randint(0, 50)) for n in range(1500)]
+            + [(SHOP, n, rng.choice(words), rng.randint(0, 50)) for n in range(300)]
+        )
+        index.warm()
+        prefixes = ["a", "b", "f", "ab", "ca", "de", *(word[:3] for word in words[:10])]
+        self.assertTrue(index._top)
+        self.assertMatchesBruteForce(index, prefixes)
+
+        for _ in range(300):
+            entry_id = rng.randrange(1500)
+            action = rng.randrange(5)
+            if action == 0:
+                index.upsert(ITEM, entry_id, " ".join(rng.sample(words, 2)))
+            elif action == 1:
+                index.remove(ITEM, entry_id)
+            elif action == 2:
+                index.upsert(ITEM, 2000 + entry_id, rng.choice(words), rng.randint(0, 80))
+            else:
+                index.add_weight(rng.choice(KINDS), entry_id, rng.randint(-30, 60))
+
+        self.assertMatchesBruteForce(index, prefixes)
+
+
+class AutocompleteTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        for shop_item, name in zip(self.shop_items, ["Chicken Biryani", "Chicken Fried Rice", "Mutton Biryani"]):
+            Item.objects.filter(pk=shop_item.item_id).update(name=name)
+        Item.objects.create(subcategory=self.subcategory, name="Chilli Unlisted")
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        # The index lives in the process; start each test from the database.
+        autocomplete.index = PrefixIndex()
+        autocomplete._loaded = False
+        self.addCleanup(setattr, autocomplete, "_loaded", False)
+
+    def names(self, prefix, **kwargs):
+        return [name for _, _, name, _ in autocomplete.complete(prefix, **kwargs)]
+
+    def order(self, shop_item):
+        Cart.objects.create(customer=self.customer, shop_item=shop_item, quantity=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.customer)
+
+    def test_suggestions_are_ranked_by_orders_without_queries(self):
+        self.order(self.shop_items[2])
+        client = APIClient()
+
+        response = client.get("/api/products/autocomplete/", {"q": "bir"})
+        self.assertEqual([s["name"] for s in response.json()["suggestions"]], ["Mutton Biryani", "Chicken Biryani"])
+        with self.assertNumQueries(0):
+            response = client.get("/api/products/autocomplete/", {"q": "chi"}, HTTP_AUTHORIZATION="Bearer junk")
+        self.assertEqual([s["name"] for s in response.json()["suggestions"]], ["Chicken Biryani", "Chicken Fried Rice"])
+
+        self.order(self.shop_items[1])
+        self.order(self.shop_items[1])
+        self.assertEqual(self.names("chi")[0], "Chicken Fried Rice")
+        self.assertEqual(client.get("/api/products/autocomplete/", {"q": "x", "type": "bad"}).status_code, 400)
+
+    def test_catalogue_changes_reach_the_index(self):
+        self.assertEqual(self.names("sh", kind=SHOP), ["Shop"])
+
+        self.shop_items[1].delete()
+        self.assertEqual(self.names("chi"), ["Chicken Biryani"])
+
+        self.shop.name = "Sagar Hotel"
+        self.shop.save()
+        self.assertEqual(self.names("hot"), ["Sagar Hotel"])
+
+        self.shop.is_active = False
+        self.shop.save()
+        self.assertEqual(self.names("hot"), [])
+        self.assertEqual(self.names("bir"), [])
+
+
+class CatalogListTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.shop_items += [self.add_item(f"Dish {n}", Decimal("110.00") + n) for n in range(9)]
+        ShopItem.objects.filter(id__in=[shop_item.id for shop_item in self.shop_items[:2]]).update(available_quantity=0)
+        for shop_item in self.shop_items[::4]:
+            self.offer(shop_item, "10")
+        self.client = APIClient()
+        self.url = f"/api/products/shops/{self.shop.id}/items/"
+
+    def menu_ids(self, **params):
+        response = self.client.get(self.url, {"page_size": 100, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [line["id"] for line in response.json()["results"]]
+
+    def walk(self, url, params):
+        page = self.client.get(url, params).json()
+        rows = page["results"]
+        while page["next"]:
+            page = self.client.get(page["next"]).json()
+            rows += page["results"]
+        return rows
+
+    def test_menu_pages_cover_every_item_in_id_order(self):
+        rows = self.walk(self.url, {"page_size": 5})
+        self.assertEqual([line["id"] for line in rows], sorted(shop_item.id for shop_item in self.shop_items))
+        self.assertEqual(self.client.get(self.url, {"cursor": "zzz"}).status_code, 404)
+
+    def test_menu_filters(self):
+        by_id = {shop_item.id: self.reload(shop_item) for shop_item in self.shop_items}
+
+        self.assertEqual(self.menu_ids(offer_only="true"), [shop_item.id for shop_item in self.shop_items[::4]])
+        self.assertEqual(self.menu_ids(in_stock="1"), [shop_item.id for shop_item in self.shop_items[2:]])
+        self.assertEqual(
+            self.menu_ids(min_price="100", max_price="111"),
+            [shop_item_id for shop_item_id, shop_item in by_id.items() if 100 <= shop_item.effective_price <= 111],
+        )
+        self.assertEqual(len(self.menu_ids(category=self.subcategory.category_id, subcategory=self.subcategory.id)), 12)
+        self.assertEqual(self.menu_ids(category=Category.objects.create(name="Drinks").id), [])
+        for params in ({"min_price": "abc"}, {"max_price": "NaN"}, {"min_price": "-1"}, {"category": "x"}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+    def test_unknown_params_share_the_snapshot(self):
+        first = self.client.get(self.url, {"page_size": 5, "in_stock": "1"})
+
+        with self.assertNumQueries(0):
+            busted = self.client.get(self.url, {"in_stock": "1", "page_size": 5, "_": "123", "utm_source": "x"})
+
+        self.assertEqual(busted["ETag"], first["ETag"])
+        self.assertEqual(busted.content, first.content)
+        self.assertNotIn("utm_source", busted.json()["next"])
+        self.assertNotEqual(self.client.get(self.url, {"page_size": 6, "in_stock": "1"})["ETag"], first["ETag"])
+
+    def test_admin_lists_page_by_name_and_hsn_code(self):
+        HSN.objects.create(hsncode="0500", gst=Decimal("12.00"))
+        HSN.objects.create(hsncode="2100", gst=Decimal("18.00"))
+        self.client.force_authenticate(self.owner)
+
+        hsns = self.walk("/api/products/hsn/", {"page_size": 2})
+        self.assertEqual([hsn["hsncode"] for hsn in hsns], ["0500", "1001", "2100"])
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/products/items/", {"page_size": 7})
+        names = [item["name"] for item in response.json()["results"]]
+        self.assertEqual(names, sorted(names))
+        items = self.walk("/api/products/items/", {"page_size": 7, "hsn": self.hsn.id})
+        self.assertEqual(len(items), 12)
+
+        for url in [
+            "/api/products/categories/",
+            "/api/products/subcategories/",
+            f"/api/products/items-per-subcategory/{self.subcategory.id}/",
+            f"/api/products/subcategories-per-category/{self.subcategory.category_id}/",
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn("results", response.json())
+
+
+class AvailabilityWindowTests(ProductTestCase):
+    WINDOWS = {
+        "day": (time(9), time(17)),
+        "overnight": (time(22), time(2)),
+        "from_only": (time(18), None),
+        "till_only": (None, time(11)),
+        "always": (None, None),
+        "all_day": (time(6), time(6)),
+    }
+    EXPECTED = {
+        time(0, 30): {"overnight", "till_only", "always", "all_day"},
+        time(2): {"till_only", "always", "all_day"},
+        time(6): {"till_only", "always", "all_day"},
+        time(9): {"day", "till_only", "always", "all_day"},
+        time(11): {"day", "always", "all_day"},
+        time(17): {"always", "all_day"},
+        time(18): {"from_only", "always", "all_day"},
+        time(22): {"overnight", "from_only", "always", "all_day"},
+        time(23, 59): {"overnight", "from_only", "always", "all_day"},
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.windows = {}
+        for name, (start, end) in self.WINDOWS.items():
+            shop_item = self.add_item(name, Decimal("10.00"))
+            ShopItem.objects.filter(pk=shop_item.pk).update(available_from=start, available_till=end)
+            self.windows[shop_item.id] = name
+
+    def test_query_and_instance_checks_agree(self):
+        shop_items = list(ShopItem.objects.filter(id__in=self.windows))
+        for at, expected in self.EXPECTED.items():
+            queried = {self.windows[pk] for pk in ShopItem.objects.filter(id__in=self.windows).available_at(at).values_list("id", flat=True)}
+            in_memory = {self.windows[shop_item.id] for shop_item in shop_items if shop_item.is_available_at(at)}
+            self.assertEqual(queried, expected, at)
+            self.assertEqual(in_memory, expected, at)
+
+    @override_settings(SHOP_TIME_ZONE="Asia/Kolkata")
+    def test_windows_are_read_in_shop_time(self):
+        # 17:00 UTC is 22:30 in Kolkata: the overnight window is open, the daytime one closed.
+        evening = datetime(2025, 1, 1, 17, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(shop_time(evening), time(22, 30))
+
+        with patch("django.utils.timezone.now", return_value=evening):
+            open_now = {self.windows[pk] for pk in ShopItem.objects.filter(id__in=self.windows).available_at().values_list("id", flat=True)}
+            menu = self.client.get(f"/api/products/shops/{self.shop.id}/items/", {"page_size": 100}).json()["results"]
+
+        self.assertEqual(open_now, {"overnight", "from_only", "always", "all_day"})
+        self.assertEqual({self.windows[line["id"]] for line in menu if line["id"] in self.windows}, open_now)
+
+
+class CatalogImportTests(ProductTestCase):
+    HEADER = "category,subcategory,name,description,hsn,gst,price,quantity,available_from,available_till,is_available\n"
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def upload(self, content, name="catalog.csv", shop=None):
+        return self.client.post(
+            "/api/products/shop-items/import/",
+            {"shop": (shop or self.shop).id, "file": SimpleUploadedFile(name, content)},
+            format="multipart",
+        )
+
+    def run_import(self, text, chunk_size=IMPORT_CHUNK_SIZE):
+        return import_catalog(self.shop, BytesIO(text.encode()), "csv", chunk_size=chunk_size)
+
+    def test_creates_and_updates_items_and_shop_items(self):
+        version = menu_version(self.shop.id)
+        response = self.upload((
+            self.HEADER
+            + "Grocery,Rice,Basmati 1kg,Long grain,1006,5,120.50,10,,,true\n"
+            + "grocery,Rice,Sona Masoori 5kg,,1006,,300,4,06:00,22:00,\n"
+            + "Food,Meals,Item 0,Updated,,,999,1,,,no\n"
+            + "Grocery,Rice,Basmati 1kg,Long grain rice,1006,5,125,10,,,true\n"
+        ).encode())
+
+        self.assertEqual(response.status_code, 200, response.content)
+        report = response.json()
+        self.assertEqual((report["rows"], report["imported"], report["error_count"]), (4, 3, 0))
+        self.assertEqual((report["created_items"], report["updated_items"]), (2, 1))
+        self.assertEqual((report["created_shop_items"], report["updated_shop_items"]), (2, 1))
+
+        basmati = ShopItem.objects.select_related("item__hsn").get(shop=self.shop, item__name="Basmati 1kg")
+        self.assertEqual((basmati.effective_price, basmati.item.description), (Decimal("125.00"), "Long grain rice"))
+        self.assertEqual((basmati.item.hsn.hsncode, basmati.item.hsn.gst), ("1006", Decimal("5.00")))
+        self.assertEqual(Category.objects.filter(name__iexact="grocery").count(), 1)
+        updated = self.reload(self.shop_items[0])
+        self.assertEqual((updated.total_amount, updated.is_available), (Decimal("999.00"), False))
+        self.assertEqual([shop_item_id for shop_item_id, _ in search("basmati")], [basmati.id])
+        self.assertNotEqual(menu_version(self.shop.id), version)
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        report = self.run_import(
+            self.HEADER
+            + ",Rice,No category,,,,10,1,,,\n"
+            + "Grocery,Rice,Bad price,,,,abc,1,,,\n"
+            + "Grocery,Rice,Not a number,,,,NaN,1,,,\n"
+            + "Grocery,Rice,Endless,,,,10,1,,,\n"
+            + "Grocery,Rice,Infinite gst,,2020,Infinity,10,1,,,\n"
+            + "Grocery,Rice,Bad time,,,,10,1,25:00,,maybe\n"
+        )
+
+        self.assertEqual((report["imported"], report["error_count"]), (1, 5))
+        self.assertEqual(
+            {error["row"]: sorted(error["errors"]) for error in report["errors"]},
+            {2: ["category"], 3: ["price"], 4: ["price"], 6: ["gst"], 7: ["available_from", "is_available"]},
+        )
+
+    def test_unknown_hsn_needs_a_gst(self):
+        report = self.run_import(self.HEADER + "Grocery,Rice,Mystery,,9999,,10,1,,,\nGrocery,Rice,Known,,1001,,10,1,,,\n")
+
+        self.assertEqual([(error["row"], list(error["errors"])) for error in report["errors"]], [(2, ["hsn"])])
+        self.assertFalse(Item.objects.filter(name="Mystery").exists())
+        self.assertEqual(Item.objects.get(name="Known").hsn, self.hsn)
+
+    def test_shop_categories_follow_the_import(self):
+        self.run_import(self.HEADER + "Grocery,Rice,Basmati,,,,10,1,,,\nGrocery,Oil,Sunflower,,,,150,1,,,\n", chunk_size=1)
+
+        self.assertCountEqual(ShopSubCategory.objects.filter(shop=self.shop).values_list("subcategory__name", flat=True), ["Rice", "Oil"])
+        self.assertCountEqual(ShopCategory.objects.filter(shop=self.shop).values_list("category__name", flat=True), ["Grocery"])
+
+    def test_unreadable_file_stops_with_the_line_number(self):
+        content = (self.HEADER + "Grocery,Rice,Basmati,,,,10,1,,,\n").encode() + b"Grocery,Rice,Caf\xe9,,,,10,1,,,\n"
+
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Line 3", response.json()["detail"])
+
+        huge = self.HEADER + f'Grocery,Rice,Big,"{"x" * 200000}",,,10,1,,,\n'
+        with self.assertRaisesMessage(CatalogImportError, "Line 2"):
+            self.run_import(huge)
+
+        with tempfile.NamedTemporaryFile(suffix=".csv") as catalog:
+            catalog.write(content)
+            catalog.flush()
+            with self.assertRaisesMessage(CommandError, "Line 3"):
+                call_command("import_catalog", catalog.name, "--shop", str(self.shop.id), stdout=StringIO())
+
+    def test_committed_chunks_keep_categories_and_menu_in_step_after_a_failure(self):
+        version = menu_version(self.shop.id)
+        content = (self.HEADER + "Grocery,Rice,Basmati,,,,10,1,,,\n").encode() + b"\xff\n"
+
+        with self.assertRaises(CatalogImportError):
+            import_catalog(self.shop, BytesIO(content), "csv", chunk_size=1)
+
+        self.assertTrue(ShopItem.objects.filter(shop=self.shop, item__name="Basmati").exists())
+        self.assertTrue(ShopSubCategory.objects.filter(shop=self.shop, subcategory__name="Rice").exists())
+        self.assertNotEqual(menu_version(self.shop.id), version)
+
+    def test_jsonl_rows_and_request_errors(self):
+        content = b'{"category": "Grocery", "subcategory": "Oil", "name": "Sunflower", "price": "150"}\nnot json\n[1]\n'
+
+        report = self.upload(content, name="catalog.jsonl").json()
+        self.assertEqual((report["imported"], report["error_count"]), (1, 2))
+        self.assertEqual(self.upload(content, name="catalog.txt").status_code, 400)
+        self.assertEqual(self.upload(b"a,b\n1,2\n").status_code, 400)
+
+        self.client.force_authenticate(User.objects.create(username="stranger", role="shopadmin"))
+        self.assertEqual(self.upload(content, name="catalog.jsonl").status_code, 403)
+
+    def test_rows_inserted_by_a_concurrent_import_become_updates(self):
+        # The other import's row is already committed, but our first read of the items missed it.
+        Item.objects.create(subcategory=self.subcategory, name="Raced", description="theirs")
+        real_filter = Item.objects.filter
+        reads = []
+
+        def stale_first_read(*args, **kwargs):
+            reads.append(kwargs)
+            return Item.objects.none() if len(reads) == 1 else real_filter(*args, **kwargs)
+
+        with patch.object(Item.objects, "filter", side_effect=stale_first_read):
+            report = self.run_import(self.HEADER + "Food,Meals,Raced,ours,,,10,1,,,\n")
+
+        self.assertEqual((report["imported"], report["error_count"], report["created_items"], report["updated_items"]), (1, 0, 0, 1))
+        self.assertEqual(Item.objects.get(name="Raced").description, "ours")
+
+    def test_chunk_that_keeps_losing_the_race_is_reported(self):
+        Item.objects.create(subcategory=self.subcategory, name="Raced")
+
+        with patch.object(Item.objects, "filter", return_value=Item.objects.none()):
+            report = self.run_import(self.HEADER + "Food,Meals,Raced,,,,10,1,,,\n")
+
+        self.assertEqual((report["imported"], report["error_count"], report["created_items"]), (0, 1, 0))
+        self.assertEqual(report["errors"][0]["row"], 2)
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
+    AutocompleteView,
     AvailableSubCategoriesView,
     CustomerShopItemsView,
     HSNViewSet,
@@ -12,6 +13,7 @@ from .views import (
     ShopItemOfferViewSet,
     SubCategoryPerCategoryView,
     ItemPerSubCategoryView,
+    ProductSearchView,
 )
 
 router = DefaultRouter()
@@ -43,6 +45,8 @@ urlpatterns = [
     path("subcategories/available/", AvailableSubCategoriesView.as_view(), name="available-subcategories"),
 
     path("shops/<int:shop_id>/items/", CustomerShopItemsView.as_view(), name="customer-shop-items"),
+    path("search/", ProductSearchView.as_view(), name="product-search"),
+    path("autocomplete/", AutocompleteView.as_view(), name="autocomplete"),
 
     path("", include(router.urls)),
 ]
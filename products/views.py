@@ -1,15 +1,29 @@
-from rest_framework import viewsets, permissions, generics
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import viewsets, permissions, generics, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.permissions import IsAuthenticated
+from backend.pagination import HSNCodeKeysetPagination, IdKeysetPagination, NameKeysetPagination
+from jobs.queue import enqueue
 from shop.models import Shop
 from shop.serializers import ShopSerializer
-from .models import HSN, Category, ShopCategory, ShopSubCategory, SubCategory, Item, ShopItem, ShopItemOffer
+from .autocomplete import KINDS, MAX_SUGGESTIONS, autocomplete
+from .catalog_import import CatalogImportError, import_catalog, import_format
+from .filters import filter_items, filter_shop_items, filter_subcategories
+from .menu_cache import menu_etag, menu_snapshot, menu_url, not_modified
+from .models import HSN, Category, ShopSubCategory, SubCategory, Item, ShopItem, ShopItemOffer, shop_time
+from .search import SEARCH_MAX_RESULTS, search
 from .serializers import (
     AvailableSubCategorySerializer,
     CategorySerializer,
     CustomerShopItemSerializer,
+    MenuShopItemSerializer,
     HSNSerializer,
     SubCategorySerializer,
     ItemSerializer,
@@ -32,41 +46,53 @@ class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated, IsShopAdmin]
+    pagination_class = NameKeysetPagination
 
 
 class SubCategoryViewSet(viewsets.ModelViewSet):
-    queryset = SubCategory.objects.all()
     serializer_class = SubCategorySerializer
     permission_classes = [permissions.IsAuthenticated, IsShopAdmin]
+    pagination_class = NameKeysetPagination
+
+    def get_queryset(self):
+        return filter_subcategories(SubCategory.objects.select_related("category"), self.request.query_params)
 
 class HSNViewSet(viewsets.ModelViewSet):
     queryset = HSN.objects.all().order_by('hsncode')
     serializer_class = HSNSerializer
     permission_classes = [permissions.IsAuthenticated, IsShopAdmin]
+    pagination_class = HSNCodeKeysetPagination
 
 class ItemViewSet(viewsets.ModelViewSet):
-    queryset = Item.objects.all()
     serializer_class = ItemSerializer
     permission_classes = [permissions.IsAuthenticated, IsShopAdmin]
+    pagination_class = NameKeysetPagination
+
+    def get_queryset(self):
+        items = Item.objects.select_related("subcategory__category", "hsn")
+        return filter_items(items, self.request.query_params)
 
 
 # ---------------- NEW FILTERED APIs -----------------
 class SubCategoryPerCategoryView(generics.ListAPIView):
     serializer_class = SubCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NameKeysetPagination
 
     def get_queryset(self):
         category_id = self.kwargs["category_id"]
-        return SubCategory.objects.filter(category_id=category_id)
+        return SubCategory.objects.filter(category_id=category_id).select_related("category")
 
 
 class ItemPerSubCategoryView(generics.ListAPIView):
     serializer_class = ItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NameKeysetPagination
 
     def get_queryset(self):
         subcategory_id = self.kwargs["subcategory_id"]
-        return Item.objects.filter(subcategory_id=subcategory_id)
+        items = Item.objects.filter(subcategory_id=subcategory_id).select_related("subcategory__category", "hsn")
+        return filter_items(items, self.request.query_params)
 
 
 # ---------------- Shop-SPECIFIC MODELS -----------------
@@ -82,25 +108,19 @@ class ShopItemViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         shop = serializer.validated_data.get("shop")
-        item = serializer.validated_data.get("item")
 
         if shop.owner != self.request.user:
             raise PermissionDenied("You do not own this Shop.")
 
         shopitem = serializer.save()
 
-        # Ensure subcategory exists
-        subcategory = item.subcategory
-        if subcategory:
-            ShopSubCategory.objects.get_or_create(shop=shop, subcategory=subcategory)
-            if subcategory.category:
-                ShopCategory.objects.get_or_create(shop=shop, category=subcategory.category)
+        # Ensure subcategory + category exist for the shop, off the request path
+        enqueue("products.sync_shop_categories", {"shop_id": shop.id, "item_ids": [shopitem.item_id]})
 
         return shopitem
 
     def perform_update(self, serializer):
         shop = serializer.validated_data.get("shop")
-        item = serializer.validated_data.get("item")
 
         if shop.owner != self.request.user:
             raise PermissionDenied("You do not own this Shop.")
@@ -108,14 +128,38 @@ class ShopItemViewSet(viewsets.ModelViewSet):
         shopitem = serializer.save()
 
         # Also enforce subcategory + category during update
-        subcategory = item.subcategory
-        if subcategory:
-            ShopSubCategory.objects.get_or_create(shop=shop, subcategory=subcategory)
-            if subcategory.category:
-                ShopCategory.objects.get_or_create(shop=shop, category=subcategory.category)
+        enqueue("products.sync_shop_categories", {"shop_id": shop.id, "item_ids": [shopitem.item_id]})
 
         return shopitem
 
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser])
+    def import_catalog(self, request):
+        """
+        Bulk-create or update a shop's items from an uploaded CSV or JSONL file
+        (products.catalog_import), streamed in chunks.
+
+        Form fields: shop (id), file, format (csv or jsonl; default from the
+        file name). Columns: category, subcategory, name, price (required),
+        description, hsn, gst, quantity, available_from, available_till,
+        is_available. Returns counts and per-row errors.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"detail": "Upload the catalog as 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        shop_id = str(request.data.get("shop", ""))
+        if not shop_id.isdigit():
+            return Response({"detail": "Give the shop id as 'shop'."}, status=status.HTTP_400_BAD_REQUEST)
+        shop = get_object_or_404(Shop, id=shop_id)
+        if shop.owner != request.user:
+            raise PermissionDenied("You do not own this Shop.")
+
+        try:
+            file_format = import_format(upload.name, request.data.get("format"))
+            report = import_catalog(shop, upload, file_format)
+        except CatalogImportError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
 
 class ShopItemOfferViewSet(viewsets.ModelViewSet):
     serializer_class = ShopItemOfferSerializer
@@ -166,14 +210,124 @@ class AvailableSubCategoriesView(generics.ListAPIView):
 
 
 class CustomerShopItemsView(generics.ListAPIView):
-    serializer_class = CustomerShopItemSerializer
+    """
+    A shop's menu, paginated by id. Items outside their time-of-day window
+    are left out. Filters: category, subcategory, min_price, max_price
+    (after offers), in_stock, offer_only.
+    """
+    serializer_class = MenuShopItemSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = IdKeysetPagination
+    menu_time = None  # set per request by list(); None means "now"
 
     def get_queryset(self):
         shop_id = self.kwargs['shop_id']
-        return ShopItem.objects.filter(shop_id=shop_id, is_available=True)
+        shop_items = ShopItem.objects.filter(shop_id=shop_id, is_available=True).available_at(self.menu_time)
+        return filter_shop_items(shop_items.select_related("shop", "item"), self.request.query_params)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
-        return context
\ No newline at end of file
+        return context
+
+    def list(self, request, *args, **kwargs):
+        """
+        Served from the per-shop menu snapshot (products.menu_cache), one per
+        page and filter combination: a matching If-None-Match gets a 304
+        without a DB query, anything else gets the cached JSON bytes.
+        """
+        shop_id = self.kwargs['shop_id']
+        # One clock reading for both the ETag's time bucket and the query.
+        self.menu_time = shop_time()
+        etag = menu_etag(shop_id, request, self.menu_time)
+        if not_modified(etag, request):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            body = menu_snapshot(etag, self.render_page)
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        # Clients may keep the menu but must revalidate it on every use.
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    def render_page(self):
+        page = self.paginate_queryset(self.get_queryset())
+        # The snapshot is shared by every request with the same menu params, so its links carry only those.
+        self.paginator.base_url = menu_url(self.request)
+        return JSONRenderer().render(self.get_paginated_response(self.get_serializer(page, many=True).data).data)
+
+
+class ProductSearchView(APIView):
+    """
+    Ranked full-text search over item names/descriptions, subcategories,
+    categories and shop names/locations (products.search, SQLite FTS5).
+    Every word must match, as a prefix, so it also works while typing.
+
+    Query params: q, shop, pincode, in_stock (true: only items with stock),
+    page_size (default 20, max 100), offset. Results stop after
+    SEARCH_MAX_RESULTS.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"detail": "q is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            shop_id = int(request.query_params["shop"]) if request.query_params.get("shop") else None
+            page_size = min(max(int(request.query_params.get("page_size", 20)), 1), 100)
+            offset = min(max(int(request.query_params.get("offset", 0)), 0), SEARCH_MAX_RESULTS)
+        except ValueError:
+            return Response({"detail": "shop, page_size and offset must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        in_stock = request.query_params.get("in_stock", "").lower() in ("1", "true", "yes")
+        limit = min(page_size, SEARCH_MAX_RESULTS - offset)
+
+        hits = search(query, shop_id=shop_id, pincode=request.query_params.get("pincode"), in_stock=in_stock, limit=limit + 1, offset=offset)
+        has_more = len(hits) > limit and offset + limit < SEARCH_MAX_RESULTS
+        hits = hits[:limit]
+
+        shop_items = ShopItem.objects.select_related("shop", "item").in_bulk([shop_item_id for shop_item_id, _ in hits])
+        results = []
+        for shop_item_id, score in hits:
+            # A row deleted between the two queries is simply left out.
+            if shop_item_id in shop_items:
+                data = CustomerShopItemSerializer(shop_items[shop_item_id], context={"request": request}).data
+                results.append({**data, "score": score})
+
+        url = request.build_absolute_uri()
+        previous = None
+        if offset:
+            previous = replace_query_param(url, "offset", max(offset - page_size, 0)) if offset > page_size else remove_query_param(url, "offset")
+        return Response({
+            "next": replace_query_param(url, "offset", offset + limit) if has_more else None,
+            "previous": previous,
+            "results": results,
+        })
+
+
+class AutocompleteView(APIView):
+    """
+    Type-ahead suggestions for item and shop names, most ordered first,
+    answered from the in-memory products.autocomplete index.
+
+    Query params: q, k (default 8, max 20), type (item or shop).
+    """
+    permission_classes = [permissions.AllowAny]
+    # Anonymous on purpose: resolving a JWT user would cost a query per keystroke.
+    authentication_classes = []
+
+    def get(self, request):
+        kind = request.query_params.get("type") or None
+        if kind is not None and kind not in KINDS:
+            return Response({"detail": f"type must be one of: {', '.join(KINDS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            k = min(max(int(request.query_params.get("k", 8)), 1), MAX_SUGGESTIONS)
+        except ValueError:
+            k = 8
+
+        query = request.query_params.get("q", "")
+        suggestions = [
+            {"type": entry_kind, "id": entry_id, "name": name}
+            for entry_kind, entry_id, name, _ in autocomplete.complete(query, k=k, kind=kind)
+        ]
+        return Response({"query": query, "suggestions": suggestions})
\ No newline at end of file
@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import ShopDailyItemSales, ShopDailySales, ShopDailyStatusCount
+
+
+admin.site.register(ShopDailySales)
+admin.site.register(ShopDailyStatusCount)
+admin.site.register(ShopDailyItemSales)
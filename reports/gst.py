@@ -0,0 +1,184 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import DateField, DecimalField, F, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+from orders.models import OrderItem
+from products.models import shop_timezone
+from .models import HsnMonthlySummary, HsnSummaryMonth
+
+ZERO = Decimal("0.00")
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def months_between(start, end):
+    """First days of every month from ``start``'s month to ``end``'s month, inclusive."""
+    months, month = [], month_start(start)
+    while month <= end:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def day_start(day):
+    """Midnight at the shops (settings.SHOP_TIME_ZONE) on ``day``, as an aware datetime."""
+    return timezone.make_aware(datetime.combine(day, time.min), shop_timezone())
+
+
+def compute_hsn_rows(shop_ids, months):
+    """
+    Per shop, month, HSN and GST rate: quantity, taxable value and GST, in one grouped query.
+
+    Cancelled and refunded orders are left out, as in the sales rollups.
+    Months follow the shops' calendar (settings.SHOP_TIME_ZONE), not UTC.
+    """
+    if not shop_ids or not months:
+        return []
+    items = OrderItem.objects.filter(
+        order__shop_id__in=shop_ids,
+        order__created_at__gte=day_start(months[0]),
+        order__created_at__lt=day_start(next_month(months[-1])),
+    ).exclude(Q(order__status="cancelled") | Q(order__payment_status="refunded"))
+    return list(
+        items.annotate(month=TruncMonth("order__created_at", output_field=DateField(), tzinfo=shop_timezone()))
+        .values(
+            "month",
+            shop_id=F("order__shop_id"),
+            hsncode=Coalesce(F("shop_item__item__hsn__hsncode"), Value("")),
+            gst_rate=F("shop_item__item__hsn__gst"),
+        )
+        .annotate(
+            quantity_sum=Sum("quantity", output_field=IntegerField()),
+            taxable_sum=Coalesce(Sum("taxable_amount"), Value(ZERO), output_field=MONEY),
+            gst_sum=Coalesce(Sum("gst"), Value(ZERO), output_field=MONEY),
+        )
+        .order_by()
+    )
+
+
+def _claim_months(pairs):
+    """
+    Mark ``pairs`` as computed and return the ones this call marked.
+
+    Pairs another request marked first are left to it, so two requests
+    filling the same month never both insert its rows. Must run inside the
+    transaction that stores the rows.
+    """
+    try:
+        with transaction.atomic():
+            HsnSummaryMonth.objects.bulk_create([HsnSummaryMonth(shop_id=shop_id, month=month) for shop_id, month in pairs])
+        return set(pairs)
+    except IntegrityError:
+        pass
+    claimed = set()
+    for shop_id, month in pairs:
+        try:
+            with transaction.atomic():
+                HsnSummaryMonth.objects.create(shop_id=shop_id, month=month)
+        except IntegrityError:
+            continue
+        claimed.add((shop_id, month))
+    return claimed
+
+
+def _cache_rows(rows, pairs):
+    """Store computed rows for finished (shop_id, month) pairs not yet cached, and mark them as computed."""
+    if not pairs:
+        return
+    with transaction.atomic():
+        claimed = _claim_months(pairs)
+        if not claimed:
+            return
+        # One DELETE for every claimed month: rows left there without a mark
+        # are stale leftovers of an invalidation.
+        stale = Q()
+        for shop_id, month in claimed:
+            stale |= Q(shop_id=shop_id, month=month)
+        HsnMonthlySummary.objects.filter(stale).delete()
+        HsnMonthlySummary.objects.bulk_create([
+            HsnMonthlySummary(
+                shop_id=row["shop_id"], month=row["month"], hsncode=row["hsncode"], gst_rate=row["gst_rate"],
+                quantity=row["quantity_sum"], taxable_value=row["taxable_sum"], gst=row["gst_sum"],
+            )
+            for row in rows
+            if (row["shop_id"], row["month"]) in claimed
+        ], batch_size=500)
+
+
+def invalidate_hsn_month(shop_id, day):
+    """Forget a cached month, e.g. when one of its orders is cancelled or refunded afterwards."""
+    HsnSummaryMonth.objects.filter(shop_id=shop_id, month=month_start(day)).delete()
+
+
+def hsn_summary(shop_ids, start, end):
+    """
+    HSN-wise GST summary for ``shop_ids`` over the months from ``start`` to ``end``.
+
+    Finished months are read from HsnMonthlySummary once computed; only the
+    current month and months never computed hit the order tables, in a
+    single grouped query that also fills the cache.
+    """
+    months = months_between(start, end)
+    current = month_start(timezone.localdate(timezone=shop_timezone()))
+    finished = [month for month in months if month < current]
+
+    cached = set(
+        HsnSummaryMonth.objects.filter(shop_id__in=shop_ids, month__in=finished).values_list("shop_id", "month")
+    )
+    missing = {(shop_id, month) for shop_id in shop_ids for month in finished} - cached
+    live_months = sorted({month for _, month in missing} | {month for month in months if month >= current})
+
+    rows = [row for row in compute_hsn_rows(shop_ids, live_months) if (row["shop_id"], row["month"]) not in cached]
+    _cache_rows(rows, missing)
+
+    rows += [
+        {
+            "shop_id": row.shop_id, "month": row.month, "hsncode": row.hsncode, "gst_rate": row.gst_rate,
+            "quantity_sum": row.quantity, "taxable_sum": row.taxable_value, "gst_sum": row.gst,
+        }
+        for row in HsnMonthlySummary.objects.filter(shop_id__in=shop_ids, month__in=[month for _, month in cached])
+        if (row.shop_id, row.month) in cached
+    ]
+    return _combine(rows)
+
+
+def _combine(rows):
+    """Merge per-shop rows into per (month, HSN, rate) lines plus per-HSN totals."""
+    cents = Decimal("0.01")
+    lines, totals = {}, {}
+    for row in rows:
+        rate = Decimal(row["gst_rate"]).quantize(cents) if row["gst_rate"] is not None else None
+        for bucket, key in ((lines, (row["month"], row["hsncode"], rate)), (totals, (row["hsncode"], rate))):
+            line = bucket.setdefault(key, {"quantity": 0, "taxable_value": ZERO, "gst": ZERO})
+            line["quantity"] += row["quantity_sum"] or 0
+            line["taxable_value"] += Decimal(row["taxable_sum"] or ZERO)
+            line["gst"] += Decimal(row["gst_sum"] or ZERO)
+
+    def finish(values):
+        taxable = values["taxable_value"].quantize(cents)
+        gst = values["gst"].quantize(cents)
+        return {"quantity": values["quantity"], "taxable_value": taxable, "gst": gst, "total_value": taxable + gst}
+
+    def sort_key(item):
+        key = item[0]
+        return tuple((value is None, value) for value in key)
+
+    return {
+        "rows": [
+            {"period": f"{month:%Y-%m}", "hsncode": hsncode, "gst_rate": rate, **finish(values)}
+            for (month, hsncode, rate), values in sorted(lines.items(), key=sort_key)
+        ],
+        "totals": [
+            {"hsncode": hsncode, "gst_rate": rate, **finish(values)}
+            for (hsncode, rate), values in sorted(totals.items(), key=sort_key)
+        ],
+    }
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from reports.rollups import rebuild_rollups
+from reports.views import parse_day
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-shop daily sales rollups from raw orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shop", type=int, help="Only this shop id.")
+        parser.add_argument("--from", dest="start", help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="end", help="Last day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        start = parse_day(options["start"]) if options["start"] else None
+        end = parse_day(options["end"]) if options["end"] else None
+        if (options["start"] and not start) or (options["end"] and not end):
+            raise CommandError("Dates must be in YYYY-MM-DD format.")
+
+        rebuild_rollups(shop_id=options["shop"], start=start, end=end)
+        self.stdout.write(self.style.SUCCESS("Sales rollups rebuilt."))
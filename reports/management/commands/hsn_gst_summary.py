@@ -0,0 +1,33 @@
+import csv
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from shop.models import Shop
+from reports.gst import hsn_summary
+from reports.views import parse_month
+
+
+class Command(BaseCommand):
+    help = "Print the HSN-wise GST summary for a range of months as CSV (and cache finished months)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", required=True, help="First month (YYYY-MM).")
+        parser.add_argument("--to", dest="end", required=True, help="Last month (YYYY-MM).")
+        parser.add_argument("--shop", type=int, help="Only this shop id (default: all shops).")
+        parser.add_argument("--totals", action="store_true", help="Print per-HSN totals instead of monthly rows.")
+
+    def handle(self, *args, **options):
+        start, end = parse_month(options["start"]), parse_month(options["end"])
+        if not start or not end or start > end:
+            raise CommandError("Use --from/--to as YYYY-MM with from <= to.")
+
+        shops = Shop.objects.all()
+        if options["shop"]:
+            shops = shops.filter(id=options["shop"])
+        report = hsn_summary(list(shops.values_list("id", flat=True)), start, end)
+
+        rows = report["totals"] if options["totals"] else report["rows"]
+        columns = (["period"] if not options["totals"] else []) + ["hsncode", "gst_rate", "quantity", "taxable_value", "gst", "total_value"]
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row[column] for column in columns])
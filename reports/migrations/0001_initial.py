@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0005_shopcategory_image_shopitem_image_and_more'),
+        ('shop', '0004_alter_shop_address_alter_shop_location_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopDailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_item_sales', to='shop.shop')),
+                ('shop_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.shopitem')),
+            ],
+            options={
+                'unique_together': {('shop', 'date', 'shop_item')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ShopDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('taxable_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('delivery_charge', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.shop')),
+            ],
+            options={
+                'unique_together': {('shop', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ShopDailyStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_status_counts', to='shop.shop')),
+            ],
+            options={
+                'unique_together': {('shop', 'date', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+        ('shop', '0004_alter_shop_address_alter_shop_location_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HsnMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('hsncode', models.CharField(blank=True, max_length=20)),
+                ('gst_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('quantity', models.IntegerField(default=0)),
+                ('taxable_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hsn_summaries', to='shop.shop')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shop', 'month'], name='hsn_summary_shop_month_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HsnSummaryMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hsn_summary_months', to='shop.shop')),
+            ],
+            options={
+                'unique_together': {('shop', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.db import models
+from products.models import ShopItem
+from shop.models import Shop
+
+
+class ShopDailySales(models.Model):
+    """Per-shop per-day sales of orders that are neither cancelled nor refunded."""
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="daily_sales")
+    date = models.DateField()
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gst = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    taxable_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    delivery_charge = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('shop', 'date')
+
+    def __str__(self):
+        return f"{self.shop.name} {self.date}: {self.revenue}"
+
+
+class ShopDailyStatusCount(models.Model):
+    """Orders placed on ``date`` that are currently in ``status``."""
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="daily_status_counts")
+    date = models.DateField()
+    status = models.CharField(max_length=20)
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('shop', 'date', 'status')
+
+    def __str__(self):
+        return f"{self.shop.name} {self.date} {self.status}: {self.orders}"
+
+
+class ShopDailyItemSales(models.Model):
+    """Per-day quantity and revenue of one shop item, from orders that count as sales."""
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="daily_item_sales")
+    date = models.DateField()
+    shop_item = models.ForeignKey(ShopItem, on_delete=models.CASCADE, related_name="daily_sales")
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('shop', 'date', 'shop_item')
+
+    def __str__(self):
+        return f"{self.shop_item} {self.date}: {self.quantity}"
+
+
+class HsnMonthlySummary(models.Model):
+    """HSN-wise taxable value and GST of one shop for one finished month (cached report rows)."""
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="hsn_summaries")
+    month = models.DateField()
+    hsncode = models.CharField(max_length=20, blank=True)
+    gst_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    quantity = models.IntegerField(default=0)
+    taxable_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gst = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["shop", "month"], name="hsn_summary_shop_month_idx")]
+
+    def __str__(self):
+        return f"{self.shop.name} {self.month:%Y-%m} HSN {self.hsncode or '-'}"
+
+
+class HsnSummaryMonth(models.Model):
+    """Marks a shop's month as computed into HsnMonthlySummary."""
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="hsn_summary_months")
+    month = models.DateField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('shop', 'month')
+
+    def __str__(self):
+        return f"{self.shop.name} {self.month:%Y-%m}"
@@ -0,0 +1,241 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from products.models import shop_timezone
+from .gst import day_start, invalidate_hsn_month
+from .models import ShopDailyItemSales, ShopDailySales, ShopDailyStatusCount
+
+ZERO = Decimal("0.00")
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def counts_as_sale(status, payment_status):
+    """Cancelled and refunded orders are kept out of revenue, GST and item rollups."""
+    return status != "cancelled" and payment_status != "refunded"
+
+
+def shop_day(moment=None):
+    """The shops' calendar day (settings.SHOP_TIME_ZONE) at ``moment`` (default: now); rollups are kept per shop day."""
+    return timezone.localdate(moment, shop_timezone())
+
+
+def _apply_deltas(model, common, key_field, deltas):
+    """
+    Add ``deltas`` ({key: {field: delta}}) onto the rollup rows matching ``common``.
+
+    Missing rows are created empty with one INSERT ... ON CONFLICT DO NOTHING,
+    then every row is incremented by one UPDATE with a CASE per field, so the
+    cost does not depend on the number of keys and concurrent writers never
+    overwrite each other's counts.
+    """
+    deltas = {key: values for key, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return
+
+    model.objects.bulk_create([model(**common, **{key_field: key}) for key in deltas], ignore_conflicts=True)
+
+    updates = {}
+    for field in {field for values in deltas.values() for field in values}:
+        output = model._meta.get_field(field)
+        zero = Value(ZERO if isinstance(output, DecimalField) else 0)
+        updates[field] = F(field) + Case(
+            *[When(**{key_field: key}, then=Value(values.get(field, 0))) for key, values in deltas.items()],
+            default=zero,
+            output_field=output,
+        )
+    model.objects.filter(**common, **{f"{key_field}__in": list(deltas)}).update(**updates)
+
+
+def _sales_deltas(order, sign):
+    return {
+        order.shop_id: {
+            "orders": sign,
+            "revenue": sign * order.total_price,
+            "gst": sign * order.gst,
+            "taxable_total": sign * order.taxable_total,
+            "delivery_charge": sign * order.delivery_charge,
+        }
+    }
+
+
+def _item_deltas(items, sign):
+    deltas = {}
+    for shop_item_id, quantity, price in items:
+        line = deltas.setdefault(shop_item_id, {"quantity": 0, "revenue": ZERO})
+        line["quantity"] += sign * quantity
+        line["revenue"] += sign * (price * quantity)
+    return deltas
+
+
+def record_order_placed(order, items=None):
+    """
+    Add a newly placed order to its shop's rollups.
+
+    ``items`` may be the order's unsaved-or-saved OrderItem objects, to avoid
+    reading them back.
+    """
+    if not order.shop_id:
+        return
+    day = shop_day(order.created_at)
+    if items is None:
+        lines = order.items.values_list("shop_item_id", "quantity", "price")
+    else:
+        lines = [(item.shop_item_id, item.quantity, item.price) for item in items]
+
+    with transaction.atomic():
+        _apply_deltas(ShopDailyStatusCount, {"shop_id": order.shop_id, "date": day}, "status", {order.status: {"orders": 1}})
+        if counts_as_sale(order.status, order.payment_status):
+            _apply_deltas(ShopDailySales, {"date": day}, "shop_id", _sales_deltas(order, 1))
+            _apply_deltas(ShopDailyItemSales, {"shop_id": order.shop_id, "date": day}, "shop_item_id", _item_deltas(lines, 1))
+
+
+def record_order_change(order, previous_status, previous_payment_status):
+    """Move an order between status buckets, and in or out of sales when it is cancelled or refunded."""
+    record_orders_changed([order], {order.pk: (previous_status, previous_payment_status)})
+
+
+def record_orders_changed(orders, previous):
+    """
+    Batch form of record_order_change. ``previous`` maps order id to its
+    ``(status, payment_status)`` before the change.
+
+    Deltas are summed per shop and day first, so a bulk update costs one
+    round of rollup writes per day touched rather than per order.
+    """
+    status_deltas, sales_deltas, sale_signs = {}, {}, {}
+    for order in orders:
+        if not order.shop_id:
+            continue
+        previous_status, previous_payment_status = previous[order.pk]
+        day = shop_day(order.created_at)
+        if order.status != previous_status:
+            counts = status_deltas.setdefault((order.shop_id, day), {})
+            counts.setdefault(previous_status, {"orders": 0})["orders"] -= 1
+            counts.setdefault(order.status, {"orders": 0})["orders"] += 1
+        sign = int(counts_as_sale(order.status, order.payment_status)) - int(counts_as_sale(previous_status, previous_payment_status))
+        if sign:
+            sale_signs[order.pk] = (order.shop_id, day, sign)
+            totals = sales_deltas.setdefault(day, {}).setdefault(order.shop_id, {})
+            for field, delta in _sales_deltas(order, sign)[order.shop_id].items():
+                totals[field] = totals.get(field, 0) + delta
+
+    item_deltas = {}
+    if sale_signs:
+        lines = OrderItem.objects.filter(order_id__in=list(sale_signs)).values_list("order_id", "shop_item_id", "quantity", "price")
+        for order_id, shop_item_id, quantity, price in lines:
+            shop_id, day, sign = sale_signs[order_id]
+            line = item_deltas.setdefault((shop_id, day), {}).setdefault(shop_item_id, {"quantity": 0, "revenue": ZERO})
+            line["quantity"] += sign * quantity
+            line["revenue"] += sign * (price * quantity)
+
+    with transaction.atomic():
+        for (shop_id, day), deltas in status_deltas.items():
+            _apply_deltas(ShopDailyStatusCount, {"shop_id": shop_id, "date": day}, "status", deltas)
+        for day, deltas in sales_deltas.items():
+            _apply_deltas(ShopDailySales, {"date": day}, "shop_id", deltas)
+        for (shop_id, day), deltas in item_deltas.items():
+            _apply_deltas(ShopDailyItemSales, {"shop_id": shop_id, "date": day}, "shop_item_id", deltas)
+        for shop_id, day in {(shop_id, day.replace(day=1)) for shop_id, day, _ in sale_signs.values()}:
+            invalidate_hsn_month(shop_id, day)
+
+
+def rebuild_rollups(shop_id=None, start=None, end=None):
+    """
+    Recompute the rollups for a shop and/or date range from raw orders.
+
+    Existing rollup rows in the range are replaced, using three grouped
+    queries over orders and order items.
+    """
+    orders = Order.objects.filter(shop__isnull=False)
+    rollups = [ShopDailySales.objects.all(), ShopDailyStatusCount.objects.all(), ShopDailyItemSales.objects.all()]
+    if shop_id:
+        orders = orders.filter(shop_id=shop_id)
+        rollups = [queryset.filter(shop_id=shop_id) for queryset in rollups]
+    if start:
+        orders = orders.filter(created_at__gte=day_start(start))
+        rollups = [queryset.filter(date__gte=start) for queryset in rollups]
+    if end:
+        orders = orders.filter(created_at__lt=day_start(end + timedelta(days=1)))
+        rollups = [queryset.filter(date__lte=end) for queryset in rollups]
+
+    sale = ~Q(status="cancelled") & ~Q(payment_status="refunded")
+    zone = shop_timezone()
+    daily = orders.annotate(day=TruncDate("created_at", tzinfo=zone)).values("shop_id", "day").order_by()
+    items = (
+        OrderItem.objects.filter(order__in=orders.filter(sale))
+        .annotate(day=TruncDate("order__created_at", tzinfo=zone))
+        .values("order__shop_id", "day", "shop_item_id")
+        .order_by()
+    )
+
+    with transaction.atomic():
+        for queryset in rollups:
+            queryset.delete()
+
+        ShopDailySales.objects.bulk_create([
+            ShopDailySales(
+                shop_id=row["shop_id"], date=row["day"], orders=row["order_count"], revenue=row["revenue_sum"],
+                gst=row["gst_sum"], taxable_total=row["taxable_sum"], delivery_charge=row["delivery_sum"],
+            )
+            for row in daily.filter(sale).annotate(
+                order_count=Count("id"),
+                revenue_sum=Coalesce(Sum("total_price"), Value(ZERO), output_field=MONEY),
+                gst_sum=Coalesce(Sum("gst"), Value(ZERO), output_field=MONEY),
+                taxable_sum=Coalesce(Sum("taxable_total"), Value(ZERO), output_field=MONEY),
+                delivery_sum=Coalesce(Sum("delivery_charge"), Value(ZERO), output_field=MONEY),
+            ).iterator()
+        ], batch_size=500)
+
+        ShopDailyStatusCount.objects.bulk_create([
+            ShopDailyStatusCount(shop_id=row["shop_id"], date=row["day"], status=row["status"], orders=row["order_count"])
+            for row in daily.values("shop_id", "day", "status").annotate(order_count=Count("id")).iterator()
+        ], batch_size=500)
+
+        ShopDailyItemSales.objects.bulk_create([
+            ShopDailyItemSales(
+                shop_id=row["order__shop_id"], date=row["day"], shop_item_id=row["shop_item_id"],
+                quantity=row["quantity_sum"], revenue=row["revenue_sum"],
+            )
+            for row in items.annotate(
+                quantity_sum=Sum("quantity", output_field=IntegerField()),
+                revenue_sum=Sum(F("price") * F("quantity"), output_field=MONEY),
+            ).iterator()
+        ], batch_size=500)
+
+
+def sales_summary(shop_id, start, end, top=10):
+    """Totals, per-day rows, status counts and top items for a date range, read only from the rollups."""
+    days = ShopDailySales.objects.filter(shop_id=shop_id, date__gte=start, date__lte=end).order_by("date")
+    money = ("revenue", "gst", "taxable_total", "delivery_charge")
+    totals = days.aggregate(
+        orders=Coalesce(Sum("orders"), Value(0)),
+        **{field: Coalesce(Sum(field), Value(ZERO), output_field=MONEY) for field in money},
+    )
+    status_counts = dict(
+        ShopDailyStatusCount.objects.filter(shop_id=shop_id, date__gte=start, date__lte=end)
+        .values("status").order_by("status")
+        .annotate(total=Sum("orders")).filter(total__gt=0)
+        .values_list("status", "total")
+    )
+    top_items = list(
+        ShopDailyItemSales.objects.filter(shop_id=shop_id, date__gte=start, date__lte=end)
+        .values("shop_item_id", name=F("shop_item__item__name"))
+        .annotate(quantity=Sum("quantity"), revenue=Sum("revenue"))
+        .filter(quantity__gt=0)
+        .order_by("-quantity", "-revenue")[:top]
+    )
+    cents = Decimal("0.01")
+    for field in money:
+        totals[field] = Decimal(totals[field]).quantize(cents)
+    for item in top_items:
+        item["revenue"] = Decimal(item["revenue"] or ZERO).quantize(cents)
+    return {
+        "totals": totals,
+        "status_counts": status_counts,
+        "days": list(days.values("date", "orders", *money)),
+        "top_items": top_items,
+    }
@@ -0,0 +1,287 @@
+import csv
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from orders.models import Cart, Order
+from orders.checkout import place_order
+from orders.status import change_payment_status, change_status
+from products.models import Category, HSN, Item, ShopItem, SubCategory
+from shop.models import Shop
+from user.models import User
+from .gst import _cache_rows, compute_hsn_rows, invalidate_hsn_month
+from .models import HsnMonthlySummary, HsnSummaryMonth, ShopDailyItemSales, ShopDailySales, ShopDailyStatusCount
+from .rollups import rebuild_rollups, record_order_change, record_order_placed, shop_day
+
+
+def rollup_rows():
+    """Every non-empty rollup row, for comparing incremental upkeep with a rebuild."""
+    return (
+        sorted(ShopDailySales.objects.values_list("shop_id", "date", "orders", "revenue", "gst", "taxable_total", "delivery_charge")),
+        sorted(ShopDailyStatusCount.objects.filter(orders__gt=0).values_list("shop_id", "date", "status", "orders")),
+        sorted(ShopDailyItemSales.objects.filter(quantity__gt=0).values_list("shop_id", "date", "shop_item_id", "quantity", "revenue")),
+    )
+
+
+class ReportTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner", role="shopadmin")
+        self.customer = User.objects.create(username="customer", role="customer", mobile_number="1")
+        self.shop = Shop.objects.create(name="Shop", owner=self.owner, gst_number="GST1", contact_number="1")
+        subcategory = SubCategory.objects.create(category=Category.objects.create(name="Food"), name="Meals")
+        self.hsns = [
+            HSN.objects.create(hsncode="1001", gst=Decimal("5.00")),
+            HSN.objects.create(hsncode="2002", gst=Decimal("18.00")),
+        ]
+        self.shop_items = [
+            ShopItem.objects.create(
+                shop=self.shop,
+                item=Item.objects.create(subcategory=subcategory, name=f"Item {n}", hsn=self.hsns[n % 2]),
+                total_amount=Decimal("118.00") + n,
+                available_quantity=100,
+            )
+            for n in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def place(self, lines=3, quantity=1, delivery_charge=Decimal("10.00")):
+        for shop_item in self.shop_items[:lines]:
+            Cart.objects.create(customer=self.customer, shop_item=shop_item, quantity=quantity)
+        return place_order(self.customer, delivery_charge=delivery_charge)
+
+
+class SalesRollupTests(ReportTestCase):
+    def test_placed_order_is_rolled_up(self):
+        order = self.place(lines=2, quantity=2)
+
+        today = shop_day()
+        day = ShopDailySales.objects.get(shop=self.shop, date=today)
+        self.assertEqual((day.orders, day.revenue, day.gst), (1, order.total_price, order.gst))
+        self.assertEqual(ShopDailyStatusCount.objects.get(shop=self.shop, date=today, status="pending").orders, 1)
+        self.assertEqual(
+            dict(ShopDailyItemSales.objects.values_list("shop_item_id", "quantity")),
+            {self.shop_items[0].id: 2, self.shop_items[1].id: 2},
+        )
+
+    def test_record_order_placed_reads_items_when_not_given(self):
+        order = self.place()
+        ShopDailySales.objects.all().delete()
+        ShopDailyStatusCount.objects.all().delete()
+        ShopDailyItemSales.objects.all().delete()
+
+        record_order_placed(order)
+
+        self.assertEqual(ShopDailySales.objects.get().revenue, order.total_price)
+        self.assertEqual(ShopDailyItemSales.objects.count(), 3)
+
+    def test_cancel_and_refund_leave_sales(self):
+        kept, cancelled, refunded = self.place(), self.place(lines=1), self.place(lines=2)
+
+        change_status(cancelled, "cancelled")
+        change_payment_status(refunded, "paid")
+        change_payment_status(refunded, "refunded")
+
+        day = ShopDailySales.objects.get()
+        self.assertEqual((day.orders, day.revenue), (1, kept.total_price))
+        self.assertEqual(
+            dict(ShopDailyStatusCount.objects.filter(orders__gt=0).values_list("status", "orders")),
+            {"pending": 2, "cancelled": 1},
+        )
+
+    def test_record_order_change_moves_status_buckets_only(self):
+        order = self.place()
+        sales = rollup_rows()[0]
+        Order.objects.filter(pk=order.pk).update(status="accepted")
+        order.status = "accepted"
+
+        record_order_change(order, "pending", order.payment_status)
+
+        self.assertEqual(rollup_rows()[0], sales)
+        self.assertEqual(
+            dict(ShopDailyStatusCount.objects.filter(orders__gt=0).values_list("status", "orders")),
+            {"accepted": 1},
+        )
+
+    def test_incremental_rollups_match_a_rebuild(self):
+        orders = [self.place(lines=n % 3 + 1, quantity=n % 2 + 1) for n in range(6)]
+        # Spread the orders over three days; records are per placement day.
+        for n, order in enumerate(orders):
+            Order.objects.filter(pk=order.pk).update(created_at=order.created_at - timedelta(days=n % 3))
+        rebuild_rollups()
+
+        change_status(Order.objects.get(pk=orders[0].pk), "cancelled")
+        change_status(Order.objects.get(pk=orders[1].pk), "accepted")
+        change_payment_status(Order.objects.get(pk=orders[2].pk), "paid")
+        change_payment_status(Order.objects.get(pk=orders[2].pk), "refunded")
+        change_status(Order.objects.get(pk=orders[3].pk), "cancelled")
+        change_status(Order.objects.get(pk=orders[3].pk), "pending")
+        incremental = rollup_rows()
+
+        rebuild_rollups()
+        self.assertEqual(rollup_rows(), incremental)
+        self.assertEqual(len(incremental[0]), 3)
+
+    def test_rebuild_is_limited_to_its_range(self):
+        old, new = self.place(), self.place()
+        Order.objects.filter(pk=old.pk).update(created_at=old.created_at - timedelta(days=10))
+        rebuild_rollups()
+        ShopDailySales.objects.filter(date=shop_day()).update(orders=99)
+
+        call_command("backfill_sales_rollups", "--from", str(shop_day() - timedelta(days=1)), stdout=StringIO())
+
+        self.assertEqual(
+            sorted(ShopDailySales.objects.values_list("date", "orders")),
+            [(shop_day(old.created_at - timedelta(days=10)), 1), (shop_day(new.created_at), 1)],
+        )
+        with self.assertRaises(CommandError):
+            call_command("backfill_sales_rollups", "--from", "2025-02-30", stdout=StringIO())
+
+    @override_settings(SHOP_TIME_ZONE="Asia/Kolkata")
+    def test_days_follow_the_shop_time_zone(self):
+        order = self.place()
+        # 19:00 UTC on 31 January is already 00:30 on 1 February in Kolkata.
+        Order.objects.filter(pk=order.pk).update(created_at=datetime(2025, 1, 31, 19, tzinfo=dt_timezone.utc))
+        rebuild_rollups()
+        self.assertEqual(list(ShopDailySales.objects.filter(orders__gt=0).values_list("date", flat=True)), [date(2025, 2, 1)])
+
+        ShopDailySales.objects.all().delete()
+        rebuild_rollups(start=date(2025, 2, 1), end=date(2025, 2, 1))
+        self.assertEqual(list(ShopDailySales.objects.values_list("date", "orders")), [(date(2025, 2, 1), 1)])
+
+        change_status(Order.objects.get(pk=order.pk), "cancelled")
+        self.assertEqual(list(ShopDailySales.objects.values_list("date", "orders")), [(date(2025, 2, 1), 0)])
+
+
+class SalesReportViewTests(ReportTestCase):
+    def test_report(self):
+        orders = [self.place(), self.place(lines=1)]
+        change_status(orders[1], "cancelled")
+
+        response = self.client.get(f"/api/reports/shops/{self.shop.id}/sales/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["totals"]["orders"], 1)
+        self.assertEqual(response.data["totals"]["revenue"], orders[0].total_price)
+        self.assertEqual(response.data["status_counts"], {"pending": 1, "cancelled": 1})
+        self.assertEqual(len(response.data["top_items"]), 3)
+
+    def test_rejects_bad_dates(self):
+        for params in ({"from": "2025-13-01"}, {"from": "2025-02-30"}, {"to": "soon"}, {"from": "2025-03-02", "to": "2025-03-01"}):
+            response = self.client.get(f"/api/reports/shops/{self.shop.id}/sales/", params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_other_owners_get_404(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(f"/api/reports/shops/{self.shop.id}/sales/").status_code, 404)
+
+
+class HsnGstSummaryTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.this_month = shop_day().replace(day=1)
+        self.last_month = (self.this_month - timedelta(days=1)).replace(day=1)
+        self.orders = [self.place(), self.place(lines=1, quantity=2), self.place(lines=2)]
+        # The first order falls in the (finished) previous month.
+        Order.objects.filter(pk=self.orders[0].pk).update(created_at=timezone.make_aware(datetime.combine(self.last_month, time(12))))
+
+    def summary(self, **params):
+        response = self.client.get("/api/reports/gst/hsn/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_rows_per_month_and_hsn(self):
+        data = self.summary(**{"from": f"{self.last_month:%Y-%m}", "to": f"{self.this_month:%Y-%m}"})
+
+        last = [row for row in data["rows"] if row["period"] == f"{self.last_month:%Y-%m}"]
+        self.assertEqual({row["hsncode"] for row in last}, {"1001", "2002"})
+        self.assertEqual(sum(row["gst"] for row in last), self.orders[0].gst)
+        self.assertEqual(sum(row["gst"] for row in data["totals"]), sum(order.gst for order in self.orders))
+        self.assertEqual(sum(row["quantity"] for row in data["totals"]), 3 + 2 + 2)
+
+    def test_finished_months_are_cached_and_invalidated(self):
+        params = {"from": f"{self.last_month:%Y-%m}", "to": f"{self.this_month:%Y-%m}"}
+        first = self.summary(**params)
+        self.assertEqual(list(HsnSummaryMonth.objects.values_list("month", flat=True)), [self.last_month])
+        self.assertEqual(self.summary(**params), first)
+
+        change_status(Order.objects.get(pk=self.orders[0].pk), "cancelled")
+
+        self.assertFalse(HsnSummaryMonth.objects.exists())
+        self.assertEqual(self.summary(**{"from": f"{self.last_month:%Y-%m}", "to": f"{self.last_month:%Y-%m}"})["rows"], [])
+
+    def test_caching_deletes_once_for_many_shops_and_months(self):
+        for n in range(3):
+            Shop.objects.create(name=f"Shop {n}", owner=self.owner, gst_number=f"GST-{n}", contact_number="1")
+        start = (self.this_month - timedelta(days=300)).replace(day=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.summary(**{"from": f"{start:%Y-%m}", "to": f"{self.last_month:%Y-%m}"})
+
+        deletes = [q["sql"] for q in queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(HsnSummaryMonth.objects.count(), 4 * 10)
+
+    def test_recomputing_some_months_keeps_the_cached_ones(self):
+        older = (self.last_month - timedelta(days=1)).replace(day=1)
+        Order.objects.filter(pk=self.orders[1].pk).update(created_at=timezone.make_aware(datetime.combine(older, time(12))))
+        other = Shop.objects.create(name="Other", owner=self.owner, gst_number="GST2", contact_number="1")
+        Cart.objects.create(customer=self.customer, shop_item=ShopItem.objects.create(
+            shop=other, item=self.shop_items[0].item, total_amount=Decimal("59.00"), available_quantity=10,
+        ))
+        other_order = place_order(self.customer)
+        Order.objects.filter(pk=other_order.pk).update(created_at=timezone.make_aware(datetime.combine(older, time(12))))
+        params = {"from": f"{older:%Y-%m}", "to": f"{self.last_month:%Y-%m}"}
+        first = self.summary(**params)
+        cached = sorted(HsnMonthlySummary.objects.values_list("shop_id", "month", "hsncode", "gst"))
+
+        # The delete box {shop, other} x {older, last month} also covers two months still cached.
+        invalidate_hsn_month(self.shop.id, self.last_month)
+        invalidate_hsn_month(other.id, older)
+
+        self.assertEqual(self.summary(**params), first)
+        self.assertEqual(sorted(HsnMonthlySummary.objects.values_list("shop_id", "month", "hsncode", "gst")), cached)
+        self.assertEqual(HsnSummaryMonth.objects.count(), 4)
+
+    def test_filling_a_month_twice_keeps_one_copy(self):
+        pairs = {(self.shop.id, self.last_month)}
+        rows = compute_hsn_rows([self.shop.id], [self.last_month])
+        # Two requests that both found the month missing fill it one after the other.
+        _cache_rows(rows, pairs)
+        _cache_rows(rows, pairs)
+
+        self.assertEqual(HsnMonthlySummary.objects.count(), len(rows))
+        self.assertEqual(HsnSummaryMonth.objects.count(), 1)
+        data = self.summary(**{"from": f"{self.last_month:%Y-%m}", "to": f"{self.last_month:%Y-%m}"})
+        self.assertEqual(sum(row["gst"] for row in data["totals"]), self.orders[0].gst)
+
+    @override_settings(SHOP_TIME_ZONE="Asia/Kolkata")
+    def test_months_follow_the_shop_time_zone(self):
+        # 19:00 UTC on 31 January is already 00:30 on 1 February in Kolkata.
+        Order.objects.filter(pk=self.orders[0].pk).update(created_at=datetime(2025, 1, 31, 19, tzinfo=dt_timezone.utc))
+
+        data = self.summary(**{"from": "2025-01", "to": "2025-02"})
+
+        self.assertEqual({row["period"] for row in data["rows"]}, {"2025-02"})
+        self.assertEqual(sum(row["gst"] for row in data["rows"]), self.orders[0].gst)
+        self.assertEqual(sorted(HsnSummaryMonth.objects.values_list("month", flat=True)), [date(2025, 1, 1), date(2025, 2, 1)])
+
+    def test_rejects_bad_parameters(self):
+        for params in ({"shop": "abc"}, {"from": "2025-13"}, {"from": "2025-02-30"}, {"from": "2025-03", "to": "2025-02"}):
+            response = self.client.get("/api/reports/gst/hsn/", params)
+            self.assertEqual(response.status_code, 400, params)
+        self.assertEqual(self.client.get("/api/reports/gst/hsn/", {"shop": self.shop.id + 100}).status_code, 404)
+
+    def test_command(self):
+        out = StringIO()
+        with patch("sys.stdout", out):
+            call_command("hsn_gst_summary", "--from", f"{self.last_month:%Y-%m}", "--to", f"{self.this_month:%Y-%m}", "--totals")
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual({row["hsncode"] for row in rows}, {"1001", "2002"})
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import hsn_gst_summary, shop_sales_report
+
+urlpatterns = [
+    path("shops/<int:shop_id>/sales/", shop_sales_report, name="shop-sales-report"),
+    path("gst/hsn/", hsn_gst_summary, name="hsn-gst-summary"),
+]
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from shop.models import Shop
+from .gst import hsn_summary
+from .rollups import sales_summary, shop_day
+
+
+def get_report_shop(request, shop_id):
+    """The shop if the user owns it (or is a superuser), else 404."""
+    shops = Shop.objects.all() if request.user.is_superuser else Shop.objects.filter(owner=request.user)
+    return get_object_or_404(shops, id=shop_id)
+
+
+def parse_day(value):
+    """``YYYY-MM-DD`` to a date, or None when it is malformed or not a real day (e.g. 2025-02-30)."""
+    try:
+        return parse_date(value or "")
+    except ValueError:
+        return None
+
+
+def parse_month(value):
+    """``YYYY-MM`` (or a full date) to the first day of that month, else None."""
+    day = parse_day(f"{value}-01") if value and len(value) == 7 else parse_day(value)
+    return day.replace(day=1) if day else None
+
+
+def parse_date_range(request, default_days=30):
+    """
+    ``?from=YYYY-MM-DD&to=YYYY-MM-DD``, defaulting to the last ``default_days``
+    days. A date that is given but invalid comes back as None.
+    """
+    today = shop_day()
+    start = parse_day(request.query_params["from"]) if request.query_params.get("from") else today - timedelta(days=default_days - 1)
+    end = parse_day(request.query_params["to"]) if request.query_params.get("to") else today
+    return start, end
+
+
+# ---------------- Shop sales rollups ---------------- #
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def shop_sales_report(request, shop_id):
+    """
+    Daily revenue, GST, order counts by status and top items for a shop.
+    Query params: from, to (YYYY-MM-DD, inclusive), top (number of items, default 10)
+    """
+    shop = get_report_shop(request, shop_id)
+    start, end = parse_date_range(request)
+    if not start or not end or start > end:
+        return Response({"detail": "Use from/to dates as YYYY-MM-DD with from <= to."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        top = min(max(int(request.query_params.get("top", 10)), 1), 100)
+    except ValueError:
+        top = 10
+
+    report = sales_summary(shop.id, start, end, top=top)
+    return Response({"shop_id": shop.id, "from": start, "to": end, **report})
+
+
+# ---------------- HSN-wise GST summary ---------------- #
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def hsn_gst_summary(request):
+    """
+    HSN-wise taxable value and GST per month, for GST filings.
+    Query params: from, to (YYYY-MM, inclusive; default the current month), shop (optional shop id)
+    """
+    shops = Shop.objects.all() if request.user.is_superuser else Shop.objects.filter(owner=request.user)
+    if request.query_params.get("shop"):
+        if not request.query_params["shop"].isdigit():
+            return Response({"detail": "shop must be a shop id."}, status=status.HTTP_400_BAD_REQUEST)
+        shops = shops.filter(id=request.query_params["shop"])
+    shop_ids = list(shops.values_list("id", flat=True))
+    if not shop_ids:
+        return Response({"detail": "Shop not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    this_month = shop_day().replace(day=1)
+    start = parse_month(request.query_params.get("from")) if request.query_params.get("from") else this_month
+    end = parse_month(request.query_params.get("to")) if request.query_params.get("to") else this_month
+    if not start or not end or start > end:
+        return Response({"detail": "Use from/to months as YYYY-MM with from <= to."}, status=status.HTTP_400_BAD_REQUEST)
+
+    report = hsn_summary(shop_ids, start, end)
+    return Response({"shop_ids": shop_ids, "from": f"{start:%Y-%m}", "to": f"{end:%Y-%m}", **report})
@@ -2,13 +2,39 @@ from rest_framework import generics, permissions, viewsets, status
 from .models import Address, User
 from .serializers import AddressSerializer, CustomerRegisterSerializer
 from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import CustomTokenObtainPairSerializer, UserProfileSerializer, ChangePasswordSerializer
+from orders.cart import ShopMismatch
+from orders.guest_cart import GuestCart, guest_cart_token
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
+    def post(self, request, *args, **kwargs):
+        """
+        Log in; a guest cart token sent along is merged into the user's cart.
+        If the saved cart belongs to another shop the guest cart is kept and
+        the response asks for a reset (POST /api/orders/guest-cart/merge/).
+        """
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0]) from e
+
+        data = dict(serializer.validated_data)
+        token = guest_cart_token(request)
+        if token:
+            try:
+                data["merged_cart_lines"] = GuestCart(token).merge_into(serializer.user)
+            except ShopMismatch:
+                data["merged_cart_lines"] = 0
+                data["requires_reset"] = True
+                data["detail"] = "Your cart contains items from another restaurant. Do you want to reset it to add these items?"
+        return Response(data, status=status.HTTP_200_OK)
+
 
 class CustomerRegisterView(generics.CreateAPIView):
     serializer_class = CustomerRegisterSerializer